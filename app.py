@@ -1,59 +1,113 @@
+import json
+from datetime import datetime
+
+import click
 import requests
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_caching import Cache
 from flask_cors import CORS, cross_origin
 from flask_jwt_extended import JWTManager, create_access_token
-
-from app_utils import PermissionRequired
-from config import GOOGLE_CLIENT_ID, GOOGLE_SECRET_KEY, DB_NAME, USERS_COLLECTION, CHAPTERS_COLLECTION_NAME
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from app_utils import PermissionRequired, parse_fields, parse_page_args, paginate, json_response, search_query
+from config import Config, DB_NAME, USERS_COLLECTION, CHAPTERS_COLLECTION_NAME, COMMENTS_COLLECTION_NAME, \
+    CHAPTERS_PAGE_SIZE, CHAPTERS_MAX_PAGE_SIZE, COMMENTS_PAGE_SIZE, COMMENTS_MAX_PAGE_SIZE, \
+    CHAPTERS_IMPORT_BATCH_SIZE, COMMENTS_MODERATION_MAX_BATCH, CHAPTERS_SEARCH_MAX_OFFSET, \
+    CHAPTER_REVISIONS_COLLECTION, REVISIONS_PAGE_SIZE, REVISIONS_MAX_PAGE_SIZE, CHAPTER_STATS_COLLECTION
+from auth_services import get_google_auth
+from auth_services.google_auth import GoogleAuthError
+from cache_services import get_user_cache, get_response_cache
+from chapter_services import export, stats, write_effects
+from comment_services import get_comment_write_behind
+from comment_services.write_behind import QueueFull
+from chapter_services.revisions import REVISED_FIELDS, MissingRevision, reverse_delta, revision_document, restore, \
+    diff
 from db_services import get_db_controller
-from models.chapter import Chapter
+from db_services.bulk import insert_batch, delete_comments
+from db_services.indexes import INDEX_NOT_FOUND, ensure_indexes, index_report
+from db_services.memory_service import snapshot_database
+from db_services.migrations import migrate_embedded_comments
+from http_services import get_rate_limit_buckets
+from http_services.compression import Compression
+from http_services.conditional import conditional, set_validators, is_conditional, not_modified, if_match_query
+from http_services.rate_limiter import RateLimiter
+from http_services.streaming import stream_json_array
+from metrics_services import VALIDATION_DURATION
+from metrics_services.instrumentation import init_app as init_metrics
+from models.chapter import Chapter, versioned_update
+from models.chapter_summary import SUMMARY_FIELDS, PROJECTABLE_FIELDS
+from models.chapter_patch import ChapterPatch
 from models.chapter_update import ChapterUpdate
 from models.comment import Comment
+from models.serialization import model_projection, to_response_document
 from models.user import User, Role
 
 APP = Flask(__name__)
 APP.config.from_object('config.Config')
 APP.config['JWT_TOKEN_LOCATION'] = ['cookies']
 APP.config['JWT_COOKIE_CSRF_PROTECT'] = False  # only on dev
+if Config.PROXY_FIX_X_FOR > 0:
+    # remote_addr is the client's address from X-Forwarded-For as set by the trusted proxies, not the last proxy's
+    APP.wsgi_app = ProxyFix(APP.wsgi_app, x_for=Config.PROXY_FIX_X_FOR)
 CACHE = Cache(APP)
+USER_CACHE = get_user_cache(CACHE)
+# a client that wrote recently reads from the primary, a cached response may predate its write
+RESPONSE_CACHE = get_response_cache(CACHE, bypass=lambda: _reads_own_writes())
 
 CORS(APP, supports_credentials=True)  # only on dev
 JWT = JWTManager(APP)
+if Config.METRICS_ENABLED:
+    init_metrics(APP, caches={'user': USER_CACHE, 'response': RESPONSE_CACHE},
+                 pool_statistics=lambda: DB_CONTROLLER.pool_statistics())
+COMPRESSION = Compression(APP, min_size=Config.COMPRESSION_MIN_SIZE, gzip_level=Config.COMPRESSION_GZIP_LEVEL,
+                          brotli_quality=Config.COMPRESSION_BROTLI_QUALITY, cache_size=Config.COMPRESSION_CACHE_SIZE)
+RATE_LIMITER = RateLimiter(APP, get_rate_limit_buckets(), max_concurrent=Config.MAX_CONCURRENT_REQUESTS,
+                           enabled=Config.RATE_LIMIT_ENABLED)
 
 DB_CONTROLLER = get_db_controller()
+GOOGLE_AUTH = get_google_auth()
+COMMENT_WRITER = get_comment_write_behind(
+    DB_CONTROLLER, on_written=lambda *written: _comments_batch_written(*written)) \
+    if Config.COMMENTS_WRITE_BEHIND else None
+
+CHAPTERS_CURSOR_KEYS = ('_id',)
+COMMENTS_CURSOR_KEYS = ('date_added', '_id')
+CHAPTER_PROJECTION = model_projection(Chapter)
+COMMENT_PROJECTION = model_projection(Comment)
+VALIDATORS_PROJECTION = {'version': 1, 'date_updated': 1}
+READ_PRIMARY_COOKIE = 'read_primary'
+EDIT_PROJECTION = {**{field: 1 for field in REVISED_FIELDS}, 'version': 1, 'revision': 1, 'comment_count': 1}
+REVISION_PROJECTION = {'delta': 0, 'editor': 0, 'chapter_id': 0}
+REVISIONS_CURSOR_KEYS = ('version',)
+CHAPTER_EDIT_ATTEMPTS = 3
+
+
+@APP.after_request
+def read_your_writes(response):
+    if g.get('read_primary') and response.status_code < 400:
+        response.set_cookie(READ_PRIMARY_COOKIE, value='1', max_age=Config.DB_READ_YOUR_WRITES_SECONDS,
+                            secure=False, httponly=True)
+    return response
 
 
 @APP.route('/api/v1/google_login', methods=['POST'])
+@RATE_LIMITER.limit('login', Config.RATE_LIMIT_LOGIN, by_user=False)
 def login():
-    auth_code = request.get_json()['code']
-
-    data = {
-        'code': auth_code,
-        # client ID from the credential at google developer console
-        'client_id': GOOGLE_CLIENT_ID,
-        # client secret from the credential at google developer console
-        'client_secret': GOOGLE_SECRET_KEY,
-        'redirect_uri': 'postmessage',
-        'grant_type': 'authorization_code'
-    }
-
-    response = requests.post(
-        'https://oauth2.googleapis.com/token', data=data).json()
-    headers = {
-        'Authorization': f'Bearer {response["access_token"]}'
-    }
-    user_info = requests.get(
-        'https://www.googleapis.com/oauth2/v3/userinfo', headers=headers).json()
-
-    user_from_db = DB_CONTROLLER.find_one(DB_NAME, USERS_COLLECTION,
-                                          {'email': user_info['email']})  # search for user in database
-
-    if not user_from_db:
+    try:
+        user_info = GOOGLE_AUTH.login(request.get_json()['code'])
+    except GoogleAuthError as error:
+        return jsonify({'msg': str(error)}), 401
+    except requests.RequestException:
+        return jsonify({'msg': 'Google sign in is unavailable, try again later'}), 502
+
+    with VALIDATION_DURATION.time('User'):
         user_model = User(**user_info)
-        DB_CONTROLLER.insert_one(
-            DB_NAME, USERS_COLLECTION, user_model.to_bson())
+    # one atomic round trip, existing users (and their role) are left untouched
+    DB_CONTROLLER.update_one(DB_NAME, USERS_COLLECTION, {'email': user_model.email},
+                             {'$setOnInsert': user_model.to_bson()}, upsert=True)
 
     jwt_token = create_access_token(
         identity=user_info['email'])  # create jwt token
@@ -63,49 +117,219 @@ def login():
     return response, 200
 
 
+@APP.route('/api/v1/user/<string:email>/role', methods=['PUT'])
+@PermissionRequired(Role.ADMIN)
+def update_user_role(email):
+    try:
+        role = Role(request.get_json()['role'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'msg': f'role must be one of {", ".join(role.value for role in Role)}'}), 400
+
+    update_result = DB_CONTROLLER.update_one(DB_NAME, USERS_COLLECTION, {'email': email},
+                                             {'$set': {'role': role.value}})
+    if update_result.matched_count == 0:
+        return jsonify({'msg': f'User with email {email} not found'}), 404
+
+    USER_CACHE.invalidate(email)
+    return jsonify({'msg': 'User role updated successfully'}), 202
+
+
 @APP.route('/api/v1/chapters', methods=['GET'])
-@CACHE.cached(timeout=30, query_string=True)
+@conditional
+@RESPONSE_CACHE.cached('chapters')
 def get_chapters():
-    all_chapters = DB_CONTROLLER.find(DB_NAME, CHAPTERS_COLLECTION_NAME)
-    all_chapters = [Chapter(**chapter).to_json() for chapter in all_chapters]
+    try:
+        fields = parse_fields(request.args, SUMMARY_FIELDS, PROJECTABLE_FIELDS)
+        limit, query = parse_page_args(request.args, CHAPTERS_CURSOR_KEYS, CHAPTERS_PAGE_SIZE, CHAPTERS_MAX_PAGE_SIZE)
+    except ValueError as error:
+        return jsonify({'msg': str(error)}), 400
 
-    return all_chapters, 200
+    chapters = DB_CONTROLLER.find(DB_NAME, CHAPTERS_COLLECTION_NAME, query, projection={field: 1 for field in fields},
+                                  sort=[('_id', 1)], limit=limit + 1, secondary_ok=_secondary_ok())
+    chapters, next_cursor = paginate(chapters, CHAPTERS_CURSOR_KEYS, limit)
+
+    response = json_response({'chapters': [to_response_document(chapter) for chapter in chapters],
+                              'next_cursor': next_cursor})
+    response.add_etag()
+    return response
+
+
+@APP.route('/api/v1/chapters/stream', methods=['GET'])
+def stream_chapters():
+    """every chapter in one response, encoded from the cursor as it is read instead of in pages"""
+    try:
+        fields = parse_fields(request.args, SUMMARY_FIELDS, PROJECTABLE_FIELDS)
+    except ValueError as error:
+        return jsonify({'msg': str(error)}), 400
+
+    chapters = DB_CONTROLLER.find(DB_NAME, CHAPTERS_COLLECTION_NAME, {}, projection={field: 1 for field in fields},
+                                  sort=[('_id', 1)], secondary_ok=_secondary_ok())
+    return APP.response_class(stream_json_array(chapters, 'chapters'), mimetype='application/json')
+
+
+@APP.route('/api/v1/chapters/search', methods=['GET'])
+@conditional
+@RESPONSE_CACHE.cached('chapters')
+def search_chapters():
+    try:
+        query = search_query(request.args)
+        limit = int(request.args.get('limit', CHAPTERS_PAGE_SIZE))
+        offset = int(request.args.get('offset', 0))
+    except ValueError as error:
+        return jsonify({'msg': str(error)}), 400
+    if not 0 < limit <= CHAPTERS_MAX_PAGE_SIZE or not 0 <= offset <= CHAPTERS_SEARCH_MAX_OFFSET:
+        return jsonify({'msg': f'limit must be between 1 and {CHAPTERS_MAX_PAGE_SIZE} '
+                               f'and offset between 0 and {CHAPTERS_SEARCH_MAX_OFFSET}'}), 400
+
+    projection = {field: 1 for field in SUMMARY_FIELDS}
+    sort = [('_id', 1)]
+    if '$text' in query:
+        projection['score'] = {'$meta': 'textScore'}
+        sort = [('score', {'$meta': 'textScore'}), ('_id', 1)]
+    try:
+        chapters = list(DB_CONTROLLER.find(DB_NAME, CHAPTERS_COLLECTION_NAME, query, projection=projection,
+                                           sort=sort, limit=limit + 1, skip=offset, secondary_ok=_secondary_ok()))
+    except OperationFailure as error:
+        if error.code != INDEX_NOT_FOUND:
+            raise
+        # DB_ENSURE_INDEXES is off by default, the text index exists only once ensure-indexes ran
+        APP.logger.error('text search without the chapters text index: %s', error)
+        return jsonify({'msg': 'Text search (q) is unavailable, the chapters text index is missing. '
+                               'Run flask --app app ensure-indexes to create it.'}), 503
+
+    response = json_response({'chapters': [to_response_document(chapter) for chapter in chapters[:limit]],
+                              'next_offset': offset + limit if len(chapters) > limit else None})
+    response.add_etag()
+    return response
 
 
 @APP.route('/api/v1/chapter/<string:chapter_id>', methods=['GET'])
+@conditional
+@RESPONSE_CACHE.cached('chapter:{chapter_id}')
 def get_chapter(chapter_id):
+    secondary_ok = _secondary_ok()
+    if is_conditional():
+        # revalidation reads the validators only, the full chapter is fetched when it changed
+        validators = DB_CONTROLLER.find_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': ObjectId(chapter_id)},
+                                            projection=VALIDATORS_PROJECTION, secondary_ok=secondary_ok)
+        response = not_modified(validators) if validators else None
+        if response is not None:
+            return response
+
     retrieved_chapter = DB_CONTROLLER.find_one(
-        DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': ObjectId(chapter_id)})
+        DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': ObjectId(chapter_id)}, projection=CHAPTER_PROJECTION,
+        secondary_ok=secondary_ok)
     if not retrieved_chapter:
         return jsonify({'msg': f'Chapter with chapter_id {chapter_id} was not found', '_id': chapter_id}), 404
 
-    retrieved_chapter['_id'] = ObjectId(retrieved_chapter['_id'])
-    chapter = Chapter(**retrieved_chapter)
-    return chapter.to_json(), 200
+    return set_validators(json_response(to_response_document(retrieved_chapter)), retrieved_chapter)
 
 
 @APP.route('/api/v1/chapter/<string:chapter_id>', methods=['PUT'])
 @PermissionRequired(Role.ADMIN)
-def update_chapter(chapter_id):
+def update_chapter(current_user, chapter_id):
     try:
-        updated_chapter = ChapterUpdate(**request.get_json())
+        with VALIDATION_DURATION.time('ChapterUpdate'):
+            updated_chapter = ChapterUpdate(**request.get_json())
     except Exception:
         return jsonify({'msg': 'Chapter is not in the correct schema'}), 400
 
-    updated_result = DB_CONTROLLER.update_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': ObjectId(chapter_id)},
-                                              {'$set': updated_chapter.to_bson()})
+    return _edit_chapter(chapter_id, updated_chapter.to_bson(), current_user.email)
 
-    if updated_result.matched_count == 0:
-        return jsonify({'msg': f'Chapter with chapter_id {chapter_id} not found', '_id': chapter_id}), 404
 
-    return jsonify({'msg': 'Chapter updated successfully'}), 202
+@APP.route('/api/v1/chapter/<string:chapter_id>', methods=['PATCH'])
+@PermissionRequired(Role.ADMIN)
+def patch_chapter(current_user, chapter_id):
+    try:
+        with VALIDATION_DURATION.time('ChapterPatch'):
+            changes = ChapterPatch(**request.get_json()).to_bson()
+    except Exception:
+        return jsonify({'msg': 'Chapter patch is not in the correct schema'}), 400
+    if not changes:
+        return jsonify({'msg': 'Chapter patch has no fields to update'}), 400
+
+    return _edit_chapter(chapter_id, changes, current_user.email)
+
+
+@APP.route('/api/v1/chapter/<string:chapter_id>/revisions', methods=['GET'])
+def get_chapter_revisions(chapter_id):
+    try:
+        limit, query = parse_page_args(request.args, REVISIONS_CURSOR_KEYS, REVISIONS_PAGE_SIZE,
+                                       REVISIONS_MAX_PAGE_SIZE)
+    except ValueError as error:
+        return jsonify({'msg': str(error)}), 400
+
+    revisions = DB_CONTROLLER.find(DB_NAME, CHAPTER_REVISIONS_COLLECTION, {'chapter_id': ObjectId(chapter_id), **query},
+                                   projection=REVISION_PROJECTION, sort=[('version', 1)], limit=limit + 1)
+    revisions, next_cursor = paginate(revisions, REVISIONS_CURSOR_KEYS, limit)
+    return json_response({'revisions': [to_response_document(revision) for revision in revisions],
+                          'next_cursor': next_cursor})
+
+
+@APP.route('/api/v1/chapter/<string:chapter_id>/diff', methods=['GET'])
+def get_chapter_diff(chapter_id):
+    try:
+        from_version, to_version = int(request.args['from']), int(request.args['to'])
+    except (KeyError, ValueError):
+        return jsonify({'msg': 'from and to must be chapter versions'}), 400
+
+    chapter = DB_CONTROLLER.find_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': ObjectId(chapter_id)},
+                                     projection=EDIT_PROJECTION)
+    if not chapter:
+        return jsonify({'msg': f'Chapter with chapter_id {chapter_id} was not found', '_id': chapter_id}), 404
+    current_version = chapter.get('version', 0)
+    if not (0 <= from_version <= current_version and 0 <= to_version <= current_version):
+        return jsonify({'msg': f'from and to must be between 0 and {current_version}', '_id': chapter_id}), 400
+
+    revisions = list(DB_CONTROLLER.find(DB_NAME, CHAPTER_REVISIONS_COLLECTION,
+                                        {'chapter_id': chapter['_id'],
+                                         'version': {'$gte': min(from_version, to_version)}},
+                                        projection={'version': 1, 'previous': 1, 'delta': 1}))
+    try:
+        changes = diff(restore(chapter, revisions, from_version), restore(chapter, revisions, to_version))
+    except MissingRevision as error:
+        APP.logger.error('history of chapter %s is broken: %s', chapter_id, error)
+        return jsonify({'msg': f'The history of chapter {chapter_id} is incomplete, {error}', '_id': chapter_id}), 500
+    return json_response({'_id': chapter_id, 'from': from_version, 'to': to_version, 'changes': changes})
+
+
+@APP.route('/api/v1/stats/<string:dimension>', methods=['GET'])
+@conditional
+@RESPONSE_CACHE.cached('stats')
+def get_stats(dimension):
+    if dimension not in stats.DIMENSIONS:
+        return jsonify({'msg': f'Expected one of the dimensions {", ".join(stats.DIMENSIONS)}'}), 404
+
+    rollups = DB_CONTROLLER.find(DB_NAME, CHAPTER_STATS_COLLECTION, {'dimension': dimension, 'chapters': {'$gt': 0}},
+                                 sort=[('key', 1)], secondary_ok=_secondary_ok())
+    response = json_response({'stats': [stats.summary(rollup) for rollup in rollups]})
+    response.add_etag()
+    return response
+
+
+@APP.route('/api/v1/stats/<string:dimension>/<string:key>', methods=['GET'])
+@conditional
+@RESPONSE_CACHE.cached('stats')
+def get_stats_of(dimension, key):
+    if dimension not in stats.DIMENSIONS:
+        return jsonify({'msg': f'Expected one of the dimensions {", ".join(stats.DIMENSIONS)}'}), 404
+
+    rollup = DB_CONTROLLER.find_one(DB_NAME, CHAPTER_STATS_COLLECTION, {'_id': stats.stats_id(dimension, key)},
+                                    secondary_ok=_secondary_ok())
+    if not rollup or not rollup.get('chapters'):
+        return jsonify({'msg': f'No chapters with {dimension} {key}'}), 404
+
+    response = json_response(stats.summary(rollup))
+    response.add_etag()
+    return response
 
 
 @APP.route('/api/v1/chapter', methods=['POST'])
 @PermissionRequired(Role.ADMIN)
 def post_chapter():
     try:
-        chapter = Chapter(**request.get_json())
+        with VALIDATION_DURATION.time('Chapter'):
+            chapter = Chapter(**request.get_json())
     except Exception:
         return jsonify({'msg': 'Chapter is not in the correct schema'}), 400
 
@@ -115,99 +339,368 @@ def post_chapter():
     if not new_chapter_id:
         return jsonify({'msg': 'Chapter could not be created'}), 500
 
+    _chapters_written([(None, chapter.to_bson())])
     return jsonify({'msg': 'Chapter created successfully', '_id': str(new_chapter_id)}), 201
 
 
+@APP.route('/api/v1/chapters/import', methods=['POST'])
+@PermissionRequired(Role.ADMIN)
+def import_chapters():
+    """Imports newline delimited json chapters, the body is read line by line and inserted in batches."""
+    inserted, errors, batch = [], [], []
+    for line_number, line in enumerate(request.stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            chapter = json.loads(line)
+        except ValueError:
+            errors.append((line_number, 'Line is not valid json'))
+            continue
+        try:
+            with VALIDATION_DURATION.time('Chapter'):
+                chapter = Chapter(**chapter)
+            batch.append((line_number, chapter.to_bson()))
+        except Exception:
+            errors.append((line_number, 'Chapter is not in the correct schema'))
+            continue
+
+        if len(batch) == CHAPTERS_IMPORT_BATCH_SIZE:
+            _insert_chapters(batch, inserted, errors)
+            batch = []
+    if batch:
+        _insert_chapters(batch, inserted, errors)
+
+    return jsonify({'inserted': [{'line': line_number, '_id': str(chapter_id)} for line_number, chapter_id in inserted],
+                    'errors': [{'line': line_number, 'msg': message} for line_number, message in sorted(errors)]}), \
+        207 if errors else 201
+
+
+@APP.route('/api/v1/comment/<string:chapter_id>', methods=['GET'])
+@RESPONSE_CACHE.cached('comments:{chapter_id}')
+def get_comments(chapter_id):
+    try:
+        limit, query = parse_page_args(request.args, COMMENTS_CURSOR_KEYS, COMMENTS_PAGE_SIZE, COMMENTS_MAX_PAGE_SIZE)
+    except ValueError as error:
+        return jsonify({'msg': str(error)}), 400
+
+    comments = DB_CONTROLLER.find(DB_NAME, COMMENTS_COLLECTION_NAME, {'chapter_id': ObjectId(chapter_id), **query},
+                                  projection=COMMENT_PROJECTION, sort=[(key, 1) for key in COMMENTS_CURSOR_KEYS],
+                                  limit=limit + 1, secondary_ok=_secondary_ok())
+    comments, next_cursor = paginate(comments, COMMENTS_CURSOR_KEYS, limit)
+
+    return json_response({'comments': [to_response_document(comment) for comment in comments],
+                          'next_cursor': next_cursor})
+
+
 @APP.route('/api/v1/comment/<string:chapter_id>', methods=['POST'])
+@RATE_LIMITER.limit('comments', Config.RATE_LIMIT_COMMENTS)
 @PermissionRequired(Role.DEFAULT)
 def post_comment(current_user, chapter_id):
     new_comment = request.get_json()
     new_comment['_id'] = ObjectId()
+    new_comment['chapter_id'] = ObjectId(chapter_id)
     new_comment['name'] = current_user.name
     new_comment['email'] = current_user.email
     new_comment['picture'] = current_user.picture
 
     try:
-        comment = Comment(**new_comment)
+        with VALIDATION_DURATION.time('Comment'):
+            comment = Comment(**new_comment)
     except Exception:
         return jsonify({'msg': 'Comment is not in the correct schema'}), 400
 
+    if COMMENT_WRITER is not None:
+        return _write_behind(COMMENT_WRITER.insert, comment.to_bson()) or \
+            (jsonify({'msg': 'Comment created successfully', '_id': str(comment.id)}), 202)
+
     update_result = DB_CONTROLLER.update_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': ObjectId(chapter_id)},
-                                             {'$push': {'comments': comment.to_bson()}})
+                                             write_effects.comment_count_update(1))
 
     if update_result.matched_count == 0:
         return jsonify({'msg': f'Chapter with chapter_id {chapter_id} not found', '_id': chapter_id}), 404
 
+    try:
+        DB_CONTROLLER.insert_one(DB_NAME, COMMENTS_COLLECTION_NAME, comment.to_bson())
+    except PyMongoError:
+        DB_CONTROLLER.update_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': ObjectId(chapter_id)},
+                                 write_effects.comment_count_update(-1))
+        return jsonify({'msg': 'Comment could not be created'}), 500
+
+    _comments_written({ObjectId(chapter_id)}, {ObjectId(chapter_id): 1})
     return jsonify({'msg': 'Comment created successfully', '_id': str(comment.id)}), 202
 
 
 @APP.route('/api/v1/comment/<string:chapter_id>/<string:comment_id>', methods=['PUT'])
+@RATE_LIMITER.limit('comments', Config.RATE_LIMIT_COMMENTS)
 @PermissionRequired(Role.DEFAULT)
 def update_comment(current_user, chapter_id, comment_id):
-    chapter = DB_CONTROLLER.find_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {
-                                     "_id": ObjectId(chapter_id)})
-    if not chapter:
-        return jsonify(
-            {'msg': f'chapter with chapter_id {chapter_id} was not found', '_id': chapter_id}), 404
-
-    # Find the comment in the chapter document
-    comments = chapter.get("comments")
-    comment_to_update, comment_index = None, None
-    for comment in comments:
-        if ObjectId(comment["_id"]) == ObjectId(comment_id) and comment["name"] == current_user.name:
-            comment_to_update = comment
-            comment_index = comments.index(comment)
-            break
-
-    if not comment_to_update:
-        return jsonify(
-            {'msg': f'comment with comment_id {comment_id} or with username {current_user.name} was not found',
-             '_id': chapter_id}), 404
-
     new_comment = request.get_json()
-    new_comment['_id'] = comment_to_update['_id']
+    new_comment['_id'] = ObjectId(comment_id)
+    new_comment['chapter_id'] = ObjectId(chapter_id)
     new_comment['name'] = current_user.name
     new_comment['email'] = current_user.email
     new_comment['picture'] = current_user.picture
+    new_comment['date_updated'] = datetime.now()
 
     try:
-        new_comment = Comment(**new_comment)
+        with VALIDATION_DURATION.time('Comment'):
+            new_comment = Comment(**new_comment)
     except Exception:
         return jsonify({'msg': 'New comment is not in the correct schema'}), 400
 
-    # Replace the updated comment in the comments list
-    comments[comment_index] = new_comment.to_bson()
-
-    result = DB_CONTROLLER.update_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {"_id": ObjectId(chapter_id)},
-                                      {"$set": {"comments": comments}})
+    updated_fields = {key: value for key, value in new_comment.to_bson().items()
+                      if key not in ('_id', 'chapter_id', 'name', 'date_added')}
+    if COMMENT_WRITER is not None:
+        return _write_behind(COMMENT_WRITER.update, ObjectId(chapter_id), ObjectId(comment_id), current_user.name,
+                             updated_fields) or (jsonify({'msg': 'Comment updated successfully'}), 202)
+
+    result = DB_CONTROLLER.update_one(DB_NAME, COMMENTS_COLLECTION_NAME,
+                                      {'_id': ObjectId(comment_id), 'chapter_id': ObjectId(chapter_id),
+                                       'name': current_user.name},
+                                      {'$set': updated_fields})
+
+    if result.matched_count == 0:
+        if not DB_CONTROLLER.find_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': ObjectId(chapter_id)},
+                                      projection={'_id': 1}):
+            return jsonify(
+                {'msg': f'chapter with chapter_id {chapter_id} was not found', '_id': chapter_id}), 404
+        return jsonify(
+            {'msg': f'comment with comment_id {comment_id} or with username {current_user.name} was not found',
+             '_id': chapter_id}), 404
 
     if result.modified_count == 0:
         return jsonify(
             {'msg': f'Update comment with comment_id {comment_id} and user name {current_user.name} failed'}), 404
 
+    _comments_written({ObjectId(chapter_id)})
     return jsonify({'msg': 'Comment updated successfully'}), 202
 
 
 @APP.route('/api/v1/comment/<string:chapter_id>/<string:comment_id>', methods=['DELETE'])
+@RATE_LIMITER.limit('comments', Config.RATE_LIMIT_COMMENTS)
 @PermissionRequired(Role.DEFAULT)
 def delete_comment(current_user, chapter_id, comment_id):
-    comment_to_delete = {"_id": ObjectId(chapter_id), "comments._id": ObjectId(comment_id),
-                         "comments.name": current_user.name}
+    if COMMENT_WRITER is not None:
+        return _write_behind(COMMENT_WRITER.delete, ObjectId(chapter_id), ObjectId(comment_id), current_user.name) or \
+            (jsonify({'msg': 'Comment deleted successfully'}), 202)
 
-    query_to_delete = {"$pull": {"comments": {
-        "_id": ObjectId(comment_id), "name": current_user.name}}}
+    comment_to_delete = {'_id': ObjectId(comment_id), 'chapter_id': ObjectId(chapter_id), 'name': current_user.name}
 
-    result = DB_CONTROLLER.update_one(
-        DB_NAME, CHAPTERS_COLLECTION_NAME, comment_to_delete, query_to_delete)
+    result = DB_CONTROLLER.delete_one(DB_NAME, COMMENTS_COLLECTION_NAME, comment_to_delete)
 
-    if result.modified_count == 0:
+    if result.deleted_count == 0:
         return jsonify(
             {
                 'msg': f'deleting comment with comment_id {comment_id} and user name '
                        f'{current_user.name} under chapter with chapter_id {chapter_id} failed'}), 404
 
+    DB_CONTROLLER.update_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': ObjectId(chapter_id)},
+                             write_effects.comment_count_update(-1))
+
+    _comments_written({ObjectId(chapter_id)}, {ObjectId(chapter_id): -1})
     return jsonify({'msg': 'Comment deleted successfully'}), 202
 
 
+@APP.route('/api/v1/comments', methods=['DELETE'])
+@PermissionRequired(Role.ADMIN)
+def moderate_comments():
+    """Deletes a list of {chapter_id, comment_id} comments of any user, errors are reported per list index."""
+    comments = request.get_json(silent=True)
+    if not isinstance(comments, list) or not 0 < len(comments) <= COMMENTS_MODERATION_MAX_BATCH:
+        return jsonify({'msg': f'Expected a list of 1 to {COMMENTS_MODERATION_MAX_BATCH} comments'}), 400
+
+    to_delete, errors = [], []
+    for index, comment in enumerate(comments):
+        try:
+            to_delete.append((index, ObjectId(comment['chapter_id']), ObjectId(comment['comment_id'])))
+        except (KeyError, TypeError, InvalidId):
+            errors.append((index, 'Expected a chapter_id and a comment_id'))
+
+    deleted, removed = [], {}
+    if to_delete:
+        results = delete_comments(DB_CONTROLLER, DB_NAME, to_delete)
+        _extend(deleted, errors, results)
+        removed = results[2]
+
+    if deleted:
+        _comments_written({chapter_id for _, chapter_id in deleted},
+                          {chapter_id: -count for chapter_id, count in removed.items()})
+    return jsonify({'deleted': sorted(index for index, _ in deleted),
+                    'errors': [{'index': index, 'msg': message} for index, message in sorted(errors)]}), \
+        207 if errors else 202
+
+
+@APP.route('/api/v1/admin/db/pool', methods=['GET'])
+@PermissionRequired(Role.ADMIN)
+def get_pool_statistics():
+    """Connection pool options and counters of this worker process."""
+    return jsonify(DB_CONTROLLER.pool_statistics()), 200
+
+
+def _secondary_ok() -> bool:
+    """reads may go to a replica, unless this client wrote recently and has to read its own writes"""
+    if not DB_CONTROLLER.routes_reads or _reads_own_writes():
+        return False
+    # a replica may lag behind a write that bumped the namespaces already, its responses must expire soon
+    RESPONSE_CACHE.limit_timeout(Config.MONGO_MAX_STALENESS_SECONDS if Config.MONGO_MAX_STALENESS_SECONDS > 0
+                                 else Config.RESPONSE_CACHE_REPLICA_TIMEOUT)
+    return True
+
+
+def _reads_own_writes() -> bool:
+    return DB_CONTROLLER.routes_reads and bool(request.cookies.get(READ_PRIMARY_COOKIE))
+
+
+def _written(*namespaces: str):
+    """bumps the cached namespaces a write changed and sends the writer's next reads to the primary"""
+    RESPONSE_CACHE.bump(*namespaces)
+    g.read_primary = True
+
+
+def _edit_chapter(chapter_id: str, changes: dict, editor: str):
+    """
+    writes the fields of `changes` that differ from the stored chapter and keeps the replaced content as a
+    revision. The write only applies to the version it was computed from, a concurrent edit makes it retry.
+    The revision is saved first, a chapter is never ahead of its history: only one edit can save the revision
+    of a version (unique chapter_id and version), and the revision of an edit that lost is removed again.
+    """
+    try:
+        precondition = if_match_query(chapter_id)
+    except ValueError as error:
+        return jsonify({'msg': str(error), '_id': chapter_id}), 412
+
+    for _ in range(CHAPTER_EDIT_ATTEMPTS):
+        chapter = DB_CONTROLLER.find_one(DB_NAME, CHAPTERS_COLLECTION_NAME,
+                                         {'_id': ObjectId(chapter_id), **precondition}, projection=EDIT_PROJECTION)
+        if not chapter:
+            if precondition and DB_CONTROLLER.find_one(DB_NAME, CHAPTERS_COLLECTION_NAME,
+                                                       {'_id': ObjectId(chapter_id)}, projection={'_id': 1}):
+                return jsonify({'msg': f'Chapter with chapter_id {chapter_id} was modified, If-Match does not hold',
+                                '_id': chapter_id}), 412
+            return jsonify({'msg': f'Chapter with chapter_id {chapter_id} not found', '_id': chapter_id}), 404
+
+        delta = reverse_delta(chapter, changes)
+        if not delta:
+            return jsonify({'msg': 'Chapter updated successfully'}), 202
+
+        try:
+            revision_id = DB_CONTROLLER.insert_one(DB_NAME, CHAPTER_REVISIONS_COLLECTION,
+                                                   revision_document(chapter, delta, editor))
+        except DuplicateKeyError:
+            continue  # a concurrent edit of this version holds its revision
+
+        updated_result = DB_CONTROLLER.update_one(
+            DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': chapter['_id'], 'version': chapter.get('version')},
+            versioned_update({'$set': {**{field: changes[field] for field in delta},
+                                       'revision': chapter.get('version', 0)}}))
+        if updated_result.matched_count:
+            break
+        _remove_revision(revision_id)
+    else:
+        return jsonify({'msg': f'Chapter with chapter_id {chapter_id} is being edited, try again',
+                        '_id': chapter_id}), 409
+
+    _chapters_written([(chapter, {**chapter, **{field: changes[field] for field in delta}})])
+    return jsonify({'msg': 'Chapter updated successfully'}), 202
+
+
+def _remove_revision(revision_id):
+    try:
+        DB_CONTROLLER.delete_one(DB_NAME, CHAPTER_REVISIONS_COLLECTION, {'_id': revision_id})
+    except PyMongoError:  # left out of the chain, restore never reaches it
+        APP.logger.exception('revision %s of an edit that lost was not removed', revision_id)
+
+
+def _write_behind(mutation, *args):
+    """queues a comment mutation, the error response when the queue is full"""
+    try:
+        mutation(*args)
+    except QueueFull as error:
+        return jsonify({'msg': str(error)}), 503, {'Retry-After': '1'}
+    g.read_primary = True
+    return None
+
+
+def _comments_batch_written(chapter_ids: set, comment_counts: dict):
+    """called by the write-behind workers once a batch of comment mutations is in the database"""
+    with APP.app_context():
+        write_effects.comments_written(DB_CONTROLLER, DB_NAME, RESPONSE_CACHE, chapter_ids, comment_counts)
+
+
+def _insert_chapters(batch: list, inserted: list, errors: list):
+    results = insert_batch(DB_CONTROLLER, DB_NAME, CHAPTERS_COLLECTION_NAME, batch)
+    _extend(inserted, errors, results)
+    inserted_ids = {chapter_id for _, chapter_id in results[0]}
+    inserted_chapters = [(None, record) for _, record in batch if record['_id'] in inserted_ids]
+    if inserted_chapters:
+        _chapters_written(inserted_chapters)
+
+
+def _chapters_written(chapters: list):
+    """`chapters` are `(old, new)` documents, see write_effects.chapters_written"""
+    write_effects.chapters_written(DB_CONTROLLER, DB_NAME, RESPONSE_CACHE, chapters)
+    _written()
+
+
+def _comments_written(chapter_ids: set, comment_counts: dict = None):
+    write_effects.comments_written(DB_CONTROLLER, DB_NAME, RESPONSE_CACHE, chapter_ids, comment_counts)
+    _written()
+
+
+def _extend(succeeded: list, failed: list, results: tuple):
+    succeeded.extend(results[0])
+    failed.extend(results[1])
+
+
+@APP.cli.command('migrate-comments')
+def migrate_comments_command():
+    """Move the comments embedded in chapter documents into the comments collection."""
+    migrated_count = migrate_embedded_comments(DB_CONTROLLER, DB_NAME)
+    click.echo(f'migrated {migrated_count} comments')
+
+
+@APP.cli.command('ensure-indexes')
+def ensure_indexes_command():
+    """Create the indexes declared in db_services.indexes."""
+    for index_name in ensure_indexes(DB_CONTROLLER, DB_NAME):
+        click.echo(f'ensured {index_name}')
+
+
+@APP.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the chapter stats of every book, holy book and tag from the chapters."""
+    removed_count = stats.rebuild(DB_CONTROLLER, DB_NAME)
+    RESPONSE_CACHE.bump('stats')
+    click.echo(f'rebuilt chapter stats, removed {removed_count} stale rollups')
+
+
+@APP.cli.command('snapshot-memory')
+@click.argument('path')
+def snapshot_memory_command(path):
+    """Write the collections to a snapshot the in-memory backend (DB_BACKEND=memory) loads."""
+    for collection_name, count in snapshot_database(DB_CONTROLLER, DB_NAME, path).items():
+        click.echo(f'{collection_name}: {count} documents')
+    click.echo(f'wrote {path}')
+
+
+@APP.cli.command('export-static')
+@click.argument('directory')
+@click.option('--full', is_flag=True, help='Render every chapter and page again instead of only what changed.')
+def export_static_command(directory, full):
+    """Export the chapters and chapter pages as pre-compressed static JSON files with a manifest."""
+    counts = export.export(DB_CONTROLLER, DB_NAME, directory, CHAPTERS_PAGE_SIZE, full=full)
+    click.echo(f'{counts["chapters"]} chapters: wrote {counts["chapters_written"]} chapters and '
+               f'{counts["pages_written"]} pages, removed {counts["chapters_removed"]} chapters')
+
+
+@APP.cli.command('index-report')
+def index_report_command():
+    """Report missing and unused indexes and hot queries that scan a whole collection."""
+    for collection_name, report in index_report(DB_CONTROLLER, DB_NAME).items():
+        click.echo(f'{collection_name}:')
+        for key, values in report.items():
+            click.echo(f'  {key}: {values if values else "none"}')
+
+
 if __name__ == '__main__':
     APP.run(debug=True, host='localhost')
@@ -1,9 +1,16 @@
+import base64
+import binascii
 import functools
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from flask import abort
+import time
+from bson import json_util
+from flask import abort, current_app
 from inspect import getfullargspec
 
+from auth_services.jwt_identity import jwt_identity
 from config import DB_NAME, USERS_COLLECTION
+from metrics_services import AUTH_LOOKUP_DURATION
+from models.chapter import HollyBook
+from models.serialization import dumps
 from models.user import User, Role
 
 
@@ -12,23 +19,116 @@ class PermissionRequired:
         self.permission = permission
 
     def __call__(self, function):
-        @jwt_required()
+        pass_current_user = 'current_user' in getfullargspec(function).args
+
         @functools.wraps(function)
         def wrapped_function(*args, **kwargs):
-            from app import DB_CONTROLLER
+            from app import DB_CONTROLLER, USER_CACHE
 
-            current_email = get_jwt_identity()
-            user_from_db = DB_CONTROLLER.find_one(DB_NAME, USERS_COLLECTION, {'email': current_email})
+            current_email = jwt_identity()
+            started = time.perf_counter()
+            user_model = USER_CACHE.get(current_email)
+            if user_model is None:
+                user_from_db = DB_CONTROLLER.find_one(DB_NAME, USERS_COLLECTION, {'email': current_email})
 
-            if not user_from_db:
-                abort(401)
-            user_model = User(**user_from_db)
+                if not user_from_db:
+                    abort(401)
+                user_model = User(**user_from_db)
+                USER_CACHE.set(current_email, user_model)
+                AUTH_LOOKUP_DURATION.observe(time.perf_counter() - started, 'db')
+            else:
+                AUTH_LOOKUP_DURATION.observe(time.perf_counter() - started, 'cache')
 
             if not (user_model.role == self.permission or user_model.role == Role.ADMIN):
                 abort(403)
 
-            if 'current_user' in getfullargspec(function).args:
+            if pass_current_user:
                 kwargs['current_user'] = user_model
             return function(*args, **kwargs)
 
         return wrapped_function
+
+
+def encode_cursor(document: dict, keys: tuple) -> str:
+    values = [document.get(key) for key in keys]
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, keys: tuple) -> list:
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        raise ValueError(f'cursor {cursor} is not valid')
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError(f'cursor {cursor} is not valid')
+    return values
+
+
+def keyset_query(keys: tuple, values: list) -> dict:
+    """documents sorted after `values` in ascending (keys) order"""
+    conditions = []
+    for index, key in enumerate(keys):
+        condition = {previous_key: values[i] for i, previous_key in enumerate(keys[:index])}
+        condition[key] = {'$gt': values[index]}
+        conditions.append(condition)
+    return conditions[0] if len(conditions) == 1 else {'$or': conditions}
+
+
+def parse_fields(args, default_fields: tuple, projectable_fields: tuple) -> list:
+    fields = args.get('fields')
+    fields = fields.split(',') if fields else list(default_fields)
+    if not set(fields) <= set(projectable_fields):
+        raise ValueError(f'fields must be a subset of {", ".join(projectable_fields)}')
+    return fields
+
+
+def parse_page_args(args, keys: tuple, default_limit: int, max_limit: int):
+    """returns the page limit and the keyset query continuing from the cursor in the query string `args`"""
+    limit = int(args.get('limit', default_limit))
+    if not 0 < limit <= max_limit:
+        raise ValueError(f'limit must be between 1 and {max_limit}')
+    cursor = args.get('cursor')
+    query = keyset_query(keys, decode_cursor(cursor, keys)) if cursor else {}
+    return limit, query
+
+
+def paginate(documents, keys: tuple, limit: int):
+    """`documents` is fetched with limit + 1 so the extra document tells whether there is a next page"""
+    page = list(documents)
+    next_cursor = encode_cursor(page[limit - 1], keys) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+
+def search_query(args) -> dict:
+    """
+    chapters query of the search args: `q` (text, needs the chapters text index), `tags` (comma separated,
+    all required), `holy_book` and rating ranges as `min_rating.<dimension>` / `max_rating.<dimension>`
+    """
+    query = {}
+    if args.get('q'):
+        query['$text'] = {'$search': args['q']}
+    if args.get('tags'):
+        query['tags'] = {'$all': args['tags'].split(',')}
+    if args.get('holy_book'):
+        try:
+            query['holy_book'] = HollyBook(int(args['holy_book'])).value
+        except ValueError:
+            raise ValueError(f'holy_book must be one of {", ".join(str(book.value) for book in HollyBook)}')
+
+    for arg, value in args.items():
+        bound, _, dimension = arg.partition('.')
+        if bound not in ('min_rating', 'max_rating'):
+            continue
+        if not dimension.isidentifier():
+            raise ValueError(f'{arg} is not a rating dimension')
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError(f'{arg} must be a number')
+        query.setdefault(f'rating.{dimension}', {})['$gte' if bound == 'min_rating' else '$lte'] = value
+    return query
+
+
+def json_response(data, status: int = 200):
+    """serializes read path payloads straight from BSON, skipping the pydantic round trip"""
+    return current_app.response_class(dumps(data), status=status, mimetype='application/json')
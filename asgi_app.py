@@ -0,0 +1,400 @@
+"""
+ASGI variant of the api (serve with `uvicorn asgi_app:APP`).
+Serves the core /api/v1 routes of app.py (sign in, user roles, chapters and comments) on top of Motor, so a single
+process keeps serving requests while others wait on Mongo or Google. Tokens are interchangeable with the Flask app's.
+Writes bump the response cache namespaces and update the chapter stats like the Flask app's.
+"""
+import functools
+import uuid
+from datetime import datetime, timezone
+from inspect import getfullargspec
+
+import jwt
+import requests
+from anyio import to_thread
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+from werkzeug.http import parse_etags
+
+from app_utils import parse_page_args, paginate
+from cache_services import get_cache, get_response_cache
+from cache_services.user_cache import UserCache
+from auth_services import get_google_auth
+from auth_services.google_auth import GoogleAuthError
+from config import Config, DB_NAME, USERS_COLLECTION, \
+    CHAPTERS_COLLECTION_NAME, COMMENTS_COLLECTION_NAME, CHAPTERS_PAGE_SIZE, CHAPTERS_MAX_PAGE_SIZE, \
+    COMMENTS_PAGE_SIZE, COMMENTS_MAX_PAGE_SIZE, CHAPTER_REVISIONS_COLLECTION
+from chapter_services import write_effects
+from chapter_services.revisions import REVISED_FIELDS, reverse_delta, revision_document
+from db_services import get_async_db_controller, get_db_controller
+from http_services.conditional import if_match_query
+from models.chapter import Chapter, versioned_update
+from models.chapter_summary import SUMMARY_FIELDS, PROJECTABLE_FIELDS
+from models.chapter_patch import ChapterPatch
+from models.chapter_update import ChapterUpdate
+from models.comment import Comment
+from models.serialization import dumps, model_projection, to_response_document
+from models.user import User, Role
+
+DB_CONTROLLER = get_async_db_controller()
+GOOGLE_AUTH = get_google_auth()
+USER_CACHE = UserCache(Config.USER_CACHE_TTL, Config.USER_CACHE_SIZE)
+# the Flask workers' cached responses and the chapter stats, written with the synchronous controller in a thread
+RESPONSE_CACHE = get_response_cache(get_cache())
+STATS_DB_CONTROLLER = get_db_controller()
+
+JWT_COOKIE_NAME = 'access_token_cookie'
+CHAPTERS_CURSOR_KEYS = ('_id',)
+COMMENTS_CURSOR_KEYS = ('date_added', '_id')
+CHAPTER_PROJECTION = model_projection(Chapter)
+COMMENT_PROJECTION = model_projection(Comment)
+EDIT_PROJECTION = {**{field: 1 for field in REVISED_FIELDS}, 'version': 1, 'revision': 1}
+CHAPTER_EDIT_ATTEMPTS = 3
+
+
+def json_response(data, status: int = 200) -> Response:
+    return Response(dumps(data), status_code=status, media_type='application/json')
+
+
+def create_access_token(identity: str) -> str:
+    """same claims as flask_jwt_extended.create_access_token"""
+    now = datetime.now(timezone.utc)
+    token_data = {'fresh': False, 'iat': now, 'nbf': now, 'jti': str(uuid.uuid4()), 'type': 'access',
+                  'sub': identity, 'exp': now + Config.JWT_ACCESS_TOKEN_EXPIRES}
+    return jwt.encode(token_data, Config.JWT_SECRET_KEY, Config.JWT_ALGORITHM)
+
+
+def get_jwt_identity(request: Request):
+    token = request.cookies.get(JWT_COOKIE_NAME)
+    if not token:
+        return None
+    try:
+        return jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=[Config.JWT_ALGORITHM])['sub']
+    except jwt.PyJWTError:
+        return None
+
+
+def permission_required(permission: Role):
+    def decorator(endpoint):
+        pass_current_user = 'current_user' in getfullargspec(endpoint).args
+
+        @functools.wraps(endpoint)
+        async def wrapped_endpoint(request: Request):
+            current_email = get_jwt_identity(request)
+            if current_email is None:
+                return json_response({'msg': f'Missing or invalid cookie "{JWT_COOKIE_NAME}"'}, 401)
+
+            user_model = USER_CACHE.get(current_email)
+            if user_model is None:
+                user_from_db = await DB_CONTROLLER.find_one(DB_NAME, USERS_COLLECTION, {'email': current_email})
+                if not user_from_db:
+                    return json_response({'msg': 'Unauthorized'}, 401)
+                user_model = User(**user_from_db)
+                USER_CACHE.set(current_email, user_model)
+
+            if not (user_model.role == permission or user_model.role == Role.ADMIN):
+                return json_response({'msg': 'Forbidden'}, 403)
+
+            if pass_current_user:
+                return await endpoint(request, current_user=user_model)
+            return await endpoint(request)
+
+        return wrapped_endpoint
+
+    return decorator
+
+
+async def login(request: Request):
+    auth_code = (await request.json())['code']
+
+    # the Google calls are blocking, run them in a worker thread so the event loop keeps serving
+    try:
+        user_info = await to_thread.run_sync(GOOGLE_AUTH.login, auth_code)
+    except GoogleAuthError as error:
+        return json_response({'msg': str(error)}, 401)
+    except requests.RequestException:
+        return json_response({'msg': 'Google sign in is unavailable, try again later'}, 502)
+
+    user_model = User(**user_info)
+    await DB_CONTROLLER.update_one(DB_NAME, USERS_COLLECTION, {'email': user_model.email},
+                                   {'$setOnInsert': user_model.to_bson()}, upsert=True)
+
+    response = json_response({'user': user_info})
+    response.set_cookie(JWT_COOKIE_NAME, value=create_access_token(user_info['email']), secure=False)
+    return response
+
+
+@permission_required(Role.ADMIN)
+async def update_user_role(request: Request):
+    email = request.path_params['email']
+    try:
+        role = Role((await request.json())['role'])
+    except (KeyError, TypeError, ValueError):
+        return json_response({'msg': f'role must be one of {", ".join(role.value for role in Role)}'}, 400)
+
+    update_result = await DB_CONTROLLER.update_one(DB_NAME, USERS_COLLECTION, {'email': email},
+                                                   {'$set': {'role': role.value}})
+    if update_result.matched_count == 0:
+        return json_response({'msg': f'User with email {email} not found'}, 404)
+
+    USER_CACHE.invalidate(email)
+    return json_response({'msg': 'User role updated successfully'}, 202)
+
+
+async def get_chapters(request: Request):
+    fields = request.query_params.get('fields')
+    fields = fields.split(',') if fields else SUMMARY_FIELDS
+    if not set(fields) <= set(PROJECTABLE_FIELDS):
+        return json_response({'msg': f'fields must be a subset of {", ".join(PROJECTABLE_FIELDS)}'}, 400)
+
+    try:
+        limit, query = parse_page_args(request.query_params, CHAPTERS_CURSOR_KEYS, CHAPTERS_PAGE_SIZE,
+                                       CHAPTERS_MAX_PAGE_SIZE)
+    except ValueError as error:
+        return json_response({'msg': str(error)}, 400)
+
+    chapters = await DB_CONTROLLER.find(DB_NAME, CHAPTERS_COLLECTION_NAME, query,
+                                        projection={field: 1 for field in fields}, sort=[('_id', 1)],
+                                        limit=limit + 1)
+    chapters, next_cursor = paginate(chapters, CHAPTERS_CURSOR_KEYS, limit)
+
+    return json_response({'chapters': [to_response_document(chapter) for chapter in chapters],
+                          'next_cursor': next_cursor})
+
+
+async def get_chapter(request: Request):
+    chapter_id = request.path_params['chapter_id']
+    retrieved_chapter = await DB_CONTROLLER.find_one(DB_NAME, CHAPTERS_COLLECTION_NAME,
+                                                     {'_id': ObjectId(chapter_id)}, projection=CHAPTER_PROJECTION)
+    if not retrieved_chapter:
+        return json_response({'msg': f'Chapter with chapter_id {chapter_id} was not found', '_id': chapter_id}, 404)
+
+    return json_response(to_response_document(retrieved_chapter))
+
+
+@permission_required(Role.ADMIN)
+async def update_chapter(request: Request, current_user: User):
+    try:
+        updated_chapter = ChapterUpdate(**(await request.json()))
+    except Exception:
+        return json_response({'msg': 'Chapter is not in the correct schema'}, 400)
+
+    return await edit_chapter(request, updated_chapter.to_bson(), current_user.email)
+
+
+@permission_required(Role.ADMIN)
+async def patch_chapter(request: Request, current_user: User):
+    try:
+        changes = ChapterPatch(**(await request.json())).to_bson()
+    except Exception:
+        return json_response({'msg': 'Chapter patch is not in the correct schema'}, 400)
+    if not changes:
+        return json_response({'msg': 'Chapter patch has no fields to update'}, 400)
+
+    return await edit_chapter(request, changes, current_user.email)
+
+
+async def edit_chapter(request: Request, changes: dict, editor: str) -> Response:
+    """same as app._edit_chapter"""
+    chapter_id = request.path_params['chapter_id']
+    try:
+        precondition = if_match_query(chapter_id, parse_etags(request.headers.get('if-match')))
+    except ValueError as error:
+        return json_response({'msg': str(error), '_id': chapter_id}, 412)
+
+    for _ in range(CHAPTER_EDIT_ATTEMPTS):
+        chapter = await DB_CONTROLLER.find_one(DB_NAME, CHAPTERS_COLLECTION_NAME,
+                                               {'_id': ObjectId(chapter_id), **precondition},
+                                               projection=EDIT_PROJECTION)
+        if not chapter:
+            if precondition and await DB_CONTROLLER.find_one(DB_NAME, CHAPTERS_COLLECTION_NAME,
+                                                             {'_id': ObjectId(chapter_id)}, projection={'_id': 1}):
+                return json_response({'msg': f'Chapter with chapter_id {chapter_id} was modified, If-Match does not '
+                                             f'hold', '_id': chapter_id}, 412)
+            return json_response({'msg': f'Chapter with chapter_id {chapter_id} not found', '_id': chapter_id}, 404)
+
+        delta = reverse_delta(chapter, changes)
+        if not delta:
+            return json_response({'msg': 'Chapter updated successfully'}, 202)
+
+        try:
+            revision_id = await DB_CONTROLLER.insert_one(DB_NAME, CHAPTER_REVISIONS_COLLECTION,
+                                                         revision_document(chapter, delta, editor))
+        except DuplicateKeyError:
+            continue  # a concurrent edit of this version holds its revision
+
+        updated_result = await DB_CONTROLLER.update_one(
+            DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': chapter['_id'], 'version': chapter.get('version')},
+            versioned_update({'$set': {**{field: changes[field] for field in delta},
+                                       'revision': chapter.get('version', 0)}}))
+        if updated_result.matched_count:
+            break
+        try:
+            await DB_CONTROLLER.delete_one(DB_NAME, CHAPTER_REVISIONS_COLLECTION, {'_id': revision_id})
+        except PyMongoError:  # left out of the chain, restore never reaches it
+            pass
+    else:
+        return json_response({'msg': f'Chapter with chapter_id {chapter_id} is being edited, try again',
+                              '_id': chapter_id}, 409)
+
+    await chapters_written([(chapter, {**chapter, **{field: changes[field] for field in delta}})])
+    return json_response({'msg': 'Chapter updated successfully'}, 202)
+
+
+@permission_required(Role.ADMIN)
+async def post_chapter(request: Request):
+    try:
+        chapter = Chapter(**(await request.json()))
+    except Exception:
+        return json_response({'msg': 'Chapter is not in the correct schema'}, 400)
+
+    new_chapter_id = await DB_CONTROLLER.insert_one(DB_NAME, CHAPTERS_COLLECTION_NAME, chapter.to_bson())
+
+    if not new_chapter_id:
+        return json_response({'msg': 'Chapter could not be created'}, 500)
+
+    await chapters_written([(None, {**chapter.to_bson(), '_id': new_chapter_id})])
+    return json_response({'msg': 'Chapter created successfully', '_id': str(new_chapter_id)}, 201)
+
+
+async def get_comments(request: Request):
+    chapter_id = request.path_params['chapter_id']
+    try:
+        limit, query = parse_page_args(request.query_params, COMMENTS_CURSOR_KEYS, COMMENTS_PAGE_SIZE,
+                                       COMMENTS_MAX_PAGE_SIZE)
+    except ValueError as error:
+        return json_response({'msg': str(error)}, 400)
+
+    comments = await DB_CONTROLLER.find(DB_NAME, COMMENTS_COLLECTION_NAME,
+                                        {'chapter_id': ObjectId(chapter_id), **query}, projection=COMMENT_PROJECTION,
+                                        sort=[(key, 1) for key in COMMENTS_CURSOR_KEYS], limit=limit + 1)
+    comments, next_cursor = paginate(comments, COMMENTS_CURSOR_KEYS, limit)
+
+    return json_response({'comments': [to_response_document(comment) for comment in comments],
+                          'next_cursor': next_cursor})
+
+
+@permission_required(Role.DEFAULT)
+async def post_comment(request: Request, current_user):
+    chapter_id = request.path_params['chapter_id']
+    new_comment = await request.json()
+    new_comment['_id'] = ObjectId()
+    new_comment['chapter_id'] = ObjectId(chapter_id)
+    new_comment['name'] = current_user.name
+    new_comment['email'] = current_user.email
+    new_comment['picture'] = current_user.picture
+
+    try:
+        comment = Comment(**new_comment)
+    except Exception:
+        return json_response({'msg': 'Comment is not in the correct schema'}, 400)
+
+    update_result = await DB_CONTROLLER.update_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': ObjectId(chapter_id)},
+                                                   write_effects.comment_count_update(1))
+
+    if update_result.matched_count == 0:
+        return json_response({'msg': f'Chapter with chapter_id {chapter_id} not found', '_id': chapter_id}, 404)
+
+    try:
+        await DB_CONTROLLER.insert_one(DB_NAME, COMMENTS_COLLECTION_NAME, comment.to_bson())
+    except PyMongoError:
+        await DB_CONTROLLER.update_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': ObjectId(chapter_id)},
+                                       write_effects.comment_count_update(-1))
+        return json_response({'msg': 'Comment could not be created'}, 500)
+
+    await comments_written({ObjectId(chapter_id)}, {ObjectId(chapter_id): 1})
+    return json_response({'msg': 'Comment created successfully', '_id': str(comment.id)}, 202)
+
+
+@permission_required(Role.DEFAULT)
+async def update_comment(request: Request, current_user):
+    chapter_id, comment_id = request.path_params['chapter_id'], request.path_params['comment_id']
+    new_comment = await request.json()
+    new_comment['_id'] = ObjectId(comment_id)
+    new_comment['chapter_id'] = ObjectId(chapter_id)
+    new_comment['name'] = current_user.name
+    new_comment['email'] = current_user.email
+    new_comment['picture'] = current_user.picture
+    new_comment['date_updated'] = datetime.now()
+
+    try:
+        new_comment = Comment(**new_comment)
+    except Exception:
+        return json_response({'msg': 'New comment is not in the correct schema'}, 400)
+
+    updated_fields = {key: value for key, value in new_comment.to_bson().items()
+                      if key not in ('_id', 'chapter_id', 'name', 'date_added')}
+    result = await DB_CONTROLLER.update_one(DB_NAME, COMMENTS_COLLECTION_NAME,
+                                            {'_id': ObjectId(comment_id), 'chapter_id': ObjectId(chapter_id),
+                                             'name': current_user.name},
+                                            {'$set': updated_fields})
+
+    if result.matched_count == 0:
+        return json_response(
+            {'msg': f'comment with comment_id {comment_id} or with username {current_user.name} was not found',
+             '_id': chapter_id}, 404)
+
+    if result.modified_count == 0:
+        return json_response(
+            {'msg': f'Update comment with comment_id {comment_id} and user name {current_user.name} failed'}, 404)
+
+    await comments_written({ObjectId(chapter_id)})
+    return json_response({'msg': 'Comment updated successfully'}, 202)
+
+
+@permission_required(Role.DEFAULT)
+async def delete_comment(request: Request, current_user):
+    chapter_id, comment_id = request.path_params['chapter_id'], request.path_params['comment_id']
+    comment_to_delete = {'_id': ObjectId(comment_id), 'chapter_id': ObjectId(chapter_id), 'name': current_user.name}
+
+    result = await DB_CONTROLLER.delete_one(DB_NAME, COMMENTS_COLLECTION_NAME, comment_to_delete)
+
+    if result.deleted_count == 0:
+        return json_response(
+            {'msg': f'deleting comment with comment_id {comment_id} and user name '
+                    f'{current_user.name} under chapter with chapter_id {chapter_id} failed'}, 404)
+
+    await DB_CONTROLLER.update_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': ObjectId(chapter_id)},
+                                   write_effects.comment_count_update(-1))
+
+    await comments_written({ObjectId(chapter_id)}, {ObjectId(chapter_id): -1})
+    return json_response({'msg': 'Comment deleted successfully'}, 202)
+
+
+async def chapters_written(chapters: list):
+    await to_thread.run_sync(write_effects.chapters_written, STATS_DB_CONTROLLER, DB_NAME, RESPONSE_CACHE, chapters)
+
+
+async def comments_written(chapter_ids: set, comment_counts: dict = None):
+    await to_thread.run_sync(write_effects.comments_written, STATS_DB_CONTROLLER, DB_NAME, RESPONSE_CACHE,
+                             chapter_ids, comment_counts)
+
+
+async def validate_collections():
+    await DB_CONTROLLER.validate({DB_NAME: [CHAPTERS_COLLECTION_NAME, USERS_COLLECTION, COMMENTS_COLLECTION_NAME]},
+                                 Config.DB_STRICT_COLLECTIONS)
+
+
+ROUTES = [
+    Route('/api/v1/google_login', login, methods=['POST']),
+    Route('/api/v1/user/{email}/role', update_user_role, methods=['PUT']),
+    Route('/api/v1/chapters', get_chapters, methods=['GET']),
+    Route('/api/v1/chapter/{chapter_id}', get_chapter, methods=['GET']),
+    Route('/api/v1/chapter/{chapter_id}', update_chapter, methods=['PUT']),
+    Route('/api/v1/chapter/{chapter_id}', patch_chapter, methods=['PATCH']),
+    Route('/api/v1/chapter', post_chapter, methods=['POST']),
+    Route('/api/v1/comment/{chapter_id}', get_comments, methods=['GET']),
+    Route('/api/v1/comment/{chapter_id}', post_comment, methods=['POST']),
+    Route('/api/v1/comment/{chapter_id}/{comment_id}', update_comment, methods=['PUT']),
+    Route('/api/v1/comment/{chapter_id}/{comment_id}', delete_comment, methods=['DELETE']),
+]
+
+APP = Starlette(routes=ROUTES, on_startup=[validate_collections],
+                middleware=[Middleware(CORSMiddleware, allow_origin_regex='.*', allow_methods=['*'],
+                                       allow_headers=['*'], allow_credentials=True)])  # only on dev
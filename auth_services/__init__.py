@@ -0,0 +1,10 @@
+from config import Config, GOOGLE_CLIENT_ID, GOOGLE_SECRET_KEY
+from auth_services.google_auth import GoogleAuth
+
+
+def get_google_auth() -> GoogleAuth:
+    return GoogleAuth(GOOGLE_CLIENT_ID, GOOGLE_SECRET_KEY, Config.GOOGLE_TOKEN_URI, Config.GOOGLE_USERINFO_URI,
+                      Config.GOOGLE_JWKS_URI, Config.GOOGLE_ISSUERS, verify_id_token=Config.GOOGLE_VERIFY_ID_TOKEN,
+                      jwks_ttl=Config.GOOGLE_JWKS_TTL,
+                      timeout=(Config.GOOGLE_HTTP_CONNECT_TIMEOUT, Config.GOOGLE_HTTP_READ_TIMEOUT),
+                      retries=Config.GOOGLE_HTTP_RETRIES, pool_size=Config.GOOGLE_HTTP_POOL_SIZE)
@@ -0,0 +1,134 @@
+import re
+import threading
+import time
+
+import jwt
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics_services import EXTERNAL_REQUEST_DURATION
+
+ID_TOKEN_ALGORITHMS = ['RS256']
+# the userinfo fields the login response and the User model use, all present in the ID token with the profile scope
+USER_INFO_CLAIMS = ('sub', 'name', 'given_name', 'family_name', 'picture', 'email', 'email_verified', 'locale')
+REQUIRED_CLAIMS = ('email', 'name', 'given_name', 'family_name', 'picture')
+JWKS_MIN_REFRESH_INTERVAL = 60  # seconds between refreshes forced by an unknown key id
+MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+class GoogleAuthError(Exception):
+    """Google rejected the authorization code or answered with something that is not a token response."""
+
+
+class GoogleAuth:
+    """
+    Google sign in over one pooled, keep-alive session with timeouts and retries. The user is read from the
+    ID token of the token response, verified locally against Google's cached signing keys (JWKS), so a
+    login costs a single round trip; the userinfo endpoint is only called when the ID token is missing or
+    can not be verified.
+    """
+
+    def __init__(self, client_id: str, client_secret: str, token_uri: str, userinfo_uri: str, jwks_uri: str,
+                 issuers: list, verify_id_token: bool = True, jwks_ttl: int = 3600, timeout: tuple = (3.05, 5),
+                 retries: int = 2, pool_size: int = 10):
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._token_uri = token_uri
+        self._userinfo_uri = userinfo_uri
+        self._jwks_uri = jwks_uri
+        self._issuers = set(issuers)
+        self._verify_id_token = verify_id_token
+        self._jwks_ttl = jwks_ttl
+        self._timeout = timeout
+        self._session = self._create_session(retries, pool_size)
+
+        self._keys_lock = threading.Lock()
+        self._keys = {}
+        self._keys_expire_at = 0.0
+        self._keys_fetched_at = float('-inf')
+
+    @staticmethod
+    def _create_session(retries: int, pool_size: int) -> requests.Session:
+        # POSTs are retried on connection errors only, the authorization code can be used once
+        retry = Retry(total=retries, backoff_factor=0.2, status_forcelist=(500, 502, 503, 504),
+                      allowed_methods=frozenset({'GET'}), raise_on_status=False)
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=pool_size)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def login(self, code: str) -> dict:
+        """Exchanges an authorization code for the signed in user's info."""
+        tokens = self.exchange_code(code)
+        if self._verify_id_token and 'id_token' in tokens:
+            try:
+                return self.verify_id_token(tokens['id_token'])
+            except (jwt.PyJWTError, KeyError, ValueError, requests.RequestException):
+                pass
+        return self.user_info(tokens['access_token'])
+
+    def exchange_code(self, code: str) -> dict:
+        data = {
+            'code': code,
+            'client_id': self._client_id,
+            'client_secret': self._client_secret,
+            'redirect_uri': 'postmessage',
+            'grant_type': 'authorization_code'
+        }
+        with EXTERNAL_REQUEST_DURATION.time('google_token'):
+            response = self._session.post(self._token_uri, data=data, timeout=self._timeout)
+        tokens = self._json(response)
+        if response.status_code != 200 or 'access_token' not in tokens:
+            raise GoogleAuthError(
+                f'Google rejected the authorization code: {tokens.get("error", response.status_code)}')
+        return tokens
+
+    def user_info(self, access_token: str) -> dict:
+        with EXTERNAL_REQUEST_DURATION.time('google_userinfo'):
+            response = self._session.get(self._userinfo_uri, headers={'Authorization': f'Bearer {access_token}'},
+                                         timeout=self._timeout)
+        user_info = self._json(response)
+        if response.status_code != 200 or 'email' not in user_info:
+            raise GoogleAuthError(f'Google userinfo failed: {user_info.get("error", response.status_code)}')
+        return user_info
+
+    def verify_id_token(self, id_token: str) -> dict:
+        """Returns the userinfo fields of a valid ID token, raises jwt.PyJWTError or KeyError otherwise."""
+        key = self._signing_key(jwt.get_unverified_header(id_token)['kid'])
+        claims = jwt.decode(id_token, key, algorithms=ID_TOKEN_ALGORITHMS, audience=self._client_id,
+                            options={'require': ['exp', 'iat', 'iss', 'aud']})
+        if claims['iss'] not in self._issuers:
+            raise jwt.InvalidIssuerError(f'unexpected issuer {claims["iss"]}')
+        missing = [claim for claim in REQUIRED_CLAIMS if claims.get(claim) is None]
+        if missing:
+            raise KeyError(f'ID token has no {", ".join(missing)}')
+        return {claim: claims[claim] for claim in USER_INFO_CLAIMS if claim in claims}
+
+    def _signing_key(self, kid: str):
+        with self._keys_lock:
+            now = time.monotonic()
+            unknown = kid not in self._keys and now - self._keys_fetched_at >= JWKS_MIN_REFRESH_INTERVAL
+            if now >= self._keys_expire_at or unknown:
+                self._refresh_keys(now)
+            return self._keys[kid]
+
+    def _refresh_keys(self, now: float):
+        with EXTERNAL_REQUEST_DURATION.time('google_jwks'):
+            response = self._session.get(self._jwks_uri, timeout=self._timeout)
+        response.raise_for_status()
+        key_set = jwt.PyJWKSet.from_dict(response.json())
+
+        max_age = MAX_AGE.search(response.headers.get('Cache-Control', ''))
+        self._keys = {key.key_id: key.key for key in key_set.keys}
+        self._keys_fetched_at = now
+        self._keys_expire_at = now + (int(max_age.group(1)) if max_age else self._jwks_ttl)
+
+    @staticmethod
+    def _json(response: requests.Response) -> dict:
+        try:
+            body = response.json()
+        except ValueError:
+            return {}
+        return body if isinstance(body, dict) else {}
@@ -0,0 +1,19 @@
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+
+def jwt_identity(optional: bool = False):
+    """
+    the JWT identity of the current request. The token is decoded once per request, later calls (e.g. the rate
+    limiter's, then PermissionRequired's) reuse it. Raises like `verify_jwt_in_request` for a missing token unless
+    `optional`, and for an invalid one.
+    """
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:  # not verified in this request yet
+        identity = None
+    if identity is None:
+        # also when an optional verification found no token, a required one has to fail now
+        if verify_jwt_in_request(optional=optional) is None:
+            return None
+        identity = get_jwt_identity()
+    return identity
@@ -0,0 +1,276 @@
+"""
+Load test of the main API routes. Seeds N chapters with M comments each, then drives a weighted mix of
+list/get chapter, list/post/update/delete comment and admin chapter updates from concurrent workers,
+and prints p50/p95/p99 latency and throughput per route as JSON, so runs can be compared across commits.
+
+    python -m benchmarks.load_test --chapters 200 --comments 20 --concurrency 8 --requests 4000
+    python -m benchmarks.load_test --backend mongo --mongo-uri mongodb://localhost:27017 --output before.json
+    python -m benchmarks.load_test --backend memory
+
+By default requests go through Flask test clients in this process; with --base-url they are sent over HTTP
+to a running server, which must use the database given by --mongo-uri and --db-name.
+
+The benchmark seeds its own database (--db-name, tanakhs_benchmark by default) and refuses to replace collections
+that already hold documents unless --drop is given.
+"""
+import argparse
+import json
+import math
+import platform
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import mongomock
+import requests
+from pymongo import MongoClient
+
+from benchmarks.seed import ADMIN_EMAIL, seed, user_email
+from config import DB_NAME, CHAPTERS_COLLECTION_NAME, COMMENTS_COLLECTION_NAME, USERS_COLLECTION, \
+    CHAPTER_REVISIONS_COLLECTION, CHAPTER_STATS_COLLECTION
+from db_services.db_controller import DbController
+from db_services.memory_service import MemoryDbService
+from db_services.mongodb_service import MongodbService
+from tests.test_data.mock_data import mock_chapter_data
+
+ACCESS_TOKEN_COOKIE = 'access_token_cookie'
+CHAPTER_UPDATE_FIELDS = ('author', 'holy_book', 'book', 'chapter_number', 'chapter_letters', 'verses', 'analysis',
+                         'rating', 'tags')
+
+BACKENDS = {
+    'mongomock': lambda options: mongodb_service(mongomock.MongoClient(), options.db_name, options.drop),
+    'mongo': lambda options: mongodb_service(MongoClient(options.mongo_uri), options.db_name, options.drop),
+    'memory': lambda options: MemoryDbService(),
+}
+BENCHMARK_DB_NAME = f'{DB_NAME}_benchmark'
+COLLECTIONS = (CHAPTERS_COLLECTION_NAME, COMMENTS_COLLECTION_NAME, USERS_COLLECTION, CHAPTER_REVISIONS_COLLECTION,
+               CHAPTER_STATS_COLLECTION)
+
+# operation name -> relative weight in the request mix
+OPERATIONS = {
+    'list_chapters': 20,
+    'get_chapter': 35,
+    'get_comments': 20,
+    'post_comment': 10,
+    'update_comment': 6,
+    'delete_comment': 5,
+    'update_chapter': 4,
+}
+
+
+class HttpClient:
+    """The subset of the Flask test client interface the workers use, over a pooled requests.Session."""
+
+    def __init__(self, base_url: str):
+        self._base_url = base_url.rstrip('/')
+        self._session = requests.Session()
+
+    def set_cookie(self, name: str, value: str):
+        self._session.cookies.set(name, value)
+
+    def request(self, method: str, path: str, json=None):
+        return self._session.request(method, self._base_url + path, json=json)
+
+    @staticmethod
+    def body(response) -> dict:
+        return response.json()
+
+
+class TestClient:
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def set_cookie(self, name: str, value: str):
+        self._client.set_cookie('localhost', name, value)
+
+    def request(self, method: str, path: str, json=None):
+        return self._client.open(path, method=method, json=json)
+
+    @staticmethod
+    def body(response) -> dict:
+        return response.json
+
+
+class Worker:
+    def __init__(self, user_client, admin_client, chapter_ids: list, rng: random.Random):
+        self._user = user_client
+        self._admin = admin_client
+        self._chapter_ids = chapter_ids
+        self._rng = rng
+        self._comments = []
+
+    def run(self, operation: str) -> tuple:
+        """Runs one operation and returns the name it was recorded under, its status code and duration."""
+        if operation in ('update_comment', 'delete_comment') and not self._comments:
+            operation = 'post_comment'
+        method, path, body, client = getattr(self, operation)()
+
+        started = time.perf_counter()
+        response = client.request(method, path, json=body)
+        elapsed = time.perf_counter() - started
+
+        if operation == 'post_comment' and response.status_code == 202:
+            self._comments.append((path.rsplit('/', 1)[1], client.body(response)['_id']))
+        return operation, response.status_code, elapsed
+
+    def list_chapters(self):
+        return 'GET', '/api/v1/chapters', None, self._user
+
+    def get_chapter(self):
+        return 'GET', f'/api/v1/chapter/{self._chapter_id()}', None, self._user
+
+    def get_comments(self):
+        return 'GET', f'/api/v1/comment/{self._chapter_id()}', None, self._user
+
+    def post_comment(self):
+        return 'POST', f'/api/v1/comment/{self._chapter_id()}', {'content': self._content()}, self._user
+
+    def update_comment(self):
+        chapter_id, comment_id = self._rng.choice(self._comments)
+        return 'PUT', f'/api/v1/comment/{chapter_id}/{comment_id}', {'content': self._content()}, self._user
+
+    def delete_comment(self):
+        chapter_id, comment_id = self._comments.pop(self._rng.randrange(len(self._comments)))
+        return 'DELETE', f'/api/v1/comment/{chapter_id}/{comment_id}', None, self._user
+
+    def update_chapter(self):
+        chapter = {key: value for key, value in mock_chapter_data().items() if key in CHAPTER_UPDATE_FIELDS}
+        chapter['analysis'] = self._content()
+        return 'PUT', f'/api/v1/chapter/{self._chapter_id()}', chapter, self._admin
+
+    def _chapter_id(self) -> str:
+        return str(self._rng.choice(self._chapter_ids))
+
+    def _content(self) -> str:
+        return f'load test {self._rng.getrandbits(32):08x}'
+
+
+def percentile(sorted_values: list, rank: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(math.ceil(rank / 100 * len(sorted_values)) - 1, 0)]
+
+
+def summarize(durations: list, errors: int, elapsed: float) -> dict:
+    durations = sorted(durations)
+    return {
+        'count': len(durations),
+        'errors': errors,
+        'throughput_rps': round(len(durations) / elapsed, 2),
+        'mean_ms': round(sum(durations) / len(durations) * 1000, 3),
+        **{f'p{rank}_ms': round(percentile(durations, rank) * 1000, 3) for rank in (50, 95, 99)},
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def mongodb_service(client, db_name: str, drop: bool = False) -> MongodbService:
+    database = client[db_name]
+    existing = set(database.list_collection_names())
+    non_empty = [name for name in COLLECTIONS if name in existing and database[name].estimated_document_count()]
+    if non_empty and not drop:
+        raise SystemExit(f'{db_name} already has documents in {", ".join(non_empty)}, pass --drop to replace them')
+    for collection_name in COLLECTIONS:
+        database.drop_collection(collection_name)
+        database.create_collection(collection_name)
+    return MongodbService(client)
+
+
+def prepare(options) -> list:
+    db_controller = DbController(BACKENDS[options.backend](options))
+    chapter_ids = seed(db_controller, options.db_name, options.chapters, options.comments, options.concurrency)
+
+    if not options.base_url:
+        import app
+        import app_utils
+        app.DB_CONTROLLER = db_controller
+        app.DB_NAME = app_utils.DB_NAME = options.db_name
+        app.RATE_LIMITER.enabled = False  # every worker is one client, the limits would measure 429s
+    return chapter_ids
+
+
+def make_clients(options) -> list:
+    from flask_jwt_extended import create_access_token
+    import app
+
+    clients = []
+    with app.APP.app_context():
+        for index in range(options.concurrency):
+            user_client, admin_client = [HttpClient(options.base_url) if options.base_url else TestClient(app.APP)
+                                         for _ in range(2)]
+            user_client.set_cookie(ACCESS_TOKEN_COOKIE, create_access_token(user_email(index)))
+            admin_client.set_cookie(ACCESS_TOKEN_COOKIE, create_access_token(ADMIN_EMAIL))
+            clients.append((user_client, admin_client))
+    return clients
+
+
+def run(options) -> dict:
+    chapter_ids = prepare(options)
+    rng = random.Random(options.seed)
+    workers = [Worker(user_client, admin_client, chapter_ids, random.Random(rng.getrandbits(64)))
+               for user_client, admin_client in make_clients(options)]
+    names, weights = list(OPERATIONS), list(OPERATIONS.values())
+    plans = [worker_rng.choices(names, weights, k=options.requests // options.concurrency)
+             for worker_rng in (random.Random(rng.getrandbits(64)) for _ in workers)]
+
+    durations, errors, lock = defaultdict(list), defaultdict(int), threading.Lock()
+
+    def drive(worker, plan):
+        for operation in plan:
+            operation, status_code, elapsed = worker.run(operation)
+            with lock:
+                durations[operation].append(elapsed)
+                errors[operation] += status_code >= 400
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.concurrency) as executor:
+        for future in [executor.submit(drive, worker, plan) for worker, plan in zip(workers, plans)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'meta': {'commit': git_commit(), 'python': platform.python_version(), 'backend': options.backend,
+                 'target': options.base_url or 'in-process', 'chapters': options.chapters,
+                 'comments': options.comments, 'concurrency': options.concurrency, 'requests': options.requests,
+                 'seed': options.seed},
+        'routes': {operation: summarize(durations[operation], errors[operation], elapsed)
+                   for operation in names if durations[operation]},
+        'total': summarize([duration for values in durations.values() for duration in values],
+                           sum(errors.values()), elapsed),
+    }
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='mongomock')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017')
+    parser.add_argument('--db-name', default=BENCHMARK_DB_NAME)
+    parser.add_argument('--drop', action='store_true', help='replace collections that hold documents')
+    parser.add_argument('--base-url', help='send the requests to a running server instead of in-process clients')
+    parser.add_argument('--chapters', type=int, default=100)
+    parser.add_argument('--comments', type=int, default=10, help='comments seeded per chapter')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the report to this file')
+    options = parser.parse_args(args)
+    if options.base_url and options.backend != 'mongo':
+        parser.error('--base-url needs --backend mongo, the server has to see the seeded database')
+    return options
+
+
+if __name__ == '__main__':
+    options = parse_args()
+    report = json.dumps(run(options), indent=2)
+    if options.output:
+        with open(options.output, 'w') as output:
+            output.write(report + '\n')
+    print(report)
@@ -0,0 +1,70 @@
+"""
+Micro benchmarks of the per-request building blocks: Chapter/Comment (de)serialization and
+collection lookups through the CollectionRegistry. Prints JSON to compare across commits.
+
+    python -m benchmarks.micro_benchmark --iterations 2000
+"""
+import argparse
+import json
+import timeit
+
+import mongomock
+from bson import ObjectId
+
+from benchmarks.serialization_benchmark import mongo_chapter_document
+from db_services.collection_registry import CollectionRegistry
+from models.chapter import Chapter
+from models.comment import Comment
+from models.serialization import dumps, to_response_document
+from tests.test_data.mock_data import mock_comment_data
+
+DB_NAME = 'benchmark'
+COLLECTION_NAME = 'chapters'
+
+
+def comment_document() -> dict:
+    return Comment(**{**mock_comment_data(), 'chapter_id': ObjectId(), 'email': 'test@gmail.com'}).to_bson()
+
+
+def get_collection_cases() -> dict:
+    client = mongomock.MongoClient()
+    client[DB_NAME][COLLECTION_NAME].insert_one({})
+    registry = CollectionRegistry(client)
+    registry.get_collection(DB_NAME, COLLECTION_NAME)
+
+    def uncached():
+        registry.clear()
+        registry.get_collection(DB_NAME, COLLECTION_NAME)
+
+    return {'get_collection_cached': lambda: registry.get_collection(DB_NAME, COLLECTION_NAME),
+            'get_collection_uncached': uncached}
+
+
+def cases() -> dict:
+    chapter_document = mongo_chapter_document()
+    chapter = Chapter(**chapter_document)
+    comment = comment_document()
+    return {
+        'chapter_parse': lambda: Chapter(**chapter_document),
+        'chapter_to_bson': chapter.to_bson,
+        'chapter_to_json': chapter.to_json,
+        'chapter_dumps': lambda: dumps(to_response_document(chapter_document)),
+        'comment_parse': lambda: Comment(**comment),
+        'comment_to_bson': Comment(**comment).to_bson,
+        'comment_dumps': lambda: dumps(to_response_document(comment)),
+        **get_collection_cases(),
+    }
+
+
+def run(iterations: int) -> dict:
+    results = {}
+    for name, case in cases().items():
+        seconds = min(timeit.repeat(case, number=iterations, repeat=5))
+        results[name] = {'us_per_call': round(seconds / iterations * 1e6, 3)}
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    print(json.dumps(run(parser.parse_args().iterations), indent=2))
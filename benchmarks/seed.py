@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from config import CHAPTERS_COLLECTION_NAME, USERS_COLLECTION, COMMENTS_COLLECTION_NAME
+from db_services.db_controller import DbController
+from models.chapter import Chapter
+from models.comment import Comment
+from models.user import User, Role
+from tests.test_data.mock_data import mock_chapter_data, mock_comment_data
+
+BOOKS = ('בראשית', 'שמות', 'ויקרא', 'במדבר', 'דברים')
+ADMIN_EMAIL = 'bench-admin@example.com'
+
+
+def bench_user(email: str, role: Role) -> User:
+    name = email.split('@')[0]
+    return User(name=name, given_name=name, family_name='bench', email=email, role=role,
+                picture='https://example.com/picture.png')
+
+
+def user_name(index: int) -> str:
+    return f'bench-user-{index}'
+
+
+def user_email(index: int) -> str:
+    return f'{user_name(index)}@example.com'
+
+
+def seed(db_controller: DbController, db_name: str, chapters: int, comments_per_chapter: int, users: int) -> list:
+    """
+    Inserts `chapters` chapters shaped like tests/test_data/mock_data.py with `comments_per_chapter` comments each,
+    an admin and `users` default users. Returns the chapter ids.
+    """
+    db_controller.insert_many(db_name, USERS_COLLECTION,
+                              [bench_user(ADMIN_EMAIL, Role.ADMIN).to_bson()] +
+                              [bench_user(user_email(index), Role.DEFAULT).to_bson() for index in range(users)])
+
+    template = mock_chapter_data()
+    chapter_ids = []
+    for number in range(chapters):
+        chapter = Chapter(**{**template, '_id': ObjectId(), 'book': BOOKS[number % len(BOOKS)],
+                             'chapter_number': number + 1, 'tags': [f'tag-{number % 7}', f'tag-{number % 11}'],
+                             'comment_count': comments_per_chapter})
+        db_controller.insert_one(db_name, CHAPTERS_COLLECTION_NAME, chapter.to_bson())
+        chapter_ids.append(chapter.id)
+
+        if comments_per_chapter:
+            started = datetime(2023, 1, 1)
+            comments = [Comment(**{**mock_comment_data(), '_id': ObjectId(), 'chapter_id': chapter.id,
+                                   'name': user_name(index % max(users, 1)),
+                                   'email': user_email(index % max(users, 1)), 'content': f'comment {index}',
+                                   'date_added': started + timedelta(minutes=index)}).to_bson()
+                        for index in range(comments_per_chapter)]
+            db_controller.insert_many(db_name, COMMENTS_COLLECTION_NAME, comments)
+    return chapter_ids
@@ -0,0 +1,48 @@
+"""
+Per-chapter serialization time of the read path, before (pydantic round trip) and after (models.serialization).
+
+    python -m benchmarks.serialization_benchmark --iterations 2000
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime
+
+from bson import ObjectId
+
+from models.chapter import Chapter
+from models.serialization import dumps, model_projection, to_response_document
+from tests.test_data.mock_data import mock_chapter_data
+
+
+def mongo_chapter_document() -> dict:
+    chapter = mock_chapter_data()
+    document = {key: value for key, value in chapter.items() if key in model_projection(Chapter)}
+    document.update(_id=ObjectId(chapter['_id']), comment_count=2, date_added=datetime.now(),
+                    date_updated=datetime.now())
+    return document
+
+
+def pydantic_round_trip(document: dict) -> bytes:
+    return json.dumps(Chapter(**document).to_json()).encode()
+
+
+def fast_serializer(document: dict) -> bytes:
+    return dumps(to_response_document(document))
+
+
+def run(iterations: int) -> dict:
+    document = mongo_chapter_document()
+    results = {}
+    for name, serialize in (('pydantic_round_trip', pydantic_round_trip), ('fast_serializer', fast_serializer)):
+        seconds = min(timeit.repeat(lambda: serialize(document), number=iterations, repeat=5))
+        results[name] = {'us_per_chapter': round(seconds / iterations * 1e6, 3)}
+    results['speedup'] = round(results['pydantic_round_trip']['us_per_chapter'] /
+                               results['fast_serializer']['us_per_chapter'], 1)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    print(json.dumps(run(parser.parse_args().iterations), indent=2))
@@ -0,0 +1,38 @@
+import logging
+
+from flask import Flask
+from flask_caching import Cache
+
+from config import Config
+from cache_services.response_cache import ResponseCache
+from cache_services.user_cache import UserCache
+
+LOGGER = logging.getLogger(__name__)
+PROCESS_LOCAL_CACHE_TYPES = ('SimpleCache', 'simple', 'NullCache', 'null')
+
+
+def get_cache() -> Cache:
+    """the CACHE_TYPE cache of the Flask app for a process without one, e.g. the ASGI app"""
+    app = Flask(__name__)
+    app.config.from_object('config.Config')
+    return Cache(app)
+
+
+def get_user_cache(cache: Cache) -> UserCache:
+    backend = cache if Config.USER_CACHE_BACKEND == 'shared' else None
+    if Config.USER_CACHE_TTL > 0:
+        _warn_if_per_process('user cache', backend)
+    return UserCache(Config.USER_CACHE_TTL, Config.USER_CACHE_SIZE, backend)
+
+
+def get_response_cache(cache: Cache, bypass=None) -> ResponseCache:
+    backend = cache if Config.RESPONSE_CACHE_BACKEND == 'shared' else None
+    _warn_if_per_process('response cache', backend)
+    return ResponseCache(backend, Config.RESPONSE_CACHE_TIMEOUT, Config.RESPONSE_CACHE_LOCAL_SIZE, bypass)
+
+
+def _warn_if_per_process(name: str, backend: Cache):
+    """without a cache shared by the workers, a write only invalidates what the worker that made it cached"""
+    if Config.WEB_CONCURRENCY > 1 and (backend is None or Config.CACHE_TYPE in PROCESS_LOCAL_CACHE_TYPES):
+        LOGGER.warning('the %s is kept per process with WEB_CONCURRENCY=%s workers, the other workers serve stale '
+                       'entries after a write', name, Config.WEB_CONCURRENCY)
@@ -0,0 +1,154 @@
+import functools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask import request, make_response, g
+from flask_caching import Cache
+
+
+class ResponseCache:
+    """
+    Caches successful view responses under versioned keys.
+    Every cached view declares the namespaces its response depends on (e.g. 'chapter:{chapter_id}'),
+    write paths bump those namespaces, so old entries are never served again and can live for a long timeout.
+    Versions are random tokens stored without a timeout, a version the backend lost (evicted) is replaced by a new
+    token rather than reset, so it can not name entries cached before.
+    Versions and payloads are kept in the Flask-Caching `backend` (shared between workers) when given,
+    payloads are also kept in a small in-process LRU tier, which is safe since versioned keys never change.
+    Requests for which `bypass()` is true neither read nor fill the cache, e.g. clients that must read their writes.
+    """
+
+    VERSION_PREFIX = 'version:'
+    RESPONSE_PREFIX = 'response:'
+    CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+    def __init__(self, backend: Cache = None, timeout: int = 3600, local_size: int = 512, bypass=None):
+        self._backend = backend
+        self._bypass = bypass
+        self._timeout = timeout
+        self._local_size = local_size
+        self._local_responses = OrderedDict()
+        self._local_versions = {}
+        self._lock = threading.Lock()
+        self._statistics = {'hits': 0, 'misses': 0}
+
+    def cached(self, *namespaces: str):
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapped_function(*args, **kwargs):
+                if self._bypass is not None and self._bypass():
+                    return function(*args, **kwargs)
+                versions = self._versions([namespace.format(**kwargs) for namespace in namespaces])
+                if versions is None:
+                    return function(*args, **kwargs)
+
+                key = self._response_key(versions)
+                cached_response = self._get_response(key)
+                with self._lock:
+                    self._statistics['misses' if cached_response is None else 'hits'] += 1
+                if cached_response is not None:
+                    data, status, mimetype = cached_response[:3]
+                    headers = cached_response[4] if len(cached_response) > 4 else {}
+                    return make_response(data, status, {'Content-Type': mimetype, **headers})
+
+                response = make_response(function(*args, **kwargs))
+                timeout = g.pop('response_cache_timeout', self._timeout)
+                if response.status_code == 200 and not response.is_streamed and timeout > 0:
+                    headers = {header: response.headers[header] for header in self.CACHED_HEADERS
+                               if header in response.headers}
+                    self._set_response(key, (response.get_data(), response.status_code, response.mimetype,
+                                             time.time() + timeout, headers), timeout)
+                return response
+
+            return wrapped_function
+
+        return decorator
+
+    def statistics(self) -> dict:
+        with self._lock:
+            return dict(self._statistics)
+
+    def limit_timeout(self, timeout: int):
+        """caches the response of the current request for at most `timeout` seconds, e.g. when it may be stale"""
+        g.response_cache_timeout = min(g.get('response_cache_timeout', self._timeout), timeout)
+
+    def bump(self, *namespaces: str):
+        for namespace in namespaces:
+            if self._backend is None:
+                with self._lock:
+                    self._local_versions[namespace] = self._local_versions.get(namespace, 0) + 1
+                continue
+            try:
+                self._backend.set(self.VERSION_PREFIX + namespace, uuid.uuid4().hex, timeout=0)
+            except Exception:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._local_responses.clear()
+            self._local_versions.clear()
+        if self._backend is not None:
+            try:
+                self._backend.clear()
+            except Exception:
+                pass
+
+    def _versions(self, namespaces: list):
+        if self._backend is None:
+            return [(namespace, self._local_versions.get(namespace, 0)) for namespace in namespaces]
+        keys = [self.VERSION_PREFIX + namespace for namespace in namespaces]
+        try:
+            versions = list(self._backend.get_many(*keys))
+            for index, version in enumerate(versions):
+                if version is None:  # never bumped or evicted, another worker may be setting it as well
+                    self._backend.add(keys[index], uuid.uuid4().hex, timeout=0)
+                    versions[index] = self._backend.get(keys[index])
+        except Exception:
+            return None
+        if any(version is None for version in versions):
+            return None
+        return list(zip(namespaces, versions))
+
+    def _response_key(self, versions: list) -> str:
+        query_string = '&'.join(f'{key}={value}' for key, value in sorted(request.args.items(multi=True)))
+        versions = ','.join(f'{namespace}@{version}' for namespace, version in versions)
+        return f'{self.RESPONSE_PREFIX}{versions}:{request.path}?{query_string}'
+
+    def _get_response(self, key: str):
+        with self._lock:
+            entry = self._local_responses.get(key)
+            if entry is not None:
+                expires_at, cached_response = entry
+                if expires_at >= time.monotonic():
+                    self._local_responses.move_to_end(key)
+                    return cached_response
+                del self._local_responses[key]
+
+        if self._backend is None:
+            return None
+        try:
+            cached_response = self._backend.get(key)
+        except Exception:
+            return None
+        if cached_response is not None:
+            # the 4th item is the wall clock expiry of entries cached for less than the default timeout
+            timeout = cached_response[3] - time.time() if len(cached_response) > 3 else self._timeout
+            self._set_local_response(key, cached_response, min(timeout, self._timeout))
+        return cached_response
+
+    def _set_response(self, key: str, cached_response: tuple, timeout: int):
+        self._set_local_response(key, cached_response, timeout)
+        if self._backend is not None:
+            try:
+                self._backend.set(key, cached_response, timeout=timeout)
+            except Exception:
+                pass
+
+    def _set_local_response(self, key: str, cached_response: tuple, timeout: int):
+        with self._lock:
+            self._local_responses[key] = (time.monotonic() + timeout, cached_response)
+            self._local_responses.move_to_end(key)
+            while len(self._local_responses) > self._local_size:
+                self._local_responses.popitem(last=False)
@@ -0,0 +1,89 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from flask_caching import Cache
+
+from models.user import User
+
+
+class UserCache:
+    """
+    TTL + LRU cache of authenticated users keyed by their JWT identity (email).
+    With a Flask-Caching `backend` (e.g. redis) the entries are shared between workers,
+    so an invalidation is seen by every worker; otherwise the cache is in-process and an invalidation
+    (e.g. of a changed role) only reaches the worker that made it, the others keep the user for up to `ttl`.
+    """
+
+    KEY_PREFIX = 'user:'
+
+    def __init__(self, ttl: float = 60, max_size: int = 1024, backend: Cache = None):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._backend = backend
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._statistics = {'hits': 0, 'misses': 0}
+        self._statistics_lock = threading.Lock()
+
+    def statistics(self) -> dict:
+        with self._statistics_lock:
+            return dict(self._statistics)
+
+    def get(self, email: str) -> Optional[User]:
+        user = self._get(email)
+        with self._statistics_lock:
+            self._statistics['misses' if user is None else 'hits'] += 1
+        return user
+
+    def _get(self, email: str) -> Optional[User]:
+        if self._ttl <= 0:
+            return None
+        if self._backend is not None:
+            try:
+                user_from_cache = self._backend.get(self.KEY_PREFIX + email)
+            except Exception:
+                return None
+            return User(**user_from_cache) if user_from_cache else None
+
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[email]
+                return None
+            self._entries.move_to_end(email)
+            return user
+
+    def set(self, email: str, user: User):
+        if self._ttl <= 0:
+            return
+        if self._backend is not None:
+            try:
+                self._backend.set(self.KEY_PREFIX + email, user.to_bson(), timeout=max(1, math.ceil(self._ttl)))
+            except Exception:
+                pass
+            return
+
+        with self._lock:
+            self._entries[email] = (time.monotonic() + self._ttl, user)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email: str):
+        if self._backend is not None:
+            try:
+                self._backend.delete(self.KEY_PREFIX + email)
+            except Exception:
+                pass
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
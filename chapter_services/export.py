@@ -0,0 +1,154 @@
+"""
+A static export of the chapter read api: `chapter/<id>.json` holds what `GET /api/v1/chapter/<id>` returns and
+`chapters/<page>.json` the pages of `GET /api/v1/chapters` in `_id` order, each next to a `.gz` and a `.br` copy,
+so a web server or CDN can serve them from disk pre-compressed. `manifest.json` records the sha256 and size of
+every file and the `date_updated` of every chapter; an export re-renders only the chapters whose `date_updated`
+changed and the pages whose chapters did, writes only files whose content changed and removes the files of
+deleted chapters. The manifest is written last, so an interrupted export is redone by the next one.
+"""
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from config import CHAPTERS_COLLECTION_NAME
+from db_services.db_controller import DbController
+from models.chapter import Chapter
+from models.chapter_summary import SUMMARY_FIELDS
+from models.serialization import dumps, model_projection, to_response_document
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, the export then has gzip copies only
+    brotli = None
+
+MANIFEST = 'manifest.json'
+CHAPTERS_DIRECTORY = 'chapter'
+PAGES_DIRECTORY = 'chapters'
+MANIFEST_VERSION = 1
+BATCH_SIZE = 500
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11  # exports are offline, the smallest files are worth the slowest compression
+CHAPTER_PROJECTION = model_projection(Chapter)
+
+
+def chapter_path(chapter_id) -> str:
+    return f'{CHAPTERS_DIRECTORY}/{chapter_id}.json'
+
+
+def page_path(page: int) -> str:
+    return f'{PAGES_DIRECTORY}/{page}.json'
+
+
+def _state(chapter: dict):
+    date_updated = chapter.get('date_updated')
+    return date_updated.isoformat() if isinstance(date_updated, datetime) else date_updated
+
+
+def _atomic_write(path: str, data: bytes):
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as exported_file:
+        exported_file.write(data)
+    os.replace(temporary_path, path)
+
+
+def _remove(directory: str, path: str):
+    for suffix in ('', '.gz', '.br'):
+        try:
+            os.remove(os.path.join(directory, path + suffix))
+        except FileNotFoundError:
+            pass
+
+
+class _Writer:
+    def __init__(self, directory: str, files: dict):
+        self._directory = directory
+        self.files = files
+        self.written = 0
+
+    def write(self, path: str, document):
+        data = dumps(document)
+        digest = hashlib.sha256(data).hexdigest()
+        target = os.path.join(self._directory, path)
+        if self.files.get(path, {}).get('sha256') == digest and os.path.exists(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _atomic_write(target, data)
+        _atomic_write(f'{target}.gz', gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+        if brotli is not None:
+            _atomic_write(f'{target}.br', brotli.compress(data, quality=BROTLI_QUALITY))
+        self.files[path] = {'sha256': digest, 'size': len(data)}
+        self.written += 1
+
+    def remove(self, path: str):
+        _remove(self._directory, path)
+        self.files.pop(path, None)
+
+
+def load_manifest(directory: str) -> dict:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+    return manifest if manifest.get('version') == MANIFEST_VERSION else {}
+
+
+def export(db_controller: DbController, db_name: str, directory: str, page_size: int, full: bool = False) -> dict:
+    """exports the chapters to `directory`, only what changed since the last export unless `full`"""
+    manifest = {} if full else load_manifest(directory)
+    if manifest.get('page_size') != page_size:
+        manifest.pop('pages', None)
+    writer = _Writer(directory, manifest.get('files', {}))
+    exported_states = manifest.get('chapters', {})
+    exported_pages = manifest.get('pages', [])
+
+    chapters = list(db_controller.find(db_name, CHAPTERS_COLLECTION_NAME, {}, projection={'date_updated': 1},
+                                       sort=[('_id', 1)]))
+    ids = {str(chapter['_id']): chapter['_id'] for chapter in chapters}
+    states = {str(chapter['_id']): _state(chapter) for chapter in chapters}
+    changed = [chapter_id for chapter_id, state in states.items()
+               if chapter_id not in exported_states or exported_states[chapter_id] != state
+               or chapter_path(chapter_id) not in writer.files]
+    removed = [chapter_id for chapter_id in exported_states if chapter_id not in states]
+
+    for chapter in _find_by_ids(db_controller, db_name, [ids[chapter_id] for chapter_id in changed],
+                                CHAPTER_PROJECTION):
+        writer.write(chapter_path(chapter['_id']), to_response_document(chapter))
+    for chapter_id in removed:
+        writer.remove(chapter_path(chapter_id))
+    chapters_written = writer.written
+
+    chapter_ids = list(states)
+    pages = [chapter_ids[start:start + page_size] for start in range(0, len(chapter_ids), page_size)] or [[]]
+    changed = set(changed)
+    for number, page_ids in enumerate(pages, start=1):
+        previous_ids = exported_pages[number - 1] if number <= len(exported_pages) else None
+        last = number == len(pages)
+        if page_ids == previous_ids and last == (number == len(exported_pages)) \
+                and not changed.intersection(page_ids) and page_path(number) in writer.files:
+            continue
+        chapters = _find_by_ids(db_controller, db_name, [ids[chapter_id] for chapter_id in page_ids],
+                                {field: 1 for field in SUMMARY_FIELDS})
+        writer.write(page_path(number), {'chapters': [to_response_document(chapter) for chapter in chapters],
+                                         'next_page': None if last else number + 1})
+    for path in set(writer.files) - {page_path(number) for number in range(1, len(pages) + 1)}:
+        if path.startswith(f'{PAGES_DIRECTORY}/'):
+            writer.remove(path)
+
+    manifest = {'version': MANIFEST_VERSION, 'generated_at': datetime.now().isoformat(), 'page_size': page_size,
+                'chapters': states, 'pages': pages, 'files': writer.files}
+    os.makedirs(directory, exist_ok=True)
+    _atomic_write(os.path.join(directory, MANIFEST), json.dumps(manifest, indent=1, sort_keys=True).encode())
+    return {'chapters_written': chapters_written, 'chapters_removed': len(removed),
+            'pages_written': writer.written - chapters_written, 'chapters': len(states)}
+
+
+def _find_by_ids(db_controller: DbController, db_name: str, chapter_ids: list, projection: dict) -> list:
+    chapters = []
+    for start in range(0, len(chapter_ids), BATCH_SIZE):
+        chapters += db_controller.find(db_name, CHAPTERS_COLLECTION_NAME,
+                                       {'_id': {'$in': chapter_ids[start:start + BATCH_SIZE]}},
+                                       projection=projection, sort=[('_id', 1)])
+    return chapters
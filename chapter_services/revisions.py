@@ -0,0 +1,117 @@
+"""
+Chapter history as reverse deltas. The chapter document always holds the latest content; every edit stores
+a revision `{chapter_id, version, fields, delta}` whose delta turns the edited content back into the content
+of `version`, the version the edit replaced. Long fields are stored as edit operations on their words (text)
+or items (lists), so a one word change does not copy the whole analysis; other fields keep their old value.
+The chapter's `revision` is the version of its latest revision and every revision links the one before it as
+`previous`, so a revision that is missing from the chain is detected instead of silently skipped. Other writes
+(e.g. comment counts) bump the version too, versions alone have gaps.
+"""
+import difflib
+import re
+from datetime import datetime
+
+from models.chapter_patch import ChapterPatch
+
+REVISED_FIELDS = tuple(ChapterPatch.__fields__)
+DIFFED_FIELDS = ('chapter_letters', 'verses', 'analysis')
+TOKEN = re.compile(r'\s+|\S+')  # words and the whitespace between them, joining the tokens gives the text back
+
+
+def _tokens(value) -> list:
+    return TOKEN.findall(value) if isinstance(value, str) else list(value)
+
+
+def _joined(value, tokens: list):
+    return ''.join(tokens) if isinstance(value, str) else tokens
+
+
+def _opcodes(old, new) -> list:
+    return difflib.SequenceMatcher(None, _tokens(old), _tokens(new), autojunk=False).get_opcodes()
+
+
+def _field_delta(old, new) -> dict:
+    """edit operations `[start, end, tokens]` on the tokens of `new` that give back `old`"""
+    if old is None or new is None or type(old) is not type(new):
+        return {'value': old}
+    old_tokens = _tokens(old)
+    operations = [[new_start, new_end, _joined(old, old_tokens[old_start:old_end])]
+                  for tag, old_start, old_end, new_start, new_end in _opcodes(old, new) if tag != 'equal']
+    if sum(len(replacement) for _, _, replacement in operations) * 2 >= len(old):
+        return {'value': old}  # mostly rewritten, the operations would hardly be smaller than the old value
+    return {'ops': operations}
+
+
+def reverse_delta(current: dict, changes: dict) -> dict:
+    """the delta back from `current` updated with `changes` to `current`, empty when nothing changes"""
+    delta = {}
+    for field in REVISED_FIELDS:
+        if field not in changes or changes[field] == current.get(field):
+            continue
+        if field in DIFFED_FIELDS:
+            delta[field] = _field_delta(current.get(field), changes[field])
+        else:
+            delta[field] = {'value': current.get(field)}
+    return delta
+
+
+class MissingRevision(LookupError):
+    pass
+
+
+def revision_document(chapter: dict, delta: dict, editor: str) -> dict:
+    revision = {'chapter_id': chapter['_id'], 'version': chapter.get('version', 0), 'fields': list(delta),
+                'delta': delta, 'editor': editor, 'date_added': datetime.now()}
+    if 'revision' in chapter:  # chapters edited before the chain was kept only have their revisions' order
+        revision['previous'] = chapter['revision']
+    return revision
+
+
+def apply_delta(document: dict, delta: dict) -> dict:
+    restored = dict(document)
+    for field, field_delta in delta.items():
+        if 'value' in field_delta:
+            restored[field] = field_delta['value']
+            continue
+        tokens = _tokens(restored[field])
+        # operations are ordered by position, applied from the end the earlier positions stay valid
+        for start, end, replacement in reversed(field_delta['ops']):
+            tokens[start:end] = _tokens(replacement)
+        restored[field] = _joined(restored[field], tokens)
+    return restored
+
+
+def restore(document: dict, revisions: list, version: int) -> dict:
+    """
+    the content `document` had at `version`, `revisions` are its revisions from `version` on. The chain is
+    followed from the document's `revision`, a revision it links that is not there raises MissingRevision.
+    """
+    by_version = {revision['version']: revision for revision in revisions}
+    versions = sorted(by_version, reverse=True)
+    current = document.get('revision', versions[0] if versions else None)
+    while current is not None and current >= version:
+        revision = by_version.get(current)
+        if revision is None:
+            raise MissingRevision(f'revision {current} is missing, version {version} cannot be restored')
+        document = apply_delta(document, revision['delta'])
+        current = revision['previous'] if 'previous' in revision else \
+            next((older for older in versions if older < current), None)
+    return document
+
+
+def diff(old: dict, new: dict) -> dict:
+    """changed fields, long fields as the changed spans `{'op', 'from', 'to'}`, others as `{'from', 'to'}`"""
+    changes = {}
+    for field in REVISED_FIELDS:
+        old_value, new_value = old.get(field), new.get(field)
+        if old_value == new_value:
+            continue
+        if field in DIFFED_FIELDS and type(old_value) is type(new_value) and old_value is not None:
+            old_tokens, new_tokens = _tokens(old_value), _tokens(new_value)
+            changes[field] = [{'op': tag, 'from': _joined(old_value, old_tokens[old_start:old_end]),
+                               'to': _joined(new_value, new_tokens[new_start:new_end])}
+                              for tag, old_start, old_end, new_start, new_end in _opcodes(old_value, new_value)
+                              if tag != 'equal']
+        else:
+            changes[field] = {'from': old_value, 'to': new_value}
+    return changes
@@ -0,0 +1,155 @@
+"""
+Chapter statistics rolled up per book, holy book and tag in the chapter_stats collection, one document per key:
+`{_id: '<dimension>:<key>', dimension, key, chapters, comments, rating: {<name>: {count, sum, histogram}}}`.
+Chapter and comment writes apply the difference they make with `$inc`, and `rebuild` recomputes every rollup
+with an aggregation pipeline whose output is `$merge`d into the collection, which also repairs any drift.
+Histograms count the ratings per whole number bucket; averages are derived when a rollup is read.
+"""
+import math
+from collections import Counter, defaultdict
+
+from bson import ObjectId
+from pymongo import DeleteOne, UpdateOne
+
+from config import CHAPTERS_COLLECTION_NAME, CHAPTER_STATS_COLLECTION
+from db_services.db_controller import DbController
+
+DIMENSIONS = ('book', 'holy_book', 'tag')
+CHAPTER_FIELDS = {'book': 1, 'holy_book': 1, 'tags': 1, 'rating': 1, 'comment_count': 1}
+
+
+def stats_id(dimension: str, key) -> str:
+    return f'{dimension}:{key}'
+
+
+def _keys(chapter: dict) -> list:
+    keys = [('book', chapter.get('book')), ('holy_book', chapter.get('holy_book'))]
+    keys += [('tag', tag) for tag in set(chapter.get('tags') or ())]
+    return [(dimension, key) for dimension, key in keys if key is not None]
+
+
+def _ratings(chapter: dict) -> dict:
+    # dimension names become field paths, only numbers are rated
+    return {name: value for name, value in (chapter.get('rating') or {}).items()
+            if name.isidentifier() and isinstance(value, (int, float)) and not isinstance(value, bool)
+            and math.isfinite(value)}
+
+
+def contribution(chapter: dict) -> Counter:
+    """the counters one chapter adds to each of its rollups, by field path"""
+    counters = Counter({'chapters': 1, 'comments': chapter.get('comment_count', 0)})
+    for name, value in _ratings(chapter).items():
+        counters.update({f'rating.{name}.count': 1, f'rating.{name}.sum': value,
+                         f'rating.{name}.histogram.{math.floor(value)}': 1})
+    return counters
+
+
+def _changes(old: dict = None, new: dict = None) -> dict:
+    """`{(dimension, key): Counter(field=increment)}` turning the rollups of `old` into those of `new`"""
+    changes = defaultdict(Counter)
+    for chapter, sign in ((old, -1), (new, 1)):
+        if chapter is None:
+            continue
+        counters = contribution(chapter)
+        for key in _keys(chapter):
+            for field, value in counters.items():
+                changes[key][field] += sign * value
+    return changes
+
+
+def _apply(db_controller: DbController, db_name: str, changes: dict):
+    changes = {key: {field: value for field, value in increments.items() if value}
+               for key, increments in changes.items()}
+    changes = {key: increments for key, increments in changes.items() if increments}
+    if changes:
+        db_controller.bulk_write(db_name, CHAPTER_STATS_COLLECTION,
+                                 [UpdateOne({'_id': stats_id(dimension, key)},
+                                            {'$inc': increments, '$set': {'dimension': dimension, 'key': key}},
+                                            upsert=True)
+                                  for (dimension, key), increments in changes.items()], ordered=False)
+
+
+def chapters_written(db_controller: DbController, db_name: str, chapters: list):
+    """`chapters` are `(old, new)` documents of the written chapters, None for a created or a deleted one"""
+    changes = defaultdict(Counter)
+    for old, new in chapters:
+        for key, increments in _changes(old, new).items():
+            changes[key].update(increments)
+    _apply(db_controller, db_name, changes)
+
+
+def comments_written(db_controller: DbController, db_name: str, comment_counts: dict):
+    """`comment_counts` maps a chapter id to the number of comments added (or removed when negative)"""
+    chapters = db_controller.find(db_name, CHAPTERS_COLLECTION_NAME, {'_id': {'$in': list(comment_counts)}},
+                                  projection={'book': 1, 'holy_book': 1, 'tags': 1})
+    changes = Counter()
+    for chapter in chapters:
+        for key in _keys(chapter):
+            changes[key] += comment_counts[chapter['_id']]
+    _apply(db_controller, db_name, {key: {'comments': count} for key, count in changes.items()})
+
+
+def summary(stats: dict) -> dict:
+    """the response form of a rollup, with the rating averages"""
+    rating = {name: {'count': counters['count'],
+                     'average': counters['sum'] / counters['count'] if counters.get('count') else None,
+                     'histogram': {bucket: count for bucket, count in counters.get('histogram', {}).items() if count}}
+              for name, counters in (stats.get('rating') or {}).items() if counters.get('count')}
+    return {'dimension': stats['dimension'], 'key': stats['key'], 'chapters': stats.get('chapters', 0),
+            'comments': stats.get('comments', 0), 'rating': rating}
+
+
+def rebuild_pipeline(dimension: str, rebuild_id: ObjectId) -> list:
+    """the rollups of `dimension` from the chapters collection, merged into chapter_stats"""
+    key = {'book': '$book', 'holy_book': '$holy_book', 'tag': {'$setUnion': [{'$ifNull': ['$tags', []]}]}}[dimension]
+    # one row for the chapter itself and one per numeric rating
+    rows = {'$concatArrays': [
+        [{'name': None, 'value': None}],
+        {'$map': {'input': {'$filter': {'input': {'$objectToArray': {'$ifNull': ['$rating', {}]}},
+                                        'cond': {'$isNumber': '$$this.v'}}},
+                  'in': {'name': '$$this.k', 'value': '$$this.v'}}},
+    ]}
+    is_chapter_row = {'$eq': ['$_id.name', None]}
+    return [
+        {'$project': {'key': key, 'comment_count': {'$ifNull': ['$comment_count', 0]}, 'rows': rows}},
+        *([{'$unwind': '$key'}] if dimension == 'tag' else []),
+        {'$match': {'key': {'$ne': None}}},
+        {'$unwind': '$rows'},
+        {'$group': {'_id': {'key': '$key', 'name': '$rows.name', 'bucket': {'$toLong': {'$floor': '$rows.value'}}},
+                    'count': {'$sum': 1}, 'sum': {'$sum': '$rows.value'},
+                    'comments': {'$sum': {'$cond': [{'$eq': ['$rows.name', None]}, '$comment_count', 0]}}}},
+        {'$group': {'_id': {'key': '$_id.key', 'name': '$_id.name'},
+                    'count': {'$sum': '$count'}, 'sum': {'$sum': '$sum'}, 'comments': {'$sum': '$comments'},
+                    'histogram': {'$push': {'k': {'$toString': '$_id.bucket'}, 'v': '$count'}}}},
+        {'$group': {'_id': '$_id.key',
+                    'chapters': {'$sum': {'$cond': [is_chapter_row, '$count', 0]}},
+                    'comments': {'$sum': '$comments'},
+                    'rating': {'$push': {'$cond': [is_chapter_row, None, {
+                        'k': '$_id.name',
+                        'v': {'count': '$count', 'sum': '$sum', 'histogram': {'$arrayToObject': '$histogram'}}}]}}}},
+        {'$project': {'_id': {'$concat': [f'{dimension}:', {'$toString': '$_id'}]},
+                      'dimension': {'$literal': dimension}, 'key': '$_id', 'chapters': 1, 'comments': 1,
+                      'rebuild_id': {'$literal': rebuild_id},
+                      'rating': {'$arrayToObject': {'$filter': {'input': '$rating',
+                                                                'cond': {'$ne': ['$$this', None]}}}}}},
+        {'$merge': {'into': CHAPTER_STATS_COLLECTION, 'on': '_id', 'whenMatched': 'replace',
+                    'whenNotMatched': 'insert'}},
+    ]
+
+
+def rebuild(db_controller: DbController, db_name: str) -> int:
+    """
+    recomputes every rollup on the server and removes the rollups of keys no chapter has anymore.
+    Returns the number of removed rollups.
+    """
+    rebuild_id = ObjectId()
+    for dimension in DIMENSIONS:
+        db_controller.aggregate(db_name, CHAPTERS_COLLECTION_NAME, rebuild_pipeline(dimension, rebuild_id))
+
+    # rollups created by writes since the rebuild started have no rebuild_id and are kept
+    stale = db_controller.find(db_name, CHAPTER_STATS_COLLECTION,
+                               {'rebuild_id': {'$exists': True, '$ne': rebuild_id}}, projection={'_id': 1})
+    deletes = [DeleteOne({'_id': stats['_id']}) for stats in stale]
+    if deletes:
+        db_controller.bulk_write(db_name, CHAPTER_STATS_COLLECTION, deletes, ordered=False)
+    return len(deletes)
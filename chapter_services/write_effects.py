@@ -0,0 +1,57 @@
+"""
+What a chapter or comment write changes besides its own documents, shared by the Flask and the ASGI app: the
+response cache namespaces it makes stale and the chapter stats. The stats are written with the synchronous
+controller, the ASGI app calls these from a worker thread.
+"""
+import logging
+
+from pymongo.errors import PyMongoError
+
+from cache_services.response_cache import ResponseCache
+from chapter_services import stats
+from config import Config
+from db_services.db_controller import DbController
+from models.chapter import versioned_update
+
+LOGGER = logging.getLogger(__name__)
+
+
+def comment_count_update(count: int) -> dict:
+    """the chapter update adding `count` comments, or removing them when negative"""
+    return versioned_update({'$inc': {'comment_count': count}})
+
+
+def chapters_written(db_controller: DbController, db_name: str, response_cache: ResponseCache, chapters: list):
+    """`chapters` are `(old, new)` documents of the written chapters, None for a created or a deleted one"""
+    chapter_ids = {chapter['_id'] for pair in chapters for chapter in pair if chapter and '_id' in chapter}
+    response_cache.bump(*(f'chapter:{chapter_id}' for chapter_id in chapter_ids), 'chapters')
+    _stats_written(db_controller, db_name, response_cache, chapters=chapters)
+
+
+def comments_written(db_controller: DbController, db_name: str, response_cache: ResponseCache, chapter_ids,
+                     comment_counts: dict = None):
+    """
+    comments of `chapter_ids` were written, `comment_counts` maps the chapters whose comment count changed to the
+    number of comments added (or removed when negative)
+    """
+    comment_counts = comment_counts or {}
+    response_cache.bump(*(f'comments:{chapter_id}' for chapter_id in set(chapter_ids) | set(comment_counts)),
+                        *(f'chapter:{chapter_id}' for chapter_id in comment_counts))
+    if comment_counts:
+        response_cache.bump('chapters')
+        _stats_written(db_controller, db_name, response_cache, comment_counts=comment_counts)
+
+
+def _stats_written(db_controller: DbController, db_name: str, response_cache: ResponseCache, chapters: list = (),
+                   comment_counts: dict = None):
+    """applies a write to the chapter stats, a failed update is logged and repaired by the next rebuild-stats"""
+    if not Config.STATS_INCREMENTAL or not (chapters or comment_counts):
+        return
+    try:
+        if chapters:
+            stats.chapters_written(db_controller, db_name, chapters)
+        if comment_counts:
+            stats.comments_written(db_controller, db_name, comment_counts)
+    except PyMongoError:
+        LOGGER.exception('chapter stats were not updated')
+    response_cache.bump('stats')
@@ -0,0 +1,23 @@
+import atexit
+
+from config import Config, DB_NAME
+from comment_services.journal import Journal
+from comment_services.write_behind import CommentWriteBehind
+from db_services.db_controller import DbController
+from metrics_services import METRICS
+
+
+def get_comment_write_behind(db_controller: DbController, on_written=None) -> CommentWriteBehind:
+    journal = None
+    if Config.COMMENTS_JOURNAL_DIR:
+        journal = Journal(Config.COMMENTS_JOURNAL_DIR, Config.COMMENTS_JOURNAL_SEGMENT_SIZE,
+                          Config.COMMENTS_JOURNAL_FSYNC)
+    write_behind = CommentWriteBehind(db_controller, DB_NAME, max_size=Config.COMMENTS_QUEUE_SIZE,
+                                      workers=Config.COMMENTS_WRITERS, batch_size=Config.COMMENTS_BATCH_SIZE,
+                                      flush_interval=Config.COMMENTS_FLUSH_INTERVAL, journal=journal,
+                                      on_written=on_written)
+    atexit.register(write_behind.close)
+    if Config.METRICS_ENABLED:
+        METRICS.add_collector(lambda: [('comment_write_behind_queue_depth', 'gauge',
+                                        'Comment mutations waiting to be written', (), [((), write_behind.depth())])])
+    return write_behind
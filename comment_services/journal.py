@@ -0,0 +1,100 @@
+import fcntl
+import glob
+import os
+import threading
+import time
+
+from bson import json_util
+
+
+class Journal:
+    """
+    Append only json lines files of the queued comment mutations, so mutations acknowledged but not written
+    yet survive a crash. Records go to the current segment, a new segment is started every `segment_size`
+    records, and a segment is deleted once all its records were written. Every process holds an exclusive
+    lock on its segments, the segments nobody holds belong to a stopped process and are replayed at startup.
+    """
+
+    def __init__(self, directory: str, segment_size: int = 1000, fsync: bool = False):
+        self._directory = directory
+        self._segment_size = segment_size
+        self._fsync = fsync
+        self._lock = threading.Lock()
+        self._pending = {}  # segment path -> records not written yet
+        self._files = {}  # segment path -> open file, locked while the segment exists
+        self._current = None
+        self._current_size = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, record: dict) -> str:
+        """writes `record` before it is queued, returns the segment to mark it done in"""
+        with self._lock:
+            if self._current is None or self._current_size >= self._segment_size:
+                self._rotate()
+            segment_file = self._files[self._current]
+            segment_file.write(json_util.dumps(record) + '\n')
+            segment_file.flush()
+            if self._fsync:
+                os.fsync(segment_file.fileno())
+            self._current_size += 1
+            self._pending[self._current] += 1
+            return self._current
+
+    def done(self, segments: dict):
+        """`segments` maps a segment to the number of its records that were written (or dropped)"""
+        with self._lock:
+            for segment, count in segments.items():
+                self._pending[segment] -= count
+                if not self._pending[segment] and segment != self._current:
+                    self._remove(segment)
+
+    def close(self):
+        """deletes the segments without pending records and releases the others for the next start to replay"""
+        with self._lock:
+            for segment in list(self._files):
+                if self._pending.get(segment) == 0:
+                    self._remove(segment)
+                else:
+                    self._files.pop(segment).close()
+            self._current = None
+
+    def orphans(self) -> list:
+        """`(path, records)` of the segments no running process holds, each stays locked until `remove_orphan`"""
+        orphans = []
+        for path in sorted(glob.glob(os.path.join(self._directory, 'comments-*.jsonl'))):
+            if path in self._files:
+                continue
+            segment_file = open(path, 'r+')
+            try:
+                fcntl.flock(segment_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                segment_file.close()
+                continue
+            records = [json_util.loads(line) for line in segment_file if line.strip()]
+            self._files[path] = segment_file
+            orphans.append((path, records))
+        return orphans
+
+    def release_orphan(self, path: str):
+        with self._lock:
+            self._files.pop(path).close()
+
+    def remove_orphan(self, path: str):
+        with self._lock:
+            self._pending.pop(path, None)
+            self._remove(path)
+
+    def _rotate(self):
+        if self._current is not None and not self._pending[self._current]:
+            self._remove(self._current)
+        self._current = os.path.join(self._directory, f'comments-{os.getpid()}-{time.time_ns()}.jsonl')
+        segment_file = open(self._current, 'a')
+        fcntl.flock(segment_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._files[self._current] = segment_file
+        self._pending[self._current] = 0
+        self._current_size = 0
+
+    def _remove(self, segment: str):
+        os.remove(segment)
+        self._files.pop(segment).close()
+        self._pending.pop(segment, None)
@@ -0,0 +1,227 @@
+"""
+Write-behind comment mutations. A request validates its comment, queues the mutation and answers right away;
+worker threads drain the queues in batches, coalesce the mutations of each comment and write a batch with one
+unordered bulk write on the comments and one on the chapters' comment counts. A chapter always goes to the same
+worker, so its mutations are written in the order they were accepted. Queues are bounded: a full queue rejects
+the mutation (QueueFull) instead of growing, and with a journal every accepted mutation is on disk before it is
+acknowledged and is replayed by the next process if this one stops before writing it.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from comment_services.journal import Journal
+from config import CHAPTERS_COLLECTION_NAME, COMMENTS_COLLECTION_NAME
+from db_services.db_controller import DbController
+from metrics_services import COMMENT_WRITE_BEHIND
+from models.chapter import versioned_update
+
+LOGGER = logging.getLogger(__name__)
+INSERT, UPDATE, DELETE = 'insert', 'update', 'delete'
+POLL_INTERVAL = 0.1  # seconds an idle worker waits before checking whether it should stop
+MAX_RETRY_INTERVAL = 5
+
+
+class QueueFull(Exception):
+    """the queue of the comment's chapter is full, the mutation was not accepted"""
+
+
+def _coalesce(records: list) -> dict:
+    """
+    the net effect of the mutations per `(chapter_id, comment_id, name)`: the comment to insert, the fields to
+    set or whether to delete it. An insert followed by a delete in the same batch cancels out.
+    """
+    groups = {}
+    for record in records:
+        group = groups.setdefault((record['chapter_id'], record['comment_id'], record['name']),
+                                  {'insert': None, 'set': {}, 'delete': False})
+        if group['delete']:
+            continue  # nothing matches a deleted comment anymore
+        if record['op'] == INSERT:
+            group['insert'] = dict(record['document'])
+        elif record['op'] == UPDATE:
+            (group['insert'] if group['insert'] is not None else group['set']).update(record['fields'])
+        else:
+            group['delete'] = True
+    return groups
+
+
+class CommentWriteBehind:
+
+    def __init__(self, db_controller: DbController, db_name: str, max_size: int = 10000, workers: int = 2,
+                 batch_size: int = 500, flush_interval: float = 0.05, journal: Journal = None,
+                 on_written=None, retry_interval: float = 0.5):
+        self._db_controller = db_controller
+        self._db_name = db_name
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._journal = journal
+        self._on_written = on_written
+        self._retry_interval = retry_interval
+        self._queues = [queue.Queue(max(1, max_size // workers)) for _ in range(workers)]
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._pid = None
+
+    def insert(self, comment: dict):
+        self._put({'op': INSERT, 'chapter_id': comment['chapter_id'], 'comment_id': comment['_id'],
+                   'name': comment['name'], 'document': comment})
+
+    def update(self, chapter_id, comment_id, name: str, fields: dict):
+        self._put({'op': UPDATE, 'chapter_id': chapter_id, 'comment_id': comment_id, 'name': name, 'fields': fields})
+
+    def delete(self, chapter_id, comment_id, name: str):
+        self._put({'op': DELETE, 'chapter_id': chapter_id, 'comment_id': comment_id, 'name': name})
+
+    def depth(self) -> int:
+        return sum(work_queue.qsize() for work_queue in self._queues)
+
+    def start(self) -> 'CommentWriteBehind':
+        """replays the journal of stopped processes and starts the workers, done by the first mutation otherwise"""
+        with self._lock:
+            self._start()
+        return self
+
+    def close(self, timeout: float = 10):
+        """writes what is queued, mutations still queued after `timeout` stay in the journal"""
+        self._stopping.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        if self._journal is not None:
+            self._journal.close()
+
+    def write(self, records: list) -> dict:
+        """writes a batch of mutations, returns the comment count change per chapter"""
+        groups = _coalesce(records)
+        inserts = [(key, group['insert']) for key, group in groups.items()
+                   if group['insert'] is not None and not group['delete']]
+        updates = [(key, group['set']) for key, group in groups.items()
+                   if group['insert'] is None and not group['delete'] and group['set']]
+        deletes = [key for key, group in groups.items() if group['insert'] is None and group['delete']]
+
+        counted_ids = list({key[0] for key, _ in inserts} | {key[0] for key in deletes})
+        stored_counts = {}
+        if counted_ids:
+            chapters = self._db_controller.find(self._db_name, CHAPTERS_COLLECTION_NAME, {'_id': {'$in': counted_ids}},
+                                                projection={'comment_count': 1})
+            stored_counts = {chapter['_id']: chapter.get('comment_count', 0) for chapter in chapters}
+            dropped = [key for key, _ in inserts if key[0] not in stored_counts]
+            if dropped:
+                LOGGER.warning('dropped %d comments of missing chapters %s', len(dropped),
+                               sorted({str(key[0]) for key in dropped}))
+                COMMENT_WRITE_BEHIND.inc('dropped', amount=len(dropped))
+            inserts = [(key, document) for key, document in inserts if key[0] in stored_counts]
+
+        requests = [InsertOne(document) for _, document in inserts]
+        requests += [UpdateOne({'_id': comment_id, 'chapter_id': chapter_id, 'name': name}, {'$set': fields})
+                     for (chapter_id, comment_id, name), fields in updates]
+        requests += [DeleteOne({'_id': comment_id, 'chapter_id': chapter_id, 'name': name})
+                     for chapter_id, comment_id, name in deletes]
+        if requests:
+            try:
+                self._db_controller.bulk_write(self._db_name, COMMENTS_COLLECTION_NAME, requests, ordered=False)
+            except BulkWriteError as error:
+                # e.g. a replayed insert that was written before fails with a duplicate key
+                LOGGER.warning('%d comment mutations failed: %s', len(error.details['writeErrors']),
+                               [write_error['errmsg'] for write_error in error.details['writeErrors']][:10])
+
+        # the counts are recounted rather than incremented, so a batch retried or replayed after its comments
+        # were written (but not its counts) still leaves the right count
+        comment_counts = {}
+        if stored_counts:
+            counts = {result['_id']: result['count'] for result in self._db_controller.aggregate(
+                self._db_name, COMMENTS_COLLECTION_NAME,
+                [{'$match': {'chapter_id': {'$in': list(stored_counts)}}},
+                 {'$group': {'_id': '$chapter_id', 'count': {'$sum': 1}}}])}
+            comment_counts = {chapter_id: counts.get(chapter_id, 0) - stored_count
+                              for chapter_id, stored_count in stored_counts.items()
+                              if counts.get(chapter_id, 0) != stored_count}
+        if comment_counts:
+            self._db_controller.bulk_write(self._db_name, CHAPTERS_COLLECTION_NAME,
+                                           [UpdateOne({'_id': chapter_id}, versioned_update(
+                                               {'$set': {'comment_count': stored_counts[chapter_id] + count}}))
+                                            for chapter_id, count in comment_counts.items()], ordered=False)
+
+        COMMENT_WRITE_BEHIND.inc('written', amount=len(records))
+        if self._on_written is not None:
+            chapter_ids = {key[0] for key, _ in inserts + updates} | {key[0] for key in deletes}
+            try:
+                self._on_written(chapter_ids, comment_counts)
+            except Exception:  # the batch is in the database, writing it again would not help
+                LOGGER.exception('on_written failed for %d comment mutations', len(records))
+        return comment_counts
+
+    def _put(self, record: dict):
+        work_queue = self._queues[hash(record['chapter_id']) % len(self._queues)]
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+            # producers hold the lock and workers only take items, so a queue that is not full has room
+            if work_queue.full():
+                COMMENT_WRITE_BEHIND.inc('rejected')
+                raise QueueFull('too many comment mutations are waiting to be written')
+            segment = self._journal.append(record) if self._journal is not None else None
+            work_queue.put_nowait((record, segment))
+        COMMENT_WRITE_BEHIND.inc('queued')
+
+    def _start(self):
+        # threads do not survive a fork, a forked worker process starts its own
+        if self._journal is not None:
+            self._replay()
+        self._pid = os.getpid()
+        self._threads = [threading.Thread(target=self._work, args=(work_queue,), name=f'comment-writer-{index}',
+                                          daemon=True)
+                         for index, work_queue in enumerate(self._queues)]
+        for thread in self._threads:
+            thread.start()
+
+    def _replay(self):
+        for path, records in self._journal.orphans():
+            try:
+                for start in range(0, len(records), self._batch_size):
+                    self.write(records[start:start + self._batch_size])
+            except Exception:
+                LOGGER.exception('replaying %s failed, it is replayed by the next start', path)
+                self._journal.release_orphan(path)
+                continue
+            self._journal.remove_orphan(path)
+            LOGGER.info('replayed %d comment mutations from %s', len(records), path)
+
+    def _work(self, work_queue: queue.Queue):
+        while not (self._stopping.is_set() and work_queue.empty()):
+            try:
+                batch = [work_queue.get(timeout=POLL_INTERVAL)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self._flush_interval
+            while len(batch) < self._batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(work_queue.get(timeout=remaining) if remaining > 0 else work_queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: list):
+        attempt = 0
+        while True:
+            try:
+                self.write([record for record, _ in batch])
+                break
+            except Exception:  # retried whatever it is, a worker that stops leaves its queue full for good
+                LOGGER.exception('writing %d comment mutations failed', len(batch))
+                if self._stopping.is_set():
+                    COMMENT_WRITE_BEHIND.inc('failed', amount=len(batch))
+                    return  # left in the journal for the next start
+                time.sleep(min(self._retry_interval * 2 ** attempt, MAX_RETRY_INTERVAL))
+                attempt += 1
+        if self._journal is not None:
+            self._journal.done(Counter(segment for _, segment in batch))
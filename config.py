@@ -9,6 +9,18 @@ GOOGLE_SECRET_KEY = os.environ['GOOGLE_SECRET_KEY']
 DB_NAME = 'tanakhs'
 CHAPTERS_COLLECTION_NAME = 'chapters'
 USERS_COLLECTION = 'users'
+COMMENTS_COLLECTION_NAME = 'comments'
+CHAPTER_REVISIONS_COLLECTION = 'chapter_revisions'
+CHAPTER_STATS_COLLECTION = 'chapter_stats'
+CHAPTERS_PAGE_SIZE = 20
+CHAPTERS_MAX_PAGE_SIZE = 100
+COMMENTS_PAGE_SIZE = 20
+COMMENTS_MAX_PAGE_SIZE = 100
+CHAPTERS_IMPORT_BATCH_SIZE = 500
+COMMENTS_MODERATION_MAX_BATCH = 1000
+CHAPTERS_SEARCH_MAX_OFFSET = 1000
+REVISIONS_PAGE_SIZE = 20
+REVISIONS_MAX_PAGE_SIZE = 100
 
 
 class Config(object):
@@ -17,7 +29,64 @@ class Config(object):
     CACHE_REDIS_PORT = os.environ['CACHE_REDIS_PORT']
     CACHE_REDIS_DB = os.environ['CACHE_REDIS_DB']
     CACHE_REDIS_URL = os.environ['CACHE_REDIS_URL']
-    CACHE_DEFAULT_TIMEOUT = os.environ['CACHE_DEFAULT_TIMEOUT']
+    CACHE_DEFAULT_TIMEOUT = int(os.environ['CACHE_DEFAULT_TIMEOUT'])
     JWT_SECRET_KEY = os.environ['JWT_SECRET_KEY']
     JWT_ALGORITHM = os.environ['JWT_ALGORITHM']
     JWT_ACCESS_TOKEN_EXPIRES = datetime.timedelta(days=1)
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 60))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND', 'local')  # local / shared (the CACHE_TYPE backend)
+    RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 3600))
+    RESPONSE_CACHE_LOCAL_SIZE = int(os.environ.get('RESPONSE_CACHE_LOCAL_SIZE', 512))
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'shared')  # local / shared
+    WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))  # worker processes, as gunicorn reads it
+    # the timeout of responses read from a replica when MONGO_MAX_STALENESS_SECONDS is -1
+    RESPONSE_CACHE_REPLICA_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_REPLICA_TIMEOUT', 90))
+    DB_STRICT_COLLECTIONS = os.environ.get('DB_STRICT_COLLECTIONS', 'true').lower() == 'true'
+    DB_COLLECTIONS_REFRESH_INTERVAL = float(os.environ.get('DB_COLLECTIONS_REFRESH_INTERVAL', 300))
+    DB_ENSURE_INDEXES = os.environ.get('DB_ENSURE_INDEXES', 'false').lower() == 'true'
+    MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+    MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', '')  # e.g. zstd,snappy,zlib
+    MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE', 'primary')
+    DB_READ_ROUTING = os.environ.get('DB_READ_ROUTING', 'false').lower() == 'true'
+    MONGO_READ_URI = os.environ.get('MONGO_READ_URI', '')  # defaults to MONGO_URI
+    MONGO_READ_REPLICA_PREFERENCE = os.environ.get('MONGO_READ_REPLICA_PREFERENCE', 'secondaryPreferred')
+    MONGO_MAX_STALENESS_SECONDS = int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', 90))  # -1: no limit
+    DB_READ_YOUR_WRITES_SECONDS = int(os.environ.get('DB_READ_YOUR_WRITES_SECONDS', 10))
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
+    COMPRESSION_CACHE_SIZE = int(os.environ.get('COMPRESSION_CACHE_SIZE', 256))
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    GOOGLE_TOKEN_URI = os.environ.get('GOOGLE_TOKEN_URI', 'https://oauth2.googleapis.com/token')
+    GOOGLE_USERINFO_URI = os.environ.get('GOOGLE_USERINFO_URI', 'https://www.googleapis.com/oauth2/v3/userinfo')
+    GOOGLE_JWKS_URI = os.environ.get('GOOGLE_JWKS_URI', 'https://www.googleapis.com/oauth2/v3/certs')
+    GOOGLE_ISSUERS = os.environ.get('GOOGLE_ISSUERS', 'accounts.google.com,https://accounts.google.com').split(',')
+    GOOGLE_VERIFY_ID_TOKEN = os.environ.get('GOOGLE_VERIFY_ID_TOKEN', 'true').lower() == 'true'
+    GOOGLE_JWKS_TTL = int(os.environ.get('GOOGLE_JWKS_TTL', 3600))  # when the response has no Cache-Control max-age
+    GOOGLE_HTTP_CONNECT_TIMEOUT = float(os.environ.get('GOOGLE_HTTP_CONNECT_TIMEOUT', 3.05))
+    GOOGLE_HTTP_READ_TIMEOUT = float(os.environ.get('GOOGLE_HTTP_READ_TIMEOUT', 5))
+    GOOGLE_HTTP_RETRIES = int(os.environ.get('GOOGLE_HTTP_RETRIES', 2))
+    GOOGLE_HTTP_POOL_SIZE = int(os.environ.get('GOOGLE_HTTP_POOL_SIZE', 10))
+    STATS_INCREMENTAL = os.environ.get('STATS_INCREMENTAL', 'true').lower() == 'true'
+    DB_BACKEND = os.environ.get('DB_BACKEND', 'mongo')  # mongo / memory
+    MEMORY_SNAPSHOT_PATH = os.environ.get('MEMORY_SNAPSHOT_PATH', '')  # loaded by the memory backend, empty starts empty
+    MEMORY_READ_ONLY = os.environ.get('MEMORY_READ_ONLY', 'false').lower() == 'true'
+    COMMENTS_WRITE_BEHIND = os.environ.get('COMMENTS_WRITE_BEHIND', 'false').lower() == 'true'
+    COMMENTS_QUEUE_SIZE = int(os.environ.get('COMMENTS_QUEUE_SIZE', 10000))
+    COMMENTS_WRITERS = int(os.environ.get('COMMENTS_WRITERS', 2))
+    COMMENTS_BATCH_SIZE = int(os.environ.get('COMMENTS_BATCH_SIZE', 500))
+    COMMENTS_FLUSH_INTERVAL = float(os.environ.get('COMMENTS_FLUSH_INTERVAL', 0.05))
+    COMMENTS_JOURNAL_DIR = os.environ.get('COMMENTS_JOURNAL_DIR', '')  # empty: queued mutations are lost on a crash
+    COMMENTS_JOURNAL_SEGMENT_SIZE = int(os.environ.get('COMMENTS_JOURNAL_SEGMENT_SIZE', 1000))
+    COMMENTS_JOURNAL_FSYNC = os.environ.get('COMMENTS_JOURNAL_FSYNC', 'false').lower() == 'true'
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'local')  # local / redis (CACHE_REDIS_URL)
+    RATE_LIMIT_LOGIN = os.environ.get('RATE_LIMIT_LOGIN', '10/60')  # <requests>/<seconds> per address, empty: none
+    RATE_LIMIT_COMMENTS = os.environ.get('RATE_LIMIT_COMMENTS', '30/60')  # per user, posts, edits and deletes
+    MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 0))  # per process, 0: no cap
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))  # trusted proxies in front of the api, 0: none
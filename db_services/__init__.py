@@ -1,9 +1,55 @@
-from pymongo import MongoClient
+from config import Config, DB_NAME, CHAPTERS_COLLECTION_NAME, USERS_COLLECTION, COMMENTS_COLLECTION_NAME, \
+    CHAPTER_REVISIONS_COLLECTION, CHAPTER_STATS_COLLECTION
+from db_services.client_factory import LazyMongoClient, client_options
+from db_services.collection_registry import CollectionRegistry
+from db_services.memory_service import MemoryDbService
 from db_services.mongodb_service import MongodbService
 from db_services.db_controller import DbController
+from db_services.indexes import ensure_indexes
+from db_services.timed_db_controller import TimedDbController
 
 
 def get_db_controller():
-    client = MongoClient('mongodb://localhost:27017/')
-    mongo_db_service = MongodbService(client)
-    return DbController(mongo_db_service)
+    if Config.DB_BACKEND == 'memory':
+        db_controller = DbController(_get_memory_db_service())
+    else:
+        mongo_db_service = _get_mongodb_service(LazyMongoClient(Config.MONGO_URI, **client_options()))
+        read_db_service = None
+        if Config.DB_READ_ROUTING:
+            read_options = {**client_options(), 'readPreference': Config.MONGO_READ_REPLICA_PREFERENCE}
+            if Config.MONGO_MAX_STALENESS_SECONDS > 0:
+                read_options['maxStalenessSeconds'] = Config.MONGO_MAX_STALENESS_SECONDS
+            read_db_service = _get_mongodb_service(LazyMongoClient(Config.MONGO_READ_URI or Config.MONGO_URI,
+                                                                   **read_options))
+        db_controller = DbController(mongo_db_service, read_db_service)
+        if Config.DB_ENSURE_INDEXES:
+            ensure_indexes(db_controller, DB_NAME)
+    if Config.METRICS_ENABLED:
+        return TimedDbController(db_controller)
+    return db_controller
+
+
+def _get_mongodb_service(client: LazyMongoClient) -> MongodbService:
+    registry = CollectionRegistry(client, strict=Config.DB_STRICT_COLLECTIONS,
+                                  required={DB_NAME: [CHAPTERS_COLLECTION_NAME, USERS_COLLECTION,
+                                                      COMMENTS_COLLECTION_NAME]},
+                                  owned={DB_NAME: [CHAPTER_REVISIONS_COLLECTION, CHAPTER_STATS_COLLECTION]},
+                                  refresh_interval=Config.DB_COLLECTIONS_REFRESH_INTERVAL)
+    return MongodbService(client, registry)
+
+
+def _get_memory_db_service() -> MemoryDbService:
+    if Config.MEMORY_SNAPSHOT_PATH:
+        return MemoryDbService.load(Config.MEMORY_SNAPSHOT_PATH, read_only=Config.MEMORY_READ_ONLY)
+    memory_db_service = MemoryDbService()
+    ensure_indexes(DbController(memory_db_service), DB_NAME)
+    return memory_db_service
+
+
+def get_async_db_controller():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from db_services.async_db_controller import AsyncDbController
+    from db_services.motor_service import MotorService
+
+    client = AsyncIOMotorClient(Config.MONGO_URI, **client_options())
+    return AsyncDbController(MotorService(client))
@@ -0,0 +1,29 @@
+from pymongo.results import UpdateResult, DeleteResult
+from bson.objectid import ObjectId
+
+from db_services.async_db_service_interface import IAsyncDbService
+
+
+class AsyncDbController:
+    def __init__(self, db_service: IAsyncDbService):
+        self._db_service = db_service
+
+    async def find_one(self, db_name: str, collection_name: str, query: dict, projection: dict = None) -> dict:
+        return await self._db_service.find_one(db_name, collection_name, query, projection)
+
+    async def find(self, db_name: str, collection_name: str, query: dict = dict(), projection: dict = None,
+                   sort: list = None, limit: int = 0) -> list:
+        return await self._db_service.find(db_name, collection_name, query, projection, sort, limit)
+
+    async def insert_one(self, db_name: str, collection_name: str, record: dict) -> ObjectId:
+        return await self._db_service.insert_one(db_name, collection_name, record)
+
+    async def update_one(self, db_name: str, collection_name: str, query: dict, record: dict,
+                         array_filters: list = [], upsert: bool = False) -> UpdateResult:
+        return await self._db_service.update_one(db_name, collection_name, query, record, array_filters, upsert)
+
+    async def delete_one(self, db_name: str, collection_name: str, query: dict) -> DeleteResult:
+        return await self._db_service.delete_one(db_name, collection_name, query)
+
+    async def validate(self, required: dict, strict: bool = True):
+        await self._db_service.validate(required, strict)
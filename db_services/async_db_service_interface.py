@@ -0,0 +1,28 @@
+from abc import abstractmethod
+from pymongo.results import UpdateResult, DeleteResult
+from bson.objectid import ObjectId
+
+
+class IAsyncDbService:
+
+    @abstractmethod
+    async def find_one(self, db_name: str, collection_name: str, query: dict,
+                       projection: dict = None) -> dict: raise NotImplementedError
+
+    @abstractmethod
+    async def find(self, db_name: str, collection_name: str, query: dict, projection: dict = None,
+                   sort: list = None, limit: int = 0) -> list: raise NotImplementedError
+
+    @abstractmethod
+    async def insert_one(self, db_name: str, collection_name: str, record: dict) -> ObjectId: raise NotImplementedError
+
+    @abstractmethod
+    async def update_one(self, db_name: str, collection_name: str, query: dict, record: dict,
+                         array_filters: list = None, upsert: bool = False) -> UpdateResult: raise NotImplementedError
+
+    @abstractmethod
+    async def delete_one(self, db_name: str, collection_name: str,
+                         query: dict) -> DeleteResult: raise NotImplementedError
+
+    @abstractmethod
+    async def validate(self, required: dict, strict: bool = True): raise NotImplementedError
@@ -0,0 +1,76 @@
+from collections import defaultdict
+
+from bson.objectid import ObjectId
+from pymongo import DeleteMany, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config import CHAPTERS_COLLECTION_NAME, COMMENTS_COLLECTION_NAME
+from db_services.db_controller import DbController
+from models.chapter import versioned_update
+
+
+def insert_batch(db_controller: DbController, db_name: str, collection_name: str, batch: list) -> tuple:
+    """
+    Inserts a batch of `(key, record)` pairs with one unordered insert_many, so a failing record does not
+    stop the rest of the batch. Returns the inserted `[(key, _id)]` and the failed `[(key, message)]`.
+    """
+    for _, record in batch:
+        record.setdefault('_id', ObjectId())
+
+    failed = {}
+    try:
+        db_controller.insert_many(db_name, collection_name, [record for _, record in batch], ordered=False)
+    except BulkWriteError as error:
+        failed = {write_error['index']: write_error['errmsg'] for write_error in error.details['writeErrors']}
+
+    inserted = [(key, record['_id']) for index, (key, record) in enumerate(batch) if index not in failed]
+    errors = [(batch[index][0], message) for index, message in failed.items()]
+    return inserted, errors
+
+
+def delete_comments(db_controller: DbController, db_name: str, comments: list) -> tuple:
+    """
+    Deletes `(key, chapter_id, comment_id)` comments with one DeleteMany per chapter and decrements the comment
+    count of every affected chapter by the number of comments its DeleteMany removed, so a comment another request
+    deleted first is reported deleted but not counted twice.
+    Returns the deleted `[(key, chapter_id)]`, the failed `[(key, message)]` and the removed count per chapter.
+    """
+    existing = db_controller.find(db_name, COMMENTS_COLLECTION_NAME,
+                                  {'_id': {'$in': [comment_id for _, _, comment_id in comments]}},
+                                  projection={'chapter_id': 1})
+    existing_chapter_ids = {comment['_id']: comment['chapter_id'] for comment in existing}
+
+    to_delete, errors, seen = [], [], set()
+    for key, chapter_id, comment_id in comments:
+        if comment_id in seen:
+            errors.append((key, f'comment with comment_id {comment_id} is listed more than once'))
+        elif existing_chapter_ids.get(comment_id) != chapter_id:
+            errors.append((key, f'comment with comment_id {comment_id} under chapter with chapter_id '
+                                f'{chapter_id} was not found'))
+        else:
+            to_delete.append((key, chapter_id, comment_id))
+        seen.add(comment_id)
+
+    per_chapter = defaultdict(list)
+    for key, chapter_id, comment_id in to_delete:
+        per_chapter[chapter_id].append((key, comment_id))
+
+    deleted, removed = [], {}
+    for chapter_id, chapter_comments in per_chapter.items():
+        try:
+            result = db_controller.bulk_write(db_name, COMMENTS_COLLECTION_NAME, [DeleteMany(
+                {'_id': {'$in': [comment_id for _, comment_id in chapter_comments]}, 'chapter_id': chapter_id})])
+            count = result.deleted_count
+            deleted += [(key, chapter_id) for key, _ in chapter_comments]
+        except BulkWriteError as error:
+            count = error.details['nRemoved']
+            errors += [(key, error.details['writeErrors'][0]['errmsg']) for key, _ in chapter_comments]
+        if count:
+            removed[chapter_id] = count
+
+    if removed:
+        db_controller.bulk_write(db_name, CHAPTERS_COLLECTION_NAME,
+                                 [UpdateOne({'_id': chapter_id},
+                                            versioned_update({'$inc': {'comment_count': -count}}))
+                                  for chapter_id, count in removed.items()], ordered=False)
+    return deleted, errors, removed
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+from pymongo import MongoClient, monitoring
+
+from config import Config
+
+
+def client_options() -> dict:
+    options = {
+        'maxPoolSize': Config.MONGO_MAX_POOL_SIZE,
+        'minPoolSize': Config.MONGO_MIN_POOL_SIZE,
+        'waitQueueTimeoutMS': Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'readPreference': Config.MONGO_READ_PREFERENCE,
+    }
+    if Config.MONGO_COMPRESSORS:
+        options['compressors'] = Config.MONGO_COMPRESSORS
+    return options
+
+
+class PoolStatistics(monitoring.ConnectionPoolListener):
+    """Counts connection pool events per server address, check out waits are timed on the checking out thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._check_out_started = threading.local()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {f'{host}:{port}': dict(pool) for (host, port), pool in self._pools.items()}
+
+    def reset(self):
+        with self._lock:
+            self._pools = {}
+
+    def pool_created(self, event):
+        self._update(event.address)
+
+    def pool_ready(self, event):
+        self._update(event.address)
+
+    def pool_cleared(self, event):
+        self._update(event.address, clears=1)
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(event.address, None)
+
+    def connection_created(self, event):
+        self._update(event.address, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._check_out_started.value = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, check_out_failures=1, **self._wait())
+
+    def connection_checked_out(self, event):
+        self._update(event.address, in_use=1, check_outs=1, **self._wait())
+
+    def connection_checked_in(self, event):
+        self._update(event.address, in_use=-1)
+
+    def _wait(self) -> dict:
+        started = getattr(self._check_out_started, 'value', None)
+        self._check_out_started.value = None
+        return {} if started is None else {'wait_ms': (time.perf_counter() - started) * 1000}
+
+    def _update(self, address: tuple, wait_ms: float = None, **counts):
+        with self._lock:
+            pool = self._pools.setdefault(address, {'open': 0, 'in_use': 0, 'created': 0, 'check_outs': 0,
+                                                    'check_out_failures': 0, 'clears': 0,
+                                                    'wait_ms_total': 0.0, 'wait_ms_max': 0.0})
+            for key, count in counts.items():
+                pool[key] += count
+            if wait_ms is not None:
+                pool['wait_ms_total'] += wait_ms
+                pool['wait_ms_max'] = max(pool['wait_ms_max'], wait_ms)
+
+
+class LazyMongoClient:
+    """
+    Creates its MongoClient on first use in every process, so workers of a pre-forking server
+    (e.g. gunicorn) never share the client, its sockets and monitor threads with their parent.
+    """
+
+    def __init__(self, uri: str, **options):
+        self._uri = uri
+        self._options = options
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+        self.pool_statistics = PoolStatistics()
+
+    @property
+    def client(self) -> MongoClient:
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self.pool_statistics.reset()
+                    self._client = MongoClient(self._uri, event_listeners=[self.pool_statistics], **self._options)
+                    self._pid = os.getpid()
+        return self._client
+
+    def statistics(self) -> dict:
+        options = {key: value for key, value in self._options.items() if key != 'event_listeners'}
+        return {'pid': self._pid, 'options': options, 'pools': self.pool_statistics.snapshot()}
+
+    def __getitem__(self, name: str):
+        return self.client[name]
+
+    def __getattr__(self, name: str):
+        return getattr(self.client, name)
+
+    def __repr__(self):
+        return f'{type(self).__name__}(pid={self._pid})'
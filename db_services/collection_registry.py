@@ -0,0 +1,156 @@
+import functools
+import logging
+import os
+import threading
+import time
+import weakref
+
+from pymongo import MongoClient
+from pymongo.errors import CollectionInvalid
+
+LOGGER = logging.getLogger(__name__)
+
+
+class CollectionRegistry:
+    """
+    Caches database/collection existence and collection handles so queries do not
+    list databases and collections on every call.
+    Unknown names trigger a refresh (at most once per `miss_refresh_interval` seconds),
+    an optional background thread keeps the cache fresh every `refresh_interval` seconds.
+    `required` collections must exist before the first query, `owned` ones are created by `validate` when missing.
+    """
+
+    def __init__(self, client: MongoClient, strict: bool = True, required: dict = None, owned: dict = None,
+                 refresh_interval: float = 0, miss_refresh_interval: float = 1):
+        self._client = client
+        self._strict = strict
+        self._required = required or {}
+        self._owned = owned or {}
+        self._refresh_interval = refresh_interval
+        self._miss_refresh_interval = miss_refresh_interval
+        self._lock = threading.Lock()
+        self._collection_names = {}
+        self._handles = {}
+        self._last_refresh = {}
+        self._validated = False
+        self._refresh_thread = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=functools.partial(_reset_after_fork, weakref.ref(self)))
+
+    def get_collection(self, db_name: str, collection_name: str):
+        handle = self._handles.get((db_name, collection_name))
+        if handle is not None:
+            return handle
+
+        if not self._validated:
+            self.validate()
+
+        if not self._is_known(db_name, collection_name):
+            self._refresh_on_miss(db_name)
+            if not self._is_known(db_name, collection_name):
+                self._missing(db_name, collection_name)
+
+        handle = self._client[db_name][collection_name]
+        self._handles[(db_name, collection_name)] = handle
+        return handle
+
+    def is_db_exist(self, db_name: str) -> bool:
+        return db_name in self._client.list_database_names()
+
+    def is_collection_exist(self, db_name: str, collection_name: str) -> bool:
+        return collection_name in self._client[db_name].list_collection_names()
+
+    def refresh(self, db_name: str = None):
+        db_names = self._client.list_database_names()
+        if db_name is not None:
+            db_names = [db_name] if db_name in db_names else []
+        collection_names = {name: set(self._client[name].list_collection_names()) for name in db_names}
+
+        with self._lock:
+            if db_name is None:
+                self._collection_names = collection_names
+            elif collection_names:
+                self._collection_names[db_name] = collection_names[db_name]
+            else:
+                self._collection_names.pop(db_name, None)
+            self._handles = {key: handle for key, handle in self._handles.items()
+                             if key[1] in self._collection_names.get(key[0], ())}
+            now = time.monotonic()
+            for name in [db_name] if db_name is not None else collection_names:
+                self._last_refresh[name] = now
+
+    def validate(self):
+        """
+        strict mode raises KeyError for a missing required collection, lenient mode only logs it;
+        the next query validates again until every required collection exists
+        """
+        self.refresh()
+        for db_name, collection_names in self._required.items():
+            for collection_name in collection_names:
+                if not self._is_known(db_name, collection_name):
+                    self._missing(db_name, collection_name)
+        self._create_owned()
+        self._validated = True
+        self._start_background_refresh()
+
+    def clear(self):
+        with self._lock:
+            self._collection_names = {}
+            self._handles = {}
+            self._last_refresh = {}
+            self._validated = False
+
+    def reset_after_fork(self):
+        """handles belong to the parent's client and the refresh thread does not survive a fork"""
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self.clear()
+
+    def _is_known(self, db_name: str, collection_name: str) -> bool:
+        return collection_name in self._collection_names.get(db_name, ())
+
+    def _refresh_on_miss(self, db_name: str):
+        last_refresh = self._last_refresh.get(db_name)
+        if last_refresh is None or time.monotonic() - last_refresh >= self._miss_refresh_interval:
+            self.refresh(db_name)
+
+    def _create_owned(self):
+        missing = [(db_name, collection_name) for db_name, collection_names in self._owned.items()
+                   for collection_name in collection_names if not self._is_known(db_name, collection_name)]
+        for db_name, collection_name in missing:
+            try:
+                self._client[db_name].create_collection(collection_name)
+            except CollectionInvalid:
+                pass  # another process created it first
+        for db_name in {db_name for db_name, _ in missing}:
+            self.refresh(db_name)
+
+    def _missing(self, db_name: str, collection_name: str):
+        if db_name not in self._collection_names:
+            message = f'database: {db_name} does not exist under client: {self._client}'
+        else:
+            message = f'collection: {collection_name} does not exist under database: {db_name}'
+        if self._strict:
+            raise KeyError(message)
+        LOGGER.warning(message)
+
+    def _start_background_refresh(self):
+        if self._refresh_interval <= 0 or self._refresh_thread is not None:
+            return
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, daemon=True,
+                                                name='collection-registry-refresh')
+        self._refresh_thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self._refresh_interval)
+            try:
+                self.refresh()
+            except Exception:
+                LOGGER.exception('refreshing collection registry failed')
+
+
+def _reset_after_fork(registry_ref: weakref.ref):
+    registry = registry_ref()
+    if registry is not None:
+        registry.reset_after_fork()
@@ -1,25 +1,63 @@
-from pymongo.results import UpdateResult, DeleteResult
+from pymongo.results import UpdateResult, DeleteResult, BulkWriteResult
 from bson.objectid import ObjectId
 
 from db_services.db_service_interface import IDbService
 
 
 class DbController:
-    def __init__(self, db_service: IDbService):
+    def __init__(self, db_service: IDbService, read_db_service: IDbService = None):
         self._db_service = db_service
+        self._read_db_service = read_db_service
 
-    def find_one(self, db_name: str, collection_name: str, query: dict) -> dict:
-        return self._db_service.find_one(db_name, collection_name, query)
+    @property
+    def routes_reads(self) -> bool:
+        return self._read_db_service is not None
 
-    def find(self, db_name: str, collection_name: str, query: dict = dict()) -> dict:
-        return self._db_service.find(db_name, collection_name, query)
+    def find_one(self, db_name: str, collection_name: str, query: dict, projection: dict = None,
+                 secondary_ok: bool = False) -> dict:
+        return self._reader(secondary_ok).find_one(db_name, collection_name, query, projection)
+
+    def find(self, db_name: str, collection_name: str, query: dict = dict(), projection: dict = None,
+             sort: list = None, limit: int = 0, skip: int = 0, secondary_ok: bool = False) -> dict:
+        return self._reader(secondary_ok).find(db_name, collection_name, query, projection, sort, limit, skip)
 
     def insert_one(self, db_name: str, collection_name: str, record: dict) -> ObjectId:
         return self._db_service.insert_one(db_name, collection_name, record)
 
+    def insert_many(self, db_name: str, collection_name: str, records: list, ordered: bool = False) -> list:
+        return self._db_service.insert_many(db_name, collection_name, records, ordered)
+
     def update_one(self, db_name: str, collection_name: str, query: dict, record: dict,
-                   array_filters: list = []) -> UpdateResult:
-        return self._db_service.update_one(db_name, collection_name, query, record, array_filters)
+                   array_filters: list = [], upsert: bool = False) -> UpdateResult:
+        return self._db_service.update_one(db_name, collection_name, query, record, array_filters, upsert)
 
     def delete_one(self, db_name: str, collection_name: str, record_id) -> DeleteResult:
         return self._db_service.delete_one(db_name, collection_name, record_id)
+
+    def bulk_write(self, db_name: str, collection_name: str, requests: list,
+                   ordered: bool = False) -> BulkWriteResult:
+        return self._db_service.bulk_write(db_name, collection_name, requests, ordered)
+
+    def create_index(self, db_name: str, collection_name: str, keys: list, **kwargs) -> str:
+        return self._db_service.create_index(db_name, collection_name, keys, **kwargs)
+
+    def list_indexes(self, db_name: str, collection_name: str) -> dict:
+        return self._db_service.list_indexes(db_name, collection_name)
+
+    def aggregate(self, db_name: str, collection_name: str, pipeline: list) -> list:
+        return self._db_service.aggregate(db_name, collection_name, pipeline)
+
+    def explain(self, db_name: str, collection_name: str, query: dict, sort: list = None) -> dict:
+        return self._db_service.explain(db_name, collection_name, query, sort)
+
+    def pool_statistics(self) -> dict:
+        statistics = self._db_service.pool_statistics()
+        if self._read_db_service is not None:
+            statistics['read'] = self._read_db_service.pool_statistics()
+        return statistics
+
+    def _reader(self, secondary_ok: bool) -> IDbService:
+        """reads that may be stale (secondary_ok) go to the read service when there is one"""
+        if secondary_ok and self._read_db_service is not None:
+            return self._read_db_service
+        return self._db_service
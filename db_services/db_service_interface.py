@@ -1,22 +1,48 @@
 from abc import abstractmethod
-from pymongo.results import UpdateResult, DeleteResult
+from pymongo.results import UpdateResult, DeleteResult, BulkWriteResult
 from bson.objectid import ObjectId
 
 
 class IDbService:
 
     @abstractmethod
-    def find_one(self, db_name: str, collection_name: str, query: dict) -> dict: raise NotImplementedError
+    def find_one(self, db_name: str, collection_name: str, query: dict,
+                 projection: dict = None) -> dict: raise NotImplementedError
 
     @abstractmethod
-    def find(self, db_name: str, collection_name: str, query: dict) -> dict: raise NotImplementedError
+    def find(self, db_name: str, collection_name: str, query: dict, projection: dict = None,
+             sort: list = None, limit: int = 0, skip: int = 0) -> dict: raise NotImplementedError
 
     @abstractmethod
     def insert_one(self, db_name: str, collection_name: str, record: dict) -> ObjectId: raise NotImplementedError
 
     @abstractmethod
-    def update_one(self, db_name: str, collection_name: str, query: dict,
-                   record: dict, array_filters: list = None) -> UpdateResult: raise NotImplementedError
+    def insert_many(self, db_name: str, collection_name: str, records: list,
+                    ordered: bool = False) -> list: raise NotImplementedError
+
+    @abstractmethod
+    def update_one(self, db_name: str, collection_name: str, query: dict, record: dict,
+                   array_filters: list = None, upsert: bool = False) -> UpdateResult: raise NotImplementedError
 
     @abstractmethod
     def delete_one(self, db_name: str, collection_name: str, query: dict) -> DeleteResult: raise NotImplementedError
+
+    @abstractmethod
+    def bulk_write(self, db_name: str, collection_name: str, requests: list,
+                   ordered: bool = False) -> BulkWriteResult: raise NotImplementedError
+
+    @abstractmethod
+    def create_index(self, db_name: str, collection_name: str, keys: list, **kwargs) -> str: raise NotImplementedError
+
+    @abstractmethod
+    def list_indexes(self, db_name: str, collection_name: str) -> dict: raise NotImplementedError
+
+    @abstractmethod
+    def aggregate(self, db_name: str, collection_name: str, pipeline: list) -> list: raise NotImplementedError
+
+    @abstractmethod
+    def explain(self, db_name: str, collection_name: str, query: dict,
+                sort: list = None) -> dict: raise NotImplementedError
+
+    @abstractmethod
+    def pool_statistics(self) -> dict: raise NotImplementedError
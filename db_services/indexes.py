@@ -0,0 +1,114 @@
+from typing import NamedTuple
+
+from pymongo import ASCENDING, TEXT
+
+from config import USERS_COLLECTION, CHAPTERS_COLLECTION_NAME, COMMENTS_COLLECTION_NAME, CHAPTER_REVISIONS_COLLECTION, \
+    CHAPTER_STATS_COLLECTION
+from db_services.db_controller import DbController
+
+
+CHAPTERS_TEXT_INDEX = 'chapters_text'
+INDEX_NOT_FOUND = 27  # the error code of a $text query on a collection without a text index
+
+
+class Index(NamedTuple):
+    keys: list
+    options: dict = {}
+
+
+class HotQuery(NamedTuple):
+    query: dict
+    sort: list = None
+
+
+INDEXES = {
+    USERS_COLLECTION: [
+        Index([('email', ASCENDING)], {'unique': True}),
+    ],
+    CHAPTERS_COLLECTION_NAME: [
+        Index([('book', ASCENDING), ('chapter_number', ASCENDING)]),
+        Index([('tags', ASCENDING)]),
+        Index([('date_added', ASCENDING)]),
+        # language 'none' keeps hebrew words intact (no stemming or stop words)
+        Index([('book', TEXT), ('chapter_letters', TEXT), ('analysis', TEXT), ('verses', TEXT)],
+              {'name': CHAPTERS_TEXT_INDEX, 'default_language': 'none',
+               'weights': {'book': 10, 'chapter_letters': 10, 'analysis': 2, 'verses': 1}}),
+    ],
+    COMMENTS_COLLECTION_NAME: [
+        Index([('chapter_id', ASCENDING), ('date_added', ASCENDING)]),
+    ],
+    CHAPTER_REVISIONS_COLLECTION: [
+        Index([('chapter_id', ASCENDING), ('version', ASCENDING)], {'unique': True}),
+    ],
+    CHAPTER_STATS_COLLECTION: [
+        Index([('dimension', ASCENDING), ('key', ASCENDING)]),
+    ],
+}
+
+# representative shapes of the queries the api runs on every request, explained by the index report
+HOT_QUERIES = {
+    USERS_COLLECTION: [
+        HotQuery({'email': ''}),
+    ],
+    CHAPTERS_COLLECTION_NAME: [
+        HotQuery({'book': '', 'chapter_number': 0}),
+        HotQuery({'tags': ''}),
+        HotQuery({'$text': {'$search': ''}}),
+    ],
+    COMMENTS_COLLECTION_NAME: [
+        HotQuery({'chapter_id': None}, [('date_added', ASCENDING), ('_id', ASCENDING)]),
+    ],
+    CHAPTER_REVISIONS_COLLECTION: [
+        HotQuery({'chapter_id': None}, [('version', ASCENDING)]),
+    ],
+    CHAPTER_STATS_COLLECTION: [
+        HotQuery({'dimension': '', 'chapters': {'$gt': 0}}, [('key', ASCENDING)]),
+    ],
+}
+
+
+def ensure_indexes(db_controller: DbController, db_name: str, collection_names: list = None) -> list:
+    """creates the declared indexes, creating an index that already exists is a no-op"""
+    created = []
+    for collection_name in collection_names or INDEXES:
+        for index in INDEXES[collection_name]:
+            name = db_controller.create_index(db_name, collection_name, index.keys, **index.options)
+            created.append(f'{collection_name}.{name}')
+    return created
+
+
+def index_report(db_controller: DbController, db_name: str) -> dict:
+    """
+    Per collection: declared indexes that do not exist, existing indexes that were never used
+    since the server started ($indexStats) and hot queries whose winning plan is a collection scan.
+    """
+    report = {}
+    for collection_name, indexes in INDEXES.items():
+        existing = db_controller.list_indexes(db_name, collection_name)
+        existing_keys = [list(index_information['key']) for index_information in existing.values()]
+        # text indexes are keyed by _fts/_ftsx on the server, so those are matched by name
+        missing = [index.keys for index in indexes
+                   if list(index.keys) not in existing_keys and index.options.get('name') not in existing]
+
+        unused = []
+        if existing:
+            index_stats = db_controller.aggregate(db_name, collection_name, [{'$indexStats': {}}])
+            unused = [stats['name'] for stats in index_stats
+                      if stats['name'] != '_id_' and stats['accesses']['ops'] == 0]
+
+        collection_scans = []
+        if existing:
+            for hot_query in HOT_QUERIES.get(collection_name, []):
+                plan = db_controller.explain(db_name, collection_name, hot_query.query, hot_query.sort)
+                if _has_stage(plan.get('queryPlanner', {}).get('winningPlan', {}), 'COLLSCAN'):
+                    collection_scans.append(hot_query.query)
+
+        report[collection_name] = {'missing': missing, 'unused': unused, 'collection_scans': collection_scans}
+    return report
+
+
+def _has_stage(plan: dict, stage: str) -> bool:
+    if plan.get('stage') == stage:
+        return True
+    children = [plan[key] for key in ('inputStage', 'queryPlan') if key in plan] + plan.get('inputStages', [])
+    return any(_has_stage(child, stage) for child in children)
@@ -0,0 +1,865 @@
+"""
+An in-process IDbService. Documents live in a dict per collection and queries and updates are evaluated in
+Python with the operators the api uses; single field hash indexes (the first key of every created index) answer
+equality and `$in` conditions without a scan. A service can be saved to a gzipped stream of BSON documents and
+loaded back, optionally read only, so tests and benchmarks need no mongod and small deployments can serve the
+chapters from memory.
+"""
+import copy
+import gzip
+import itertools
+import os
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+import bson
+from bson.objectid import ObjectId
+from pymongo import TEXT
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import UpdateResult, DeleteResult, BulkWriteResult
+
+from db_services.db_controller import DbController
+from db_services.db_service_interface import IDbService
+from db_services.indexes import INDEXES, INDEX_NOT_FOUND, ensure_indexes
+
+ID_INDEX = '_id_'
+SNAPSHOT_FORMAT = 1
+TEXT_SCORE = {'$meta': 'textScore'}
+WORD = re.compile(r'\w+')
+SEARCH_TERM = re.compile(r'(-?)"([^"]*)"|(-?)(\S+)')
+DUPLICATE_KEY = 11000
+ILLEGAL_OPERATION = 20
+
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return tuple((key, _hashable(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+def _key(document: dict):
+    return _hashable(document['_id'])
+
+
+def _lookup(value, keys: list) -> list:
+    """the values at a dotted path, arrays on the way are searched element by element like the server does"""
+    if not keys:
+        return [value]
+    key, rest = keys[0], keys[1:]
+    if isinstance(value, dict):
+        return _lookup(value[key], rest) if key in value else []
+    if isinstance(value, list):
+        found = _lookup(value[int(key)], rest) if key.isdigit() and int(key) < len(value) else []
+        return found + [item_value for item in value if isinstance(item, dict) for item_value in _lookup(item, keys)]
+    return []
+
+
+def _candidates(document: dict, path: str) -> list:
+    """the values a condition on `path` is tested against, an array and each of its elements"""
+    values = []
+    for value in _lookup(document, path.split('.')):
+        values.append(value)
+        if isinstance(value, list):
+            values.extend(value)
+    return values
+
+
+def _rank(value) -> int:
+    # the server's order of bson types
+    if value is None:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, bytes):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def _order_key(value) -> tuple:
+    rank = _rank(value)
+    return rank, value if rank in (2, 3, 6, 7, 8, 9) else repr(value)
+
+
+def _compare(operator: str, value, bound) -> bool:
+    if _rank(value) != _rank(bound) or _rank(value) in (4, 5, 10):
+        return False
+    return {'$gt': value > bound, '$gte': value >= bound, '$lt': value < bound, '$lte': value <= bound}[operator]
+
+
+def _equals(values: list, expected) -> bool:
+    if expected is None:
+        return not values or None in values
+    return any(value == expected and _rank(value) == _rank(expected) for value in values)
+
+
+def _matches_condition(document: dict, path: str, condition) -> bool:
+    values = _candidates(document, path)
+    if not isinstance(condition, dict) or not condition or not all(key.startswith('$') for key in condition):
+        return _equals(values, condition)
+
+    for operator, operand in condition.items():
+        if operator == '$eq':
+            matched = _equals(values, operand)
+        elif operator == '$ne':
+            matched = not _equals(values, operand)
+        elif operator in ('$gt', '$gte', '$lt', '$lte'):
+            matched = any(_compare(operator, value, operand) for value in values)
+        elif operator == '$in':
+            matched = any(_equals(values, expected) for expected in operand)
+        elif operator == '$nin':
+            matched = not any(_equals(values, expected) for expected in operand)
+        elif operator == '$exists':
+            matched = bool(_lookup(document, path.split('.'))) == bool(operand)
+        elif operator == '$all':
+            matched = all(_equals(values, expected) for expected in operand)
+        elif operator == '$size':
+            matched = any(isinstance(value, list) and len(value) == operand for value in values)
+        elif operator == '$elemMatch':
+            matched = any(_element_matches(item, operand) for value in _lookup(document, path.split('.'))
+                          if isinstance(value, list) for item in value)
+        elif operator == '$regex':
+            pattern = re.compile(operand, _regex_flags(condition.get('$options', ''))) \
+                if isinstance(operand, str) else operand
+            matched = any(isinstance(value, str) and pattern.search(value) for value in values)
+        elif operator == '$options':
+            continue
+        elif operator == '$not':
+            matched = not _matches_condition(document, path, operand)
+        else:
+            raise OperationFailure(f'unknown operator: {operator}', 2)
+        if not matched:
+            return False
+    return True
+
+
+def _regex_flags(options: str) -> int:
+    flags = 0
+    for option, flag in (('i', re.IGNORECASE), ('m', re.MULTILINE), ('s', re.DOTALL), ('x', re.VERBOSE)):
+        if option in options:
+            flags |= flag
+    return flags
+
+
+def _element_matches(element, condition: dict) -> bool:
+    if condition and all(key.startswith('$') for key in condition) and not {'$and', '$or', '$nor'} & set(condition):
+        return _matches_condition({'element': element}, 'element', condition)
+    return isinstance(element, dict) and matches(element, condition)
+
+
+def matches(document: dict, query: dict) -> bool:
+    """whether `document` matches `query`, `$text` conditions are evaluated by the collection"""
+    for key, condition in query.items():
+        if key == '$and':
+            matched = all(matches(document, sub_query) for sub_query in condition)
+        elif key == '$or':
+            matched = any(matches(document, sub_query) for sub_query in condition)
+        elif key == '$nor':
+            matched = not any(matches(document, sub_query) for sub_query in condition)
+        elif key == '$text':
+            continue
+        elif key.startswith('$'):
+            raise OperationFailure(f'unknown top level operator: {key}', 2)
+        else:
+            matched = _matches_condition(document, key, condition)
+        if not matched:
+            return False
+    return True
+
+
+def _array_filter_matches(element, name: str, array_filter: dict) -> bool:
+    renamed = {'element' + key[len(name):]: condition for key, condition in array_filter.items()}
+    return matches({'element': element}, renamed)
+
+
+def _targets(container, parts: list, array_filters: dict, create: bool):
+    """`(parent, key)` of every place a dotted update path with `$[]` and `$[<identifier>]` refers to"""
+    key, rest = parts[0], parts[1:]
+    if isinstance(container, list):
+        if key.startswith('$['):
+            name = key[2:-1]
+            if name and name not in array_filters:
+                raise OperationFailure(f'no array filter found for identifier {name}', 2)
+            keys = [index for index, element in enumerate(container)
+                    if not name or _array_filter_matches(element, name, array_filters[name])]
+        elif key.isdigit():
+            index = int(key)
+            if create:
+                container.extend([None] * (index + 1 - len(container)))
+            keys = [index] if index < len(container) else []
+        else:
+            raise OperationFailure(f'cannot use the part ({key}) to traverse an array', 28)
+    elif isinstance(container, dict):
+        if key.startswith('$'):
+            raise OperationFailure(f'the positional operator {key} is not supported', 2)
+        keys = [key]
+        if create and rest and key not in container:
+            container[key] = {}
+    else:
+        raise OperationFailure(f'cannot create field {key} in element {container!r}', 28)
+
+    for key in keys:
+        if not rest:
+            yield container, key
+        elif isinstance(container, list) or key in container:
+            yield from _targets(container[key], rest, array_filters, create)
+
+
+def _has(parent, key) -> bool:
+    return key in parent if isinstance(parent, dict) else key < len(parent)
+
+
+def _condition_update(document: dict, update: dict, array_filters: list, inserting: bool):
+    filters = {}
+    for array_filter in array_filters or []:
+        name = next(iter(array_filter)).split('.')[0]
+        filters[name] = array_filter
+
+    for operator, fields in update.items():
+        if operator == '$setOnInsert' and not inserting:
+            continue
+        for path, operand in fields.items():
+            create = operator not in ('$unset', '$pull')
+            for parent, key in list(_targets(document, path.split('.'), filters, create)):
+                _apply_operator(operator, parent, key, operand, path)
+
+
+def _apply_operator(operator: str, parent, key, operand, path: str):
+    if operator in ('$set', '$setOnInsert'):
+        parent[key] = copy.deepcopy(operand)
+    elif operator == '$unset':
+        if isinstance(parent, dict):
+            parent.pop(key, None)
+        else:
+            parent[key] = None
+    elif operator == '$inc':
+        current = parent[key] if _has(parent, key) else 0
+        if not isinstance(current, (int, float)) or isinstance(current, bool):
+            raise OperationFailure(f'cannot apply $inc to a value of non-numeric type at {path}', 14)
+        parent[key] = current + operand
+    elif operator in ('$push', '$addToSet'):
+        current = parent.setdefault(key, []) if isinstance(parent, dict) else parent[key]
+        if not isinstance(current, list):
+            raise OperationFailure(f'the field {path} must be an array', 2)
+        items = operand['$each'] if isinstance(operand, dict) and '$each' in operand else [operand]
+        for item in items:
+            if operator == '$push' or item not in current:
+                current.append(copy.deepcopy(item))
+    elif operator == '$pull':
+        current = parent[key] if _has(parent, key) else None
+        if isinstance(current, list):
+            if isinstance(operand, dict):
+                current[:] = [item for item in current if not _element_matches(item, operand)]
+            else:
+                current[:] = [item for item in current if item != operand]
+    else:
+        raise OperationFailure(f'unknown modifier: {operator}', 9)
+
+
+def apply_update(document: dict, update: dict, array_filters: list = None, inserting: bool = False) -> dict:
+    """an updated copy of `document`, an update without operators replaces everything but the `_id`"""
+    if not any(key.startswith('$') for key in update):
+        return {'_id': document['_id'], **copy.deepcopy(update)}
+    updated = copy.deepcopy(document)
+    _condition_update(updated, update, array_filters, inserting)
+    if updated.get('_id') != document.get('_id'):
+        raise OperationFailure('performing an update on the path _id would modify the immutable field _id', 66)
+    return updated
+
+
+def _upsert_document(query: dict) -> dict:
+    """the equality conditions of an upsert's query, the document an update without a match starts from"""
+    document = {}
+    for key, condition in query.items():
+        if key == '$and':
+            for sub_query in condition:
+                document.update(_upsert_document(sub_query))
+        elif key.startswith('$'):
+            continue
+        elif isinstance(condition, dict) and '$eq' in condition:
+            document[key] = condition['$eq']
+        elif not isinstance(condition, dict) or not any(operator.startswith('$') for operator in condition):
+            document[key] = condition
+    nested = {}
+    for key, value in document.items():
+        parent = nested
+        *parents, last = key.split('.')
+        for part in parents:
+            parent = parent.setdefault(part, {})
+        parent[last] = copy.deepcopy(value)
+    return nested
+
+
+def project(document: dict, projection: dict, score: float = None) -> dict:
+    if not projection:
+        return copy.deepcopy(document)
+    fields = {key: value for key, value in projection.items() if value != TEXT_SCORE}
+    including = any(value for key, value in fields.items() if key != '_id')
+    if including:
+        tree = {}
+        for key, value in fields.items():
+            if value and key != '_id':
+                parent = tree
+                *parents, last = key.split('.')
+                for part in parents:
+                    parent = parent.setdefault(part, {})
+                parent[last] = True
+        projected = _include(document, tree)
+        if fields.get('_id', 1) and '_id' in document:
+            projected = {'_id': copy.deepcopy(document['_id']), **projected}
+    else:
+        projected = copy.deepcopy(document)
+        for key, value in fields.items():
+            if not value:
+                _exclude(projected, key.split('.'))
+    for key, value in projection.items():
+        if value == TEXT_SCORE:
+            projected[key] = score
+    return projected
+
+
+def _include(value, tree: dict):
+    if isinstance(value, list):
+        return [_include(item, tree) for item in value if isinstance(item, (dict, list))]
+    projected = {}
+    for key, subtree in tree.items():
+        if key not in value:
+            continue
+        if subtree is True:
+            projected[key] = copy.deepcopy(value[key])
+        elif isinstance(value[key], (dict, list)):
+            projected[key] = _include(value[key], subtree)
+    return projected
+
+
+def _exclude(value, keys: list):
+    if isinstance(value, list):
+        for item in value:
+            _exclude(item, keys)
+    elif isinstance(value, dict) and keys[0] in value:
+        if len(keys) == 1:
+            del value[keys[0]]
+        else:
+            _exclude(value[keys[0]], keys[1:])
+
+
+def _sort_value(document: dict, path: str, direction: int):
+    values = _lookup(document, path.split('.'))
+    if not values:
+        return _order_key(None)
+    value = values[0]
+    if isinstance(value, list) and value:
+        keys = [_order_key(item) for item in value]
+        return min(keys) if direction > 0 else max(keys)
+    return _order_key(value)
+
+
+def _expression(document: dict, expression):
+    """a `'$field'` path or a constant"""
+    if isinstance(expression, str) and expression.startswith('$'):
+        values = _lookup(document, expression[1:].split('.'))
+        return values[0] if values else None
+    return expression
+
+
+def _group(documents: list, operand: dict) -> list:
+    groups = {}
+    for document in documents:
+        group_id = _expression(document, operand['_id'])
+        group = groups.setdefault(_hashable(group_id), {'_id': group_id})
+        for field, accumulator in operand.items():
+            if field == '_id':
+                continue
+            (operator, expression), = accumulator.items()
+            if operator != '$sum':
+                raise OperationFailure(f'{operator} is not supported by the in-memory database', 2)
+            value = _expression(document, expression)
+            group[field] = group.get(field, 0) + (value if isinstance(value, (int, float)) else 0)
+    return list(groups.values())
+
+
+def _index_name(keys: list) -> str:
+    return '_'.join(f'{field}_{direction}' for field, direction in keys)
+
+
+def _terms(text: str) -> list:
+    return WORD.findall(text.lower())
+
+
+class _Index:
+    def __init__(self, name: str, keys: list, options: dict):
+        self.name = name
+        self.keys = [(field, direction) for field, direction in keys]
+        self.options = options
+        self.text = any(direction == TEXT for _, direction in self.keys)
+        self.field = self.keys[0][0]
+        self.unique = bool(options.get('unique')) and not self.text
+        self.entries = defaultdict(set)  # hashed first key value -> ids
+        self.unique_entries = {}  # hashed values of all keys -> id
+        self.accesses = 0
+
+    def information(self) -> dict:
+        return {'key': list(self.keys), 'v': 2, **self.options}
+
+    def _values(self, document: dict) -> set:
+        values = {_hashable(value) for value in _candidates(document, self.field)}
+        return values or {None}
+
+    def _unique_key(self, document: dict) -> tuple:
+        return tuple(_hashable(next(iter(_lookup(document, field.split('.'))), None)) for field, _ in self.keys)
+
+    def check(self, document: dict, replacing=None):
+        if self.unique:
+            existing = self.unique_entries.get(self._unique_key(document))
+            if existing is not None and existing != replacing:
+                raise DuplicateKeyError(f'E11000 duplicate key error index: {self.name} dup key: '
+                                        f'{self._unique_key(document)}', DUPLICATE_KEY)
+
+    def add(self, document: dict):
+        if self.text:
+            return
+        for value in self._values(document):
+            self.entries[value].add(_key(document))
+        if self.unique:
+            self.unique_entries[self._unique_key(document)] = _key(document)
+
+    def remove(self, document: dict):
+        if self.text:
+            return
+        for value in self._values(document):
+            self.entries[value].discard(_key(document))
+            if not self.entries[value]:
+                del self.entries[value]
+        if self.unique:
+            self.unique_entries.pop(self._unique_key(document), None)
+
+    def lookup(self, condition) -> set:
+        """ids of the documents that may match an equality or `$in` condition, None when the index can not help"""
+        if isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition):
+            if set(condition) == {'$eq'}:
+                expected = [condition['$eq']]
+            elif set(condition) == {'$in'}:
+                expected = condition['$in']
+            else:
+                return None
+        elif isinstance(condition, list):
+            return None
+        else:
+            expected = [condition]
+        ids = set()
+        for value in expected:
+            if isinstance(value, (dict, list)):
+                return None
+            ids |= self.entries.get(_hashable(value), set())
+        return ids
+
+
+class _Collection:
+    def __init__(self):
+        self.documents = {}
+        self.positions = {}  # id -> insertion sequence, index lookups return documents in natural order
+        self.indexes = {}
+        self.id_index_accesses = 0
+        self._sequence = itertools.count()
+
+    def text_index(self) -> _Index:
+        return next((index for index in self.indexes.values() if index.text), None)
+
+    def plan(self, query: dict) -> tuple:
+        """`(index name, candidate ids)` of the cheapest equality condition, `(None, None)` for a collection scan"""
+        best = (None, None)
+        conditions = list(query.items())
+        for sub_query in query.get('$and', []):
+            conditions.extend(sub_query.items())
+        for field, condition in conditions:
+            if field.startswith('$'):
+                continue
+            if field == '_id':
+                ids = self._id_lookup(condition)
+            else:
+                index = next((index for index in self.indexes.values() if index.field == field and not index.text),
+                             None)
+                ids = index.lookup(condition) if index else None
+                if ids is not None:
+                    ids = set(ids)
+            if ids is not None and (best[1] is None or len(ids) < len(best[1])):
+                best = (ID_INDEX if field == '_id' else index.name, ids)
+        return best
+
+    def _id_lookup(self, condition) -> set:
+        if isinstance(condition, dict) and set(condition) == {'$in'}:
+            expected = condition['$in']
+        elif isinstance(condition, dict) and set(condition) == {'$eq'}:
+            expected = [condition['$eq']]
+        elif isinstance(condition, dict) and any(key.startswith('$') for key in condition):
+            return None
+        else:
+            expected = [condition]
+        return {_hashable(value) for value in expected} & self.documents.keys()
+
+    def search(self, query: dict) -> list:
+        """`[(score, document)]` of the documents matching `query`"""
+        text = query.get('$text')
+        index_name, ids = self.plan(query)
+        if index_name == ID_INDEX:
+            self.id_index_accesses += 1
+        elif index_name:
+            self.indexes[index_name].accesses += 1
+        documents = self.documents.values() if ids is None else \
+            [self.documents[_id] for _id in sorted(ids, key=self.positions.__getitem__)]
+
+        found = []
+        for document in documents:
+            if not matches(document, query):
+                continue
+            score = None
+            if text is not None:
+                score = self._text_score(document, text['$search'])
+                if not score:
+                    continue
+            found.append((score, document))
+        return found
+
+    def _text_score(self, document: dict, search: str) -> float:
+        index = self.text_index()
+        if index is None:
+            raise OperationFailure('text index required for $text query', INDEX_NOT_FOUND)
+        weights = index.options.get('weights', {})
+        fields = [field for field, direction in index.keys if direction == TEXT]
+        texts = {field: ' '.join(value for value in _candidates(document, field) if isinstance(value, str))
+                 for field in fields}
+        words = {field: _terms(text) for field, text in texts.items()}
+
+        score, positive = 0.0, False
+        for match in SEARCH_TERM.finditer(search):
+            negated = bool(match.group(1) or match.group(3))
+            phrase = match.group(2)
+            if phrase is not None:
+                hits = {field: texts[field].lower().count(phrase.lower()) for field in fields} if phrase else {}
+            else:
+                term_words = _terms(match.group(4))
+                hits = {field: sum(words[field].count(term) for term in term_words) for field in fields}
+            if negated:
+                if any(hits.values()):
+                    return 0.0
+                continue
+            if phrase is not None and not any(hits.values()):
+                return 0.0
+            positive = True
+            score += sum(weights.get(field, 1) * count for field, count in hits.items())
+        return score if positive else 0.0
+
+    def check(self, document: dict, replacing=None):
+        if replacing is None and _key(document) in self.documents:
+            raise DuplicateKeyError(f'E11000 duplicate key error index: {ID_INDEX} dup key: {document["_id"]}',
+                                    DUPLICATE_KEY)
+        for index in self.indexes.values():
+            index.check(document, replacing)
+
+    def store(self, document: dict, previous: dict = None):
+        for index in self.indexes.values():
+            if previous is not None:
+                index.remove(previous)
+            index.add(document)
+        self.documents[_key(document)] = document
+        self.positions.setdefault(_key(document), next(self._sequence))
+
+    def remove(self, document: dict):
+        for index in self.indexes.values():
+            index.remove(document)
+        del self.documents[_key(document)]
+        del self.positions[_key(document)]
+
+
+class MemoryDbService(IDbService):
+
+    def __init__(self, read_only: bool = False):
+        self._read_only = read_only
+        self._databases = defaultdict(dict)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, path: str, read_only: bool = False) -> 'MemoryDbService':
+        """a service holding the collections and indexes of a snapshot written by `snapshot`"""
+        service = cls()
+        with gzip.open(path, 'rb') as snapshot_file:
+            collection = None
+            for record in bson.decode_file_iter(snapshot_file):
+                if 'format' in record:
+                    if record['format'] != SNAPSHOT_FORMAT:
+                        raise ValueError(f'{path} is a snapshot of format {record["format"]}, '
+                                         f'expected {SNAPSHOT_FORMAT}')
+                elif 'collection' in record:
+                    collection = service._collection(*record['collection'])
+                    for index in record['indexes']:
+                        collection.indexes[index['name']] = _Index(index['name'], index['keys'], index['options'])
+                else:
+                    collection.store(record['document'])
+        service._read_only = read_only
+        return service
+
+    def snapshot(self, path: str):
+        """writes every collection with its indexes to `path`, replaced atomically"""
+        with self._lock:
+            temporary_path = f'{path}.tmp'
+            with gzip.open(temporary_path, 'wb') as snapshot_file:
+                snapshot_file.write(bson.encode({'format': SNAPSHOT_FORMAT}))
+                for db_name, collections in self._databases.items():
+                    for collection_name, collection in collections.items():
+                        snapshot_file.write(bson.encode({
+                            'collection': [db_name, collection_name],
+                            'indexes': [{'name': index.name, 'keys': index.keys, 'options': index.options}
+                                        for index in collection.indexes.values()]}))
+                        for document in collection.documents.values():
+                            snapshot_file.write(bson.encode({'document': document}))
+            os.replace(temporary_path, path)
+
+    def find_one(self, db_name: str, collection_name: str, query: dict, projection: dict = None) -> dict:
+        found = self.find(db_name, collection_name, query, projection, limit=1)
+        return found[0] if found else None
+
+    def find(self, db_name: str, collection_name: str, query: dict, projection: dict = None,
+             sort: list = None, limit: int = 0, skip: int = 0) -> list:
+        with self._lock:
+            collection = self._databases[db_name].get(collection_name)
+            if collection is None:
+                return []
+            found = collection.search(query or {})
+            for field, direction in reversed(sort or []):
+                if direction == TEXT_SCORE:
+                    found.sort(key=lambda result: result[0] or 0, reverse=True)
+                else:
+                    found.sort(key=lambda result: _sort_value(result[1], field, direction), reverse=direction < 0)
+            found = found[skip:skip + limit if limit else None]
+            return [project(document, projection, score) for score, document in found]
+
+    def insert_one(self, db_name: str, collection_name: str, record: dict) -> ObjectId:
+        with self._lock:
+            self._writable()
+            record.setdefault('_id', ObjectId())
+            collection = self._collection(db_name, collection_name)
+            document = copy.deepcopy(record)
+            collection.check(document)
+            collection.store(document)
+            return record['_id']
+
+    def insert_many(self, db_name: str, collection_name: str, records: list, ordered: bool = False) -> list:
+        # InsertOne keeps the record itself, so the records get their _id like with pymongo
+        self.bulk_write(db_name, collection_name, [InsertOne(record) for record in records], ordered)
+        return [record['_id'] for record in records]
+
+    def update_one(self, db_name: str, collection_name: str, query: dict, record: dict,
+                   array_filters: list = None, upsert: bool = False) -> UpdateResult:
+        with self._lock:
+            self._writable()
+            matched, modified, upserted_id = self._update(self._collection(db_name, collection_name), query, record,
+                                                          array_filters, upsert, many=False)
+            raw_result = {'n': matched + (upserted_id is not None), 'nModified': modified, 'ok': 1.0}
+            if upserted_id is not None:
+                raw_result['upserted'] = upserted_id
+            return UpdateResult(raw_result, True)
+
+    def delete_one(self, db_name: str, collection_name: str, query: dict) -> DeleteResult:
+        with self._lock:
+            self._writable()
+            return DeleteResult({'n': self._delete(self._collection(db_name, collection_name), query, many=False),
+                                 'ok': 1.0}, True)
+
+    def bulk_write(self, db_name: str, collection_name: str, requests: list,
+                   ordered: bool = False) -> BulkWriteResult:
+        with self._lock:
+            self._writable()
+            collection = self._collection(db_name, collection_name)
+            result = {'writeErrors': [], 'writeConcernErrors': [], 'nInserted': 0, 'nUpserted': 0, 'nMatched': 0,
+                      'nModified': 0, 'nRemoved': 0, 'upserted': []}
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        request._doc.setdefault('_id', ObjectId())
+                        document = copy.deepcopy(request._doc)
+                        collection.check(document)
+                        collection.store(document)
+                        result['nInserted'] += 1
+                    elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                        matched, modified, upserted_id = self._update(
+                            collection, request._filter, request._doc, getattr(request, '_array_filters', None),
+                            request._upsert, many=isinstance(request, UpdateMany))
+                        result['nMatched'] += matched
+                        result['nModified'] += modified
+                        if upserted_id is not None:
+                            result['nUpserted'] += 1
+                            result['upserted'].append({'index': index, '_id': upserted_id})
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        result['nRemoved'] += self._delete(collection, request._filter,
+                                                           many=isinstance(request, DeleteMany))
+                    else:
+                        raise TypeError(f'{request!r} is not a valid request')
+                except OperationFailure as error:
+                    result['writeErrors'].append({'index': index, 'code': error.code, 'errmsg': str(error),
+                                                  'op': getattr(request, '_doc', None)})
+                    if ordered:
+                        break
+            if result['writeErrors']:
+                raise BulkWriteError(result)
+            return BulkWriteResult(result, True)
+
+    def create_index(self, db_name: str, collection_name: str, keys: list, **kwargs) -> str:
+        with self._lock:
+            collection = self._collection(db_name, collection_name)
+            keys = [(keys, 1)] if isinstance(keys, str) else [tuple(key) for key in keys]
+            name = kwargs.get('name', _index_name(keys))
+            if name in collection.indexes:
+                return name
+            index = _Index(name, keys, {key: value for key, value in kwargs.items() if key != 'name'})
+            for document in collection.documents.values():
+                index.check(document)
+                index.add(document)
+            collection.indexes[name] = index
+            return name
+
+    def list_indexes(self, db_name: str, collection_name: str) -> dict:
+        with self._lock:
+            collection = self._databases[db_name].get(collection_name)
+            if collection is None:
+                return {}
+            return {ID_INDEX: {'key': [('_id', 1)], 'v': 2},
+                    **{name: index.information() for name, index in collection.indexes.items()}}
+
+    def aggregate(self, db_name: str, collection_name: str, pipeline: list) -> list:
+        """`$indexStats`, the stages that only filter, reshape or order documents and `$group` with `$sum`"""
+        with self._lock:
+            collection = self._databases[db_name].get(collection_name)
+            if collection is None:
+                return []
+            if pipeline and '$indexStats' in pipeline[0]:
+                accesses = {ID_INDEX: collection.id_index_accesses,
+                            **{name: index.accesses for name, index in collection.indexes.items()}}
+                return [{'name': name, 'accesses': {'ops': count}} for name, count in accesses.items()]
+            documents = [copy.deepcopy(document) for document in collection.documents.values()]
+
+        for stage in pipeline:
+            (operator, operand), = stage.items()
+            if operator == '$match':
+                documents = [document for document in documents if matches(document, operand)]
+            elif operator == '$project':
+                documents = [project(document, operand) for document in documents]
+            elif operator == '$sort':
+                for field, direction in reversed(list(operand.items())):
+                    documents.sort(key=lambda document: _sort_value(document, field, direction),
+                                   reverse=direction < 0)
+            elif operator == '$skip':
+                documents = documents[operand:]
+            elif operator == '$limit':
+                documents = documents[:operand]
+            elif operator == '$count':
+                documents = [{operand: len(documents)}] if documents else []
+            elif operator == '$group':
+                documents = _group(documents, operand)
+            elif operator == '$unwind':
+                field = (operand['path'] if isinstance(operand, dict) else operand)[1:]
+                documents = [{**document, field: item} for document in documents
+                             for item in (document.get(field) if isinstance(document.get(field), list)
+                                          else [document[field]] if field in document else [])]
+            else:
+                raise OperationFailure(f'{operator} is not supported by the in-memory database', 2)
+        return documents
+
+    def explain(self, db_name: str, collection_name: str, query: dict, sort: list = None) -> dict:
+        with self._lock:
+            collection = self._databases[db_name].get(collection_name) or _Collection()
+            if '$text' in query and collection.text_index():
+                return {'queryPlanner': {'winningPlan': {'stage': 'TEXT',
+                                                         'indexName': collection.text_index().name}}}
+            index_name, _ = collection.plan(query)
+            if index_name is None:
+                return {'queryPlanner': {'winningPlan': {'stage': 'COLLSCAN'}}}
+            return {'queryPlanner': {'winningPlan': {'stage': 'FETCH',
+                                                     'inputStage': {'stage': 'IXSCAN', 'indexName': index_name}}}}
+
+    def pool_statistics(self) -> dict:
+        return {}
+
+    def create_collection(self, db_name: str, collection_name: str):
+        with self._lock:
+            self._collection(db_name, collection_name)
+
+    def drop_collection(self, db_name: str, collection_name: str):
+        with self._lock:
+            self._databases[db_name].pop(collection_name, None)
+
+    def collection_names(self, db_name: str) -> list:
+        return list(self._databases.get(db_name, {}))
+
+    def _collection(self, db_name: str, collection_name: str) -> _Collection:
+        return self._databases[db_name].setdefault(collection_name, _Collection())
+
+    def _writable(self):
+        if self._read_only:
+            raise OperationFailure('the in-memory database is read only', ILLEGAL_OPERATION)
+
+    @staticmethod
+    def _update(collection: _Collection, query: dict, update: dict, array_filters: list, upsert: bool,
+                many: bool) -> tuple:
+        """`(matched, modified, upserted _id)`, every document is validated before any is stored"""
+        found = [document for _, document in collection.search(query)]
+        if not many:
+            found = found[:1]
+        if not found:
+            if not upsert:
+                return 0, 0, None
+            document = apply_update(_upsert_document(query), update, array_filters, inserting=True) \
+                if any(key.startswith('$') for key in update) else copy.deepcopy(update)
+            document.setdefault('_id', _upsert_document(query).get('_id', ObjectId()))
+            collection.check(document)
+            collection.store(document)
+            return 0, 0, document['_id']
+
+        updated = [(document, apply_update(document, update, array_filters)) for document in found]
+        changed = [(document, new_document) for document, new_document in updated if new_document != document]
+        for document, new_document in changed:
+            collection.check(new_document, replacing=_key(document))
+        for document, new_document in changed:
+            collection.store(new_document, previous=document)
+        return len(found), len(changed), None
+
+    @staticmethod
+    def _delete(collection: _Collection, query: dict, many: bool) -> int:
+        found = [document for _, document in collection.search(query)]
+        if not many:
+            found = found[:1]
+        for document in found:
+            collection.remove(document)
+        return len(found)
+
+
+def snapshot_database(db_controller: DbController, db_name: str, path: str) -> dict:
+    """
+    writes the collections of `db_services.indexes.INDEXES` with their declared indexes to a snapshot
+    `MemoryDbService.load` reads. Returns the number of documents per collection.
+    """
+    memory_db_service = MemoryDbService()
+    ensure_indexes(DbController(memory_db_service), db_name)
+    counts = {}
+    for collection_name in INDEXES:
+        documents = list(db_controller.find(db_name, collection_name, {}))
+        if documents:
+            memory_db_service.insert_many(db_name, collection_name, documents)
+        counts[collection_name] = len(documents)
+    memory_db_service.snapshot(path)
+    return counts
@@ -0,0 +1,39 @@
+from pymongo.errors import BulkWriteError
+
+from config import CHAPTERS_COLLECTION_NAME, COMMENTS_COLLECTION_NAME
+from db_services.db_controller import DbController
+from db_services.indexes import ensure_indexes
+
+DUPLICATE_KEY_ERROR_CODE = 11000
+
+
+def migrate_embedded_comments(db_controller: DbController, db_name: str) -> int:
+    """
+    Moves the comments embedded in `chapters.comments` into the comments collection and
+    keeps their count on the chapter. Safe to run again after a partial run: already moved
+    comments keep their _id and are skipped.
+    """
+    ensure_indexes(db_controller, db_name, [COMMENTS_COLLECTION_NAME])
+
+    migrated_count = 0
+    chapters = db_controller.find(db_name, CHAPTERS_COLLECTION_NAME, {'comments': {'$exists': True}},
+                                  projection={'comments': 1})
+    for chapter in chapters:
+        comments = chapter.get('comments') or []
+        for comment in comments:
+            comment['chapter_id'] = chapter['_id']
+        if comments:
+            migrated_count += _insert_skipping_duplicates(db_controller, db_name, comments)
+
+        db_controller.update_one(db_name, CHAPTERS_COLLECTION_NAME, {'_id': chapter['_id']},
+                                 {'$inc': {'comment_count': len(comments)}, '$unset': {'comments': ''}})
+    return migrated_count
+
+
+def _insert_skipping_duplicates(db_controller: DbController, db_name: str, comments: list) -> int:
+    try:
+        return len(db_controller.insert_many(db_name, COMMENTS_COLLECTION_NAME, comments, ordered=False))
+    except BulkWriteError as error:
+        if any(write_error['code'] != DUPLICATE_KEY_ERROR_CODE for write_error in error.details['writeErrors']):
+            raise
+        return error.details['nInserted']
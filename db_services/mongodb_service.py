@@ -1,52 +1,79 @@
 from bson.objectid import ObjectId
 from pymongo import MongoClient
-from pymongo.results import UpdateResult, DeleteResult
+from pymongo.results import UpdateResult, DeleteResult, BulkWriteResult
 
+from db_services.client_factory import LazyMongoClient
+from db_services.collection_registry import CollectionRegistry
 from db_services.db_service_interface import IDbService
 
 
 class MongodbService(IDbService):
 
-    def __init__(self, client: MongoClient):
+    def __init__(self, client: MongoClient | LazyMongoClient, registry: CollectionRegistry = None):
         self._client = client
+        self._registry = registry or CollectionRegistry(client)
 
-    def find_one(self, db_name: str, collection_name: str, query: dict) -> dict:
+    def find_one(self, db_name: str, collection_name: str, query: dict, projection: dict = None) -> dict:
         collection = self.get_collection(db_name, collection_name)
-        return collection.find_one(query)
+        return collection.find_one(query, projection)
 
-    def find(self, db_name: str, collection_name: str, query: dict) -> dict:
+    def find(self, db_name: str, collection_name: str, query: dict, projection: dict = None,
+             sort: list = None, limit: int = 0, skip: int = 0) -> dict:
         collection = self.get_collection(db_name, collection_name)
-        return collection.find(query)
+        return collection.find(query, projection, sort=sort, limit=limit, skip=skip)
 
     def insert_one(self, db_name: str, collection_name: str, record: dict) -> ObjectId:
         collection = self.get_collection(db_name, collection_name)
         return collection.insert_one(record).inserted_id
 
+    def insert_many(self, db_name: str, collection_name: str, records: list, ordered: bool = False) -> list:
+        collection = self.get_collection(db_name, collection_name)
+        return collection.insert_many(records, ordered=ordered).inserted_ids
+
     def update_one(self, db_name: str, collection_name: str, query: dict, record: dict,
-                   array_filters=None) -> UpdateResult:
+                   array_filters=None, upsert: bool = False) -> UpdateResult:
         if array_filters is None:
             array_filters = []
         collection = self.get_collection(db_name, collection_name)
-        return collection.update_one(query, record, array_filters=array_filters)
+        return collection.update_one(query, record, array_filters=array_filters, upsert=upsert)
 
     def delete_one(self, db_name: str, collection_name: str, query: dict) -> DeleteResult:
         collection = self.get_collection(db_name, collection_name)
         return collection.delete_one(query)
 
+    def bulk_write(self, db_name: str, collection_name: str, requests: list,
+                   ordered: bool = False) -> BulkWriteResult:
+        collection = self.get_collection(db_name, collection_name)
+        return collection.bulk_write(requests, ordered=ordered)
+
+    def create_index(self, db_name: str, collection_name: str, keys: list, **kwargs) -> str:
+        # creating an index creates a missing collection, so skip the existence check
+        return self._client[db_name][collection_name].create_index(keys, **kwargs)
+
+    def list_indexes(self, db_name: str, collection_name: str) -> dict:
+        return self._client[db_name][collection_name].index_information()
+
+    def aggregate(self, db_name: str, collection_name: str, pipeline: list) -> list:
+        collection = self.get_collection(db_name, collection_name)
+        return list(collection.aggregate(pipeline))
+
+    def explain(self, db_name: str, collection_name: str, query: dict, sort: list = None) -> dict:
+        collection = self.get_collection(db_name, collection_name)
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        return cursor.explain()
+
+    def pool_statistics(self) -> dict:
+        if isinstance(self._client, LazyMongoClient):
+            return self._client.statistics()
+        return {}
+
     def get_collection(self, db_name: str, collection_name: str):
-        if self.is_db_exist(db_name):
-            if self.is_collection_exist(db_name, collection_name):
-                return self._client[db_name][collection_name]
-            raise KeyError(f'collection: {collection_name} does not exist under database: {db_name}')
-        raise KeyError(f'database: {db_name} does not exist under client: {self._client}')
+        return self._registry.get_collection(db_name, collection_name)
 
     def is_db_exist(self, db_name: str) -> bool:
-        db_list = self._client.list_database_names()
-        if db_name in db_list:
-            return True
-        return False
+        return self._registry.is_db_exist(db_name)
 
     def is_collection_exist(self, db_name: str, collection_name: str) -> bool:
-        db = self._client[db_name]
-        collection_list = db.list_collection_names()
-        return collection_name in collection_list
+        return self._registry.is_collection_exist(db_name, collection_name)
@@ -0,0 +1,56 @@
+import logging
+
+from bson.objectid import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.results import UpdateResult, DeleteResult
+
+from db_services.async_db_service_interface import IAsyncDbService
+
+LOGGER = logging.getLogger(__name__)
+
+
+class MotorService(IAsyncDbService):
+    """
+    Non-blocking IDbService counterpart on top of Motor.
+    Collection existence is checked once by `validate` (at application startup) rather than per query.
+    """
+
+    def __init__(self, client: AsyncIOMotorClient):
+        self._client = client
+
+    async def find_one(self, db_name: str, collection_name: str, query: dict, projection: dict = None) -> dict:
+        return await self._client[db_name][collection_name].find_one(query, projection)
+
+    async def find(self, db_name: str, collection_name: str, query: dict, projection: dict = None,
+                   sort: list = None, limit: int = 0) -> list:
+        cursor = self._client[db_name][collection_name].find(query, projection, sort=sort, limit=limit)
+        return await cursor.to_list(length=limit or None)
+
+    async def insert_one(self, db_name: str, collection_name: str, record: dict) -> ObjectId:
+        result = await self._client[db_name][collection_name].insert_one(record)
+        return result.inserted_id
+
+    async def update_one(self, db_name: str, collection_name: str, query: dict, record: dict,
+                         array_filters=None, upsert: bool = False) -> UpdateResult:
+        return await self._client[db_name][collection_name].update_one(query, record,
+                                                                       array_filters=array_filters or None,
+                                                                       upsert=upsert)
+
+    async def delete_one(self, db_name: str, collection_name: str, query: dict) -> DeleteResult:
+        return await self._client[db_name][collection_name].delete_one(query)
+
+    async def validate(self, required: dict, strict: bool = True):
+        """strict mode raises KeyError for a missing required collection, lenient mode only logs it"""
+        db_names = await self._client.list_database_names()
+        for db_name, collection_names in required.items():
+            existing = await self._client[db_name].list_collection_names() if db_name in db_names else []
+            for collection_name in collection_names:
+                if collection_name in existing:
+                    continue
+                if db_name not in db_names:
+                    message = f'database: {db_name} does not exist under client: {self._client}'
+                else:
+                    message = f'collection: {collection_name} does not exist under database: {db_name}'
+                if strict:
+                    raise KeyError(message)
+                LOGGER.warning(message)
@@ -0,0 +1,72 @@
+import functools
+import time
+
+from db_services.db_controller import DbController
+from metrics_services import DB_OPERATION_DURATION
+
+DB_OPERATIONS = ('find_one', 'find', 'insert_one', 'insert_many', 'update_one', 'delete_one', 'bulk_write',
+                 'create_index', 'list_indexes', 'aggregate', 'explain')
+
+
+class TimedDbController:
+    """
+    DbController proxy that times every operation per collection. `find` returns a lazy cursor,
+    so its time is the call plus the time spent reading the cursor, observed once it is exhausted or closed.
+    """
+
+    def __init__(self, db_controller: DbController):
+        self._db_controller = db_controller
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._db_controller, name)
+        if name not in DB_OPERATIONS:
+            return attribute
+
+        @functools.wraps(attribute)
+        def timed_operation(db_name: str, collection_name: str, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = attribute(db_name, collection_name, *args, **kwargs)
+            except Exception:
+                DB_OPERATION_DURATION.observe(time.perf_counter() - started, collection_name, name)
+                raise
+            if name == 'find':
+                return TimedCursor(result, collection_name, time.perf_counter() - started)
+            DB_OPERATION_DURATION.observe(time.perf_counter() - started, collection_name, name)
+            return result
+
+        self.__dict__[name] = timed_operation  # __getattr__ is not called again for this name
+        return timed_operation
+
+
+class TimedCursor:
+    def __init__(self, cursor, collection_name: str, elapsed: float):
+        self._cursor = cursor
+        self._iterator = iter(cursor)
+        self._collection_name = collection_name
+        self._elapsed = elapsed
+        self._observed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            document = next(self._iterator)
+        except StopIteration:
+            self._elapsed += time.perf_counter() - started
+            self.close()
+            raise
+        self._elapsed += time.perf_counter() - started
+        return document
+
+    def close(self):
+        if not self._observed:
+            self._observed = True
+            DB_OPERATION_DURATION.observe(self._elapsed, self._collection_name, 'find')
+        if hasattr(self._cursor, 'close'):
+            self._cursor.close()
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
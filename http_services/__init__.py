@@ -0,0 +1,11 @@
+import redis
+
+from config import Config
+from http_services.rate_limiter import LocalBuckets, RedisBuckets
+
+
+def get_rate_limit_buckets():
+    if Config.RATE_LIMIT_BACKEND == 'redis':
+        client = redis.Redis.from_url(Config.CACHE_REDIS_URL, socket_timeout=0.1, socket_connect_timeout=0.1)
+        return RedisBuckets(client)
+    return LocalBuckets()
@@ -0,0 +1,164 @@
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import Flask, Response, request
+from werkzeug.http import parse_etags, quote_etag
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html')
+ENCODINGS = ('br', 'gzip')
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """the ETag of the `encoding` representation of the content whose ETag is `etag`"""
+    return f'{etag}-{encoding}' if encoding else etag
+
+
+def split_etag(etag: str) -> tuple:
+    """`(content ETag, encoding)` of a representation's ETag, the encoding is None for identity"""
+    for encoding in ENCODINGS:
+        if etag.endswith(f'-{encoding}'):
+            return etag[:-len(encoding) - 1], encoding
+    return etag, None
+
+
+class Compression:
+    """
+    Compresses responses with the best encoding the client accepts (br, then gzip) in an after_request hook.
+    Bodies under `min_size` bytes are sent as is, streamed responses are compressed chunk by chunk.
+    Compressed bodies of responses with a strong ETag are kept in a small LRU, so cached responses are
+    compressed once rather than on every hit. Every representation keeps a strong ETag: the negotiated encoding
+    is appended to the content's (`"<id>-<version>-br"`), on 200s and 304s alike. The views compare validators
+    with the content's ETag, so If-None-Match is rewritten to it before they run.
+    """
+
+    def __init__(self, app: Flask = None, min_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5,
+                 cache_size: int = 256):
+        self._min_size = min_size
+        self._gzip_level = gzip_level
+        self._brotli_quality = brotli_quality
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.before_request(self.content_validators)
+        app.after_request(self.compress)
+
+    @staticmethod
+    def encodings() -> tuple:
+        return ENCODINGS if brotli is not None else ('gzip',)
+
+    def content_validators(self):
+        """
+        rewrites the If-None-Match ETags of the representation this request negotiates to the content's,
+        ETags of other encodings are dropped, they can not match
+        """
+        header = request.environ.get('HTTP_IF_NONE_MATCH')
+        if not header:
+            return
+        etags = parse_etags(header)
+        if etags.star_tag:
+            return
+        negotiated = self._negotiate()
+        tags = []
+        for tag in etags.as_set(include_weak=True):
+            content_etag, encoding = split_etag(tag)
+            if encoding is None or encoding == negotiated:
+                tags.append(quote_etag(content_etag, weak=etags.is_weak(tag)))
+        if tags:
+            request.environ['HTTP_IF_NONE_MATCH'] = ', '.join(tags)
+        else:
+            del request.environ['HTTP_IF_NONE_MATCH']
+
+    def compress(self, response: Response) -> Response:
+        if response.status_code == 304:
+            # answers for the representation the 200 would have sent, with the validator it would have carried
+            if response.get_etag()[0] and response.mimetype in COMPRESSIBLE_MIMETYPES:
+                response.vary.add('Accept-Encoding')
+                _encode_etag(response, self._negotiate())
+            return response
+        if not self._is_compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self._negotiate()
+        if encoding is not None and request.method != 'HEAD':
+            self._encode(response, encoding)
+        # named after the negotiated encoding even when the body is too small to compress, a 304 can not tell
+        _encode_etag(response, encoding)
+        return response
+
+    def _negotiate(self) -> str:
+        return request.accept_encodings.best_match(self.encodings())
+
+    def _encode(self, response: Response, encoding: str):
+        if response.is_streamed:
+            response.response = self._compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self._min_size:
+                return
+            response.set_data(self._compressed(data, encoding, response.get_etag()))
+        response.headers['Content-Encoding'] = encoding
+
+    def _is_compressible(self, response: Response) -> bool:
+        return (response.status_code == 200 and not response.direct_passthrough
+                and 'Content-Encoding' not in response.headers and response.mimetype in COMPRESSIBLE_MIMETYPES)
+
+    def _compressed(self, data: bytes, encoding: str, etag: tuple) -> bytes:
+        etag, weak = etag
+        if not etag or weak:
+            return self._compress(data, encoding)
+
+        key = (etag, encoding, len(data))
+        with self._lock:
+            compressed = self._cache.get(key)
+            if compressed is not None:
+                self._cache.move_to_end(key)
+                return compressed
+        compressed = self._compress(data, encoding)
+        with self._lock:
+            self._cache[key] = compressed
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return compressed
+
+    def _compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == 'br':
+            return brotli.compress(data, quality=self._brotli_quality)
+        return gzip.compress(data, compresslevel=self._gzip_level, mtime=0)
+
+    def _compress_stream(self, chunks, encoding: str):
+        try:
+            if encoding == 'br':
+                compressor = brotli.Compressor(quality=self._brotli_quality)
+                for chunk in chunks:
+                    yield compressor.process(_as_bytes(chunk)) + compressor.flush()
+                yield compressor.finish()
+            else:
+                compressor = zlib.compressobj(self._gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+                for chunk in chunks:
+                    yield compressor.compress(_as_bytes(chunk)) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                yield compressor.flush()
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+
+def _encode_etag(response: Response, encoding: str):
+    etag, weak = response.get_etag()
+    if etag and encoding:
+        response.set_etag(encoded_etag(etag, encoding), weak=weak)
+
+
+def _as_bytes(chunk) -> bytes:
+    return chunk.encode() if isinstance(chunk, str) else chunk
@@ -0,0 +1,64 @@
+import functools
+from datetime import timezone
+
+from flask import Response, request, make_response
+from werkzeug.datastructures import ETags
+
+from http_services.compression import split_etag
+
+
+def document_etag(document: dict) -> str:
+    return f'{document["_id"]}-{document.get("version", 0)}'
+
+
+def set_validators(response: Response, document: dict) -> Response:
+    """strong ETag from the document version and Last-Modified from its date_updated"""
+    response.set_etag(document_etag(document))
+    if document.get('date_updated'):
+        # naive datetimes are stored (and returned) by Mongo as UTC
+        response.last_modified = document['date_updated'].replace(tzinfo=timezone.utc)
+    return response
+
+
+def is_conditional() -> bool:
+    return bool(request.if_none_match) or request.if_modified_since is not None
+
+
+def not_modified(document: dict):
+    """a 304 response when the request's If-None-Match / If-Modified-Since still hold for `document`, else None"""
+    response = set_validators(Response(), document).make_conditional(request)
+    return response if response.status_code == 304 else None
+
+
+def if_match_query(document_id: str, if_match: ETags = None) -> dict:
+    """
+    the filter an If-Match header (the Flask request's by default) adds to a write of `document_id`, empty without
+    the header or with `*`. Raises ValueError when no listed ETag belongs to the document, the precondition can
+    never hold then.
+    """
+    if if_match is None:
+        if_match = request.if_match
+    if not if_match or if_match.star_tag:
+        return {}
+
+    versions = []
+    # If-Match uses the strong comparison, the ETag of any encoding names the version of its content
+    for etag in if_match.as_set():
+        etag_id, _, version = split_etag(etag)[0].rpartition('-')
+        if etag_id == document_id and version.isdigit():
+            versions.append(int(version))
+    if not versions:
+        raise ValueError(f'If-Match does not match any version of {document_id}')
+    if 0 in versions:
+        versions.append(None)  # documents written before versioning
+    return {'version': {'$in': versions}}
+
+
+def conditional(function):
+    """answers GET/HEAD requests whose validators still match the response ETag/Last-Modified with 304"""
+
+    @functools.wraps(function)
+    def wrapped_function(*args, **kwargs):
+        return make_response(function(*args, **kwargs)).make_conditional(request)
+
+    return wrapped_function
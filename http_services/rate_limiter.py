@@ -0,0 +1,174 @@
+"""
+Request admission control. Routes declare token bucket limits with `RateLimiter.limit`, one bucket per limit
+name and client (the JWT identity, or the address of anonymous clients), and a request that finds its bucket
+empty is answered 429 with Retry-After before the view runs. Buckets live in this process, or in Redis so every
+worker shares them; a Redis error falls back to the local buckets for a while instead of failing the request.
+`max_concurrent` caps the requests a process handles at once, the surplus is shed with 503 right away
+rather than queueing behind a slow database.
+"""
+import functools
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Flask, g, jsonify, request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import PyJWTError
+from redis.exceptions import RedisError
+
+from auth_services.jwt_identity import jwt_identity
+from metrics_services import RATE_LIMITED
+
+LOGGER = logging.getLogger(__name__)
+
+# refills the bucket for the time since its last request, takes a token if there is one and returns the seconds
+# until the next token otherwise; the Redis clock keeps the workers consistent
+TOKEN_BUCKET_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+local tokens = math.min(burst, (tonumber(bucket[1]) or burst) + elapsed * rate)
+local retry_after = 0
+if tokens >= 1 then tokens = tokens - 1 else retry_after = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(retry_after)
+"""
+
+
+def parse_limit(limit: str):
+    """`'<requests>/<seconds>'` as `(rate per second, burst)`, None for an empty or zero limit"""
+    if not limit:
+        return None
+    requests, _, seconds = limit.partition('/')
+    requests, seconds = int(requests), float(seconds or 1)
+    if requests <= 0 or seconds <= 0:
+        return None
+    return requests / seconds, requests
+
+
+class LocalBuckets:
+    """token buckets of this process, the least recently used keys are dropped beyond `max_keys`"""
+
+    def __init__(self, max_keys: int = 10000):
+        self._max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        """takes a token from the bucket of `key`, returns 0 or the seconds until the bucket has one"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            retry_after = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1 if not retry_after else tokens, now)
+            if len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+class RedisBuckets:
+    """token buckets shared by every worker, updated atomically by a Lua script"""
+
+    def __init__(self, client, fallback: LocalBuckets = None, prefix: str = 'rate_limit:',
+                 retry_interval: float = 30):
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        self._fallback = fallback or LocalBuckets()
+        self._prefix = prefix
+        self._retry_interval = retry_interval
+        self._unavailable_until = 0.0
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        if time.monotonic() >= self._unavailable_until:
+            try:
+                return float(self._script(keys=[self._prefix + key], args=[rate, burst]))
+            except RedisError:  # the local buckets still limit every worker on its own
+                LOGGER.exception('rate limit buckets are unavailable, using local buckets for %ss',
+                                 self._retry_interval)
+                self._unavailable_until = time.monotonic() + self._retry_interval
+        return self._fallback.take(key, rate, burst)
+
+
+def client_key(by_user: bool = True) -> str:
+    """
+    the JWT identity of the request when `by_user` and it has a valid one, its remote address otherwise. The
+    view's PermissionRequired reuses the decoded token. Behind proxies the address is only the client's with
+    ProxyFix trusting as many X-Forwarded-For hops as there are proxies (PROXY_FIX_X_FOR).
+    """
+    identity = None
+    if by_user:
+        try:
+            identity = jwt_identity(optional=True)
+        except (JWTExtendedException, PyJWTError):
+            pass  # the view's own jwt_required answers for the token
+    return f'user:{identity}' if identity else f'address:{request.remote_addr}'
+
+
+class RateLimiter:
+
+    def __init__(self, app: Flask = None, buckets=None, max_concurrent: int = 0, enabled: bool = True,
+                 exempt_endpoints: tuple = ('get_metrics',)):
+        self._buckets = buckets or LocalBuckets()
+        self._max_concurrent = max_concurrent
+        self.enabled = enabled
+        self._exempt_endpoints = exempt_endpoints
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        if self._max_concurrent > 0:
+            app.before_request(self._admit)
+            app.teardown_request(self._release)
+
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def limit(self, name: str, limit: str, by_user: bool = True):
+        """limits the view to `limit` (`'<requests>/<seconds>'`) per client, shared by the views of `name`"""
+        parsed = parse_limit(limit)
+
+        def decorator(function):
+            if parsed is None:
+                return function
+            rate, burst = parsed
+
+            @functools.wraps(function)
+            def wrapped_function(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                retry_after = self._buckets.take(f'{name}:{client_key(by_user)}', rate, burst)
+                if retry_after:
+                    RATE_LIMITED.inc(name)
+                    return jsonify({'msg': 'Too many requests'}), 429, {'Retry-After': str(math.ceil(retry_after))}
+                return function(*args, **kwargs)
+
+            return wrapped_function
+
+        return decorator
+
+    def _admit(self):
+        if not self.enabled or request.endpoint in self._exempt_endpoints:
+            return None
+        with self._lock:
+            if self._in_flight >= self._max_concurrent:
+                admitted = False
+            else:
+                self._in_flight += 1
+                admitted = True
+        if not admitted:
+            RATE_LIMITED.inc('concurrency')
+            return jsonify({'msg': 'The server is busy'}), 503, {'Retry-After': '1'}
+        g.rate_limiter_admitted = True
+        return None
+
+    def _release(self, _error=None):
+        if g.pop('rate_limiter_admitted', False):
+            with self._lock:
+                self._in_flight -= 1
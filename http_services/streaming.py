@@ -0,0 +1,18 @@
+from models.serialization import dumps, to_response_document
+
+
+def stream_json_array(documents, key: str, chunk_size: int = 64 * 1024):
+    """
+    Yields `{key: [documents]}` as json, one document at a time straight from the cursor, so memory stays
+    flat however many documents there are. Output is buffered into chunks of about `chunk_size` bytes.
+    """
+    buffer = bytearray(b'{' + dumps(key) + b':[')
+    for index, document in enumerate(documents):
+        if index:
+            buffer += b','
+        buffer += dumps(to_response_document(document))
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += b']}'
+    yield bytes(buffer)
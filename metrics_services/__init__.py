@@ -0,0 +1,20 @@
+from metrics_services.registry import Registry
+
+METRICS = Registry(process_label='pid')
+
+HTTP_REQUEST_DURATION = METRICS.histogram('http_request_duration_seconds', 'Request latency per route',
+                                          ('method', 'route', 'status'))
+DB_OPERATION_DURATION = METRICS.histogram('db_operation_duration_seconds',
+                                          'DbController call latency, cursors included, per collection',
+                                          ('collection', 'operation'))
+AUTH_LOOKUP_DURATION = METRICS.histogram('auth_lookup_duration_seconds', 'Current user lookup latency',
+                                         ('source',))
+EXTERNAL_REQUEST_DURATION = METRICS.histogram('external_request_duration_seconds', 'Outgoing http call latency',
+                                              ('service',))
+VALIDATION_DURATION = METRICS.histogram('validation_duration_seconds', 'Request body model validation latency',
+                                        ('model',))
+COMMENT_WRITE_BEHIND = METRICS.counter('comment_write_behind_total',
+                                       'Write-behind comment mutations per result (queued, rejected, written, '
+                                       'dropped, failed)', ('result',))
+RATE_LIMITED = METRICS.counter('rate_limited_requests_total',
+                               'Requests rejected per rate limit, concurrency for the concurrency cap', ('limit',))
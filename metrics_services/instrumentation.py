@@ -0,0 +1,62 @@
+import time
+
+from flask import Flask, Response, g, request
+
+from metrics_services import METRICS, HTTP_REQUEST_DURATION
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def init_app(app: Flask, caches: dict, pool_statistics):
+    """
+    Times every request per route, reports the hit/miss counts of `caches` ({name: cache with statistics()})
+    and the connection pool counters `pool_statistics()` returns, and serves them all on /metrics.
+    """
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response: Response) -> Response:
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, request.method, route,
+                                          str(response.status_code))
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        return Response(METRICS.render(), mimetype=CONTENT_TYPE)
+
+    METRICS.add_collector(lambda: _cache_metrics(caches))
+    METRICS.add_collector(lambda: _pool_metrics(pool_statistics()))
+
+
+def _cache_metrics(caches: dict) -> list:
+    samples = []
+    for cache_name, cache in caches.items():
+        statistics = cache.statistics()
+        samples += [((cache_name, 'hit'), statistics['hits']), ((cache_name, 'miss'), statistics['misses'])]
+    return [('cache_requests_total', 'counter', 'Cache lookups per cache and result', ('cache', 'result'), samples)]
+
+
+def _pool_metrics(statistics: dict) -> list:
+    clients = {'primary': statistics, **({'read': statistics['read']} if 'read' in statistics else {})}
+    connections, check_outs, check_out_failures, wait_seconds = [], [], [], []
+    for client, client_statistics in clients.items():
+        for address, pool in client_statistics.get('pools', {}).items():
+            connections += [((client, address, 'open'), pool['open']), ((client, address, 'in_use'), pool['in_use'])]
+            check_outs.append(((client, address), pool['check_outs']))
+            check_out_failures.append(((client, address), pool['check_out_failures']))
+            wait_seconds.append(((client, address), pool['wait_ms_total'] / 1000))
+    labels = ('client', 'address')
+    return [
+        ('mongo_pool_connections', 'gauge', 'Pooled connections per state', labels + ('state',), connections),
+        ('mongo_pool_check_outs_total', 'counter', 'Connection check outs', labels, check_outs),
+        ('mongo_pool_check_out_failures_total', 'counter', 'Failed connection check outs', labels,
+         check_out_failures),
+        ('mongo_pool_check_out_wait_seconds_total', 'counter', 'Time spent waiting for a connection', labels,
+         wait_seconds),
+    ]
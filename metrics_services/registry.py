@@ -0,0 +1,158 @@
+import bisect
+import functools
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> list:
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in self._values.items()]
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._buckets = tuple(buckets)
+        self._values = {}  # labels: [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            values = self._values.get(labels)
+            if values is None:
+                values = self._values[labels] = [0] * (len(self._buckets) + 2)
+            values[index] += 1
+            values[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self) -> list:
+        samples = []
+        with self._lock:
+            values = {labels: list(values) for labels, values in self._values.items()}
+        for labels, counts in values.items():
+            cumulative = 0
+            for bound, count in zip(self._buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', labels + (_format_value(bound),), cumulative))
+            samples.append((f'{self.name}_sum', labels, counts[-1]))
+            samples.append((f'{self.name}_count', labels, cumulative))
+        return samples
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+
+class Registry:
+    """
+    Metrics of this process in the Prometheus text format. Collectors are called on every render,
+    for values that are cheaper to read when scraped than to record on every request (e.g. pool counters).
+    With a `process_label` every sample is labeled with the process id, so the series of the workers of a
+    pre-forking server stay apart (and each only grows) instead of alternating on every scrape. A forked child
+    starts from zero rather than from the values its parent had.
+    """
+
+    def __init__(self, process_label: str = None):
+        self._process_label = process_label
+        self._metrics = []
+        self._collectors = []
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=functools.partial(_reset_after_fork, weakref.ref(self)))
+
+    def counter(self, name: str, documentation: str, label_names: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def add_collector(self, collector):
+        """`collector()` returns [(name, metric type, documentation, label names, [(labels, value)])]"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        process_names, process_labels = (), ()
+        if self._process_label:
+            process_names, process_labels = (self._process_label,), (str(os.getpid()),)
+        lines = []
+        for metric in self._metrics:
+            metric_type = 'histogram' if isinstance(metric, Histogram) else 'counter'
+            label_names = metric.label_names + (('le',) if metric_type == 'histogram' else ())
+            lines += _header(metric.name, metric_type, metric.documentation)
+            for name, labels, value in metric.samples():
+                names = label_names if name.endswith('_bucket') else metric.label_names
+                lines.append(_sample(name, names + process_names, labels + process_labels, value))
+
+        for collector in self._collectors:
+            for name, metric_type, documentation, label_names, samples in collector():
+                lines += _header(name, metric_type, documentation)
+                lines += [_sample(name, label_names + process_names, labels + process_labels, value)
+                          for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """zeroes every counter and histogram"""
+        for metric in self._metrics:
+            metric.clear()
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+def _reset_after_fork(registry_ref: weakref.ref):
+    registry = registry_ref()
+    if registry is not None:
+        registry.reset()
+
+
+def _header(name: str, metric_type: str, documentation: str) -> list:
+    return [f'# HELP {name} {documentation}', f'# TYPE {name} {metric_type}']
+
+
+def _sample(name: str, label_names: tuple, labels: tuple, value: float) -> str:
+    if not label_names:
+        return f'{name} {_format_value(value)}'
+    labels = ','.join(f'{label_name}="{_escape(str(label))}"' for label_name, label in zip(label_names, labels))
+    return f'{name}{{{labels}}} {_format_value(value)}'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -4,8 +4,8 @@ from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 
-from .comment import Comment
 from .objectid import PydanticObjectId
+from .rating import Rating
 
 
 class HollyBook(Enum):
@@ -23,9 +23,10 @@ class Chapter(BaseModel):
     chapter_letters: str
     verses: List[str]
     analysis: str
-    rating: dict
+    rating: Rating
     tags: List[str]
-    comments: Optional[List[Comment]]
+    comment_count: int = 0
+    version: int = 0
     date_added: Optional[datetime] = datetime.now()
     date_updated: Optional[datetime] = datetime.now()
 
@@ -38,3 +39,9 @@ class Chapter(BaseModel):
         if "_id" in data and data["_id"] is None:
             data.pop("_id")
         return data
+
+
+def versioned_update(update: dict) -> dict:
+    """every chapter write bumps `version` and `date_updated`, the chapter ETag and Last-Modified derive from them"""
+    return {**update, '$inc': {**update.get('$inc', {}), 'version': 1},
+            '$set': {**update.get('$set', {}), 'date_updated': datetime.now()}}
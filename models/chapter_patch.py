@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Extra
+from typing import List, Optional
+
+from .chapter_update import HollyBook
+from .rating import Rating
+
+
+class ChapterPatch(BaseModel):
+    """the editable chapter fields, a patch carries only the fields it changes"""
+    author: Optional[str]
+    holy_book: Optional[HollyBook]
+    book: Optional[str]
+    chapter_number: Optional[int]
+    chapter_letters: Optional[str]
+    verses: Optional[List[str]]
+    analysis: Optional[str]
+    rating: Optional[Rating]
+    tags: Optional[List[str]]
+
+    class Config:
+        extra = Extra.forbid
+
+    def to_json(self):
+        return self.json(exclude_unset=True, exclude_none=True)
+
+    def to_bson(self):
+        data = self.dict(exclude_unset=True, exclude_none=True)
+        if "holy_book" in data:
+            data["holy_book"] = data["holy_book"].value
+        return data
@@ -0,0 +1,3 @@
+SUMMARY_FIELDS = ('author', 'holy_book', 'book', 'chapter_number', 'chapter_letters', 'analysis', 'rating',
+                  'tags', 'comment_count', 'date_added', 'date_updated')
+PROJECTABLE_FIELDS = SUMMARY_FIELDS + ('verses',)
@@ -4,6 +4,7 @@ from datetime import datetime
 from enum import Enum
 
 from .objectid import PydanticObjectId
+from .rating import Rating
 
 
 class HollyBook(Enum):
@@ -21,7 +22,7 @@ class ChapterUpdate(BaseModel):
     chapter_letters: str
     verses: List[str]
     analysis: str
-    rating: dict
+    rating: Rating
     tags: List[str]
     date_added: Optional[datetime] = datetime.now()
     date_updated: Optional[datetime] = datetime.now()
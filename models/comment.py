@@ -8,12 +8,13 @@ from .objectid import PydanticObjectId
 
 class Comment(BaseModel):
     id: Optional[PydanticObjectId] = Field(None, alias="_id")
+    chapter_id: Optional[PydanticObjectId]
     name: str
     email: str
     picture: str
     content: str
-    date_added: Optional[datetime] = datetime.now()
-    date_updated: Optional[datetime] = datetime.now()
+    date_added: Optional[datetime] = Field(default_factory=datetime.now)
+    date_updated: Optional[datetime] = Field(default_factory=datetime.now)
 
     def to_json(self):
         return json.loads(self.json())
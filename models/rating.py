@@ -0,0 +1,35 @@
+import math
+
+
+def _finite(value) -> bool:
+    if isinstance(value, float):
+        return math.isfinite(value)
+    if isinstance(value, dict):
+        return all(_finite(item) for item in value.values())
+    if isinstance(value, list):
+        return all(_finite(item) for item in value)
+    return True
+
+
+class Rating(dict):
+    """
+    Chapter rating field, a dict whose numbers are finite (json parsers accept NaN and Infinity).
+    """
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, v):
+        if not isinstance(v, dict):
+            raise TypeError('rating must be an object')
+        if not _finite(v):
+            raise ValueError('rating values must be finite numbers')
+        return dict(v)
+
+    @classmethod
+    def __modify_schema__(cls, field_schema: dict):
+        field_schema.update(
+            type="object"
+        )
@@ -0,0 +1,41 @@
+import json
+from datetime import datetime
+from enum import Enum
+
+from bson import ObjectId
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional, the stdlib encoder gives the same output
+    orjson = None
+
+
+def _encode_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(data) -> bytes:
+    """JSON encodes BSON documents (ObjectId, datetime, enums) straight to bytes"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_encode_default)
+    return json.dumps(data, default=_encode_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def model_projection(model: type[BaseModel], exclude: tuple = ()) -> dict:
+    return {field.alias: 1 for field in model.__fields__.values() if field.alias not in exclude}
+
+
+def to_response_document(document: dict) -> dict:
+    """renames `_id` to `id` like the models' to_json, without validating the document"""
+    if '_id' not in document:
+        return document
+    response_document = {'id': document['_id']}
+    response_document.update((key, value) for key, value in document.items() if key != '_id')
+    return response_document
@@ -1,13 +1,19 @@
+import gzip
 import json
 import os
 import unittest
+from datetime import datetime
 
+import requests
 from bson import ObjectId
 from flask_jwt_extended import create_access_token
+from pymongo.errors import BulkWriteError, OperationFailure
 from unittest import mock
 
 from tests.test_data.mock_data import *
-from app import APP
+from app import APP, USER_CACHE, RESPONSE_CACHE
+from comment_services.write_behind import QueueFull
+from config import USERS_COLLECTION, CHAPTERS_COLLECTION_NAME, CHAPTER_REVISIONS_COLLECTION, CHAPTER_STATS_COLLECTION
 
 
 def mock_request_info(mock_data_func):
@@ -35,6 +41,8 @@ class AppTests(unittest.TestCase):
     def setUp(self):
         APP.config['JWT_SECRET_KEY'] = os.environ['JWT_SECRET_KEY_TEST']
         self._client = APP.test_client()
+        USER_CACHE.clear()
+        RESPONSE_CACHE.clear()
 
     @mock.patch('app.DB_CONTROLLER')
     def test_getChapters_success(self, mock_db_controller):
@@ -43,6 +51,71 @@ class AppTests(unittest.TestCase):
         self.assertEqual(200, result.status_code)
         self.assertGreater(len(result.data), 0)
 
+    @mock.patch('app.DB_CONTROLLER')
+    def test_getChapters_pagination_success(self, mock_db_controller):
+        chapters = mock_chapters_data() + [dict(mock_chapter_data(), _id=str(ObjectId()))]
+        mock_db_controller.find.return_value = chapters
+        result = self._client.get('/api/v1/chapters?limit=1')
+        self.assertEqual(200, result.status_code)
+        self.assertEqual(1, len(result.json['chapters']))
+        self.assertNotIn('verses', mock_db_controller.find.call_args.kwargs['projection'])
+        self.assertEqual(2, mock_db_controller.find.call_args.kwargs['limit'])
+
+        mock_db_controller.find.return_value = chapters[1:]
+        result = self._client.get(f'/api/v1/chapters?limit=1&cursor={result.json["next_cursor"]}')
+        self.assertEqual({'_id': {'$gt': chapters[0]['_id']}}, mock_db_controller.find.call_args.args[2])
+        self.assertIsNone(result.json['next_cursor'])
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_getChapters_fields_projection_success(self, mock_db_controller):
+        mock_db_controller.find.return_value = mock_chapters_data()
+        result = self._client.get('/api/v1/chapters?fields=book,verses')
+        self.assertEqual(200, result.status_code)
+        self.assertEqual({'book': 1, 'verses': 1}, mock_db_controller.find.call_args.kwargs['projection'])
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_getChapters_invalid_args_failure(self, mock_db_controller):
+        self.assertEqual(400, self._client.get('/api/v1/chapters?fields=comments').status_code)
+        self.assertEqual(400, self._client.get('/api/v1/chapters?limit=0').status_code)
+        self.assertEqual(400, self._client.get('/api/v1/chapters?cursor=not-a-cursor').status_code)
+        mock_db_controller.find.assert_not_called()
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_streamChapters_gzip_success(self, mock_db_controller):
+        mock_db_controller.find.return_value = iter(mock_chapters_data() * 20)
+        result = self._client.get('/api/v1/chapters/stream?fields=book,verses', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(200, result.status_code)
+        self.assertEqual('gzip', result.headers['Content-Encoding'])
+        self.assertEqual(20, len(json.loads(gzip.decompress(result.data))['chapters']))
+        self.assertEqual(0, mock_db_controller.find.call_args.kwargs.get('limit', 0))
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_searchChapters_success(self, mock_db_controller):
+        mock_db_controller.find.return_value = mock_chapters_data() * 3
+        result = self._client.get('/api/v1/chapters/search?q=אור&tags=a,b&holy_book=1'
+                                  '&min_rating.moral=2&max_rating.moral=4&limit=2&offset=4')
+        self.assertEqual(200, result.status_code)
+        self.assertEqual(2, len(result.json['chapters']))
+        self.assertEqual(6, result.json['next_offset'])
+        self.assertEqual({'$text': {'$search': 'אור'}, 'tags': {'$all': ['a', 'b']}, 'holy_book': 1,
+                          'rating.moral': {'$gte': 2, '$lte': 4}}, mock_db_controller.find.call_args.args[2])
+        self.assertEqual(('score', {'$meta': 'textScore'}), mock_db_controller.find.call_args.kwargs['sort'][0])
+        self.assertEqual(4, mock_db_controller.find.call_args.kwargs['skip'])
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_searchChapters_without_text_index_failure(self, mock_db_controller):
+        mock_db_controller.find.side_effect = OperationFailure('text index required for $text query', 27)
+        result = self._client.get('/api/v1/chapters/search?q=אור')
+        self.assertEqual(503, result.status_code)
+        self.assertIn('text index', result.json['msg'])
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_searchChapters_invalid_args_failure(self, mock_db_controller):
+        self.assertEqual(400, self._client.get('/api/v1/chapters/search?holy_book=9').status_code)
+        self.assertEqual(400, self._client.get('/api/v1/chapters/search?min_rating.moral=high').status_code)
+        self.assertEqual(400, self._client.get('/api/v1/chapters/search?offset=-1').status_code)
+        mock_db_controller.find.assert_not_called()
+
     @mock.patch('app.DB_CONTROLLER')
     def test_getChapter_success(self, mock_db_controller):
         mock_db_controller.find_one.return_value = mock_chapter_data()
@@ -60,7 +133,8 @@ class AppTests(unittest.TestCase):
     def test_updateChapter_success(self, mock_db_controller):
         with APP.app_context():
             headers, data, user = mock_request_info(mock_chapter_data)
-            mock_db_controller.find_one.return_value = user
+            mock_db_controller.find_one.side_effect = lambda db, collection, *args, **kwargs: \
+                user if collection == USERS_COLLECTION else dict(data, _id=ObjectId(), analysis='old analysis')
             update_one_result = mock_db_controller.update_one.return_value
             update_one_result.matched_count = 1
             result = self._client.put(f'/api/v1/chapter/{str(ObjectId())}', headers=headers, data=json.dumps(data),
@@ -72,9 +146,8 @@ class AppTests(unittest.TestCase):
     def test_updateChapter_failure(self, mock_db_controller):
         with APP.app_context():
             headers, data, user = mock_request_info(mock_chapter_data)
-            mock_db_controller.find_one.return_value = user
-            update_one_result = mock_db_controller.update_one.return_value
-            update_one_result.matched_count = 0
+            mock_db_controller.find_one.side_effect = lambda db, collection, *args, **kwargs: \
+                user if collection == USERS_COLLECTION else None
             result = self._client.put(f'/api/v1/chapter/{str(ObjectId())}', headers=headers, data=json.dumps(data),
                                       content_type='application/json',
                                       )
@@ -103,6 +176,37 @@ class AppTests(unittest.TestCase):
                                        )
         self.assertEqual(500, result.status_code)
 
+    @mock.patch('app.DB_CONTROLLER')
+    def test_postChapter_non_finite_rating_failure(self, mock_db_controller):
+        with APP.app_context():
+            _, data, user = mock_request_info(mock_chapter_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.return_value = user
+            for value in ('NaN', 'Infinity', '-Infinity'):
+                body = json.dumps(dict(data, rating={'moral': 0})).replace('"moral": 0', f'"moral": {value}')
+                result = self._client.post('/api/v1/chapter', data=body, content_type='application/json')
+                self.assertEqual(400, result.status_code)
+                result = self._client.patch(f'/api/v1/chapter/{ObjectId()}', data=f'{{"rating": {{"moral": {value}}}}}',
+                                            content_type='application/json')
+                self.assertEqual(400, result.status_code)
+        mock_db_controller.insert_one.assert_not_called()
+        mock_db_controller.update_one.assert_not_called()
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_getComments_success(self, mock_db_controller):
+        comments = [dict(mock_comment_data(), _id=ObjectId(), email='test@gmail.com') for _ in range(3)]
+        mock_db_controller.find.return_value = comments
+        result = self._client.get('/api/v1/comment/63dc389d0bb56cd596d575b9?limit=2')
+        self.assertEqual(200, result.status_code)
+        self.assertEqual(2, len(result.json['comments']))
+        self.assertIsNotNone(result.json['next_cursor'])
+        self.assertEqual({'chapter_id': ObjectId('63dc389d0bb56cd596d575b9')},
+                         mock_db_controller.find.call_args.args[2])
+
+        result = self._client.get(f'/api/v1/comment/63dc389d0bb56cd596d575b9?cursor={result.json["next_cursor"]}')
+        self.assertEqual(200, result.status_code)
+        self.assertEqual(['$or', 'chapter_id'], sorted(mock_db_controller.find.call_args.args[2]))
+
     @mock.patch('app.DB_CONTROLLER')
     def test_postComment_success(self, mock_db_controller):
         with APP.app_context():
@@ -146,6 +250,8 @@ class AppTests(unittest.TestCase):
                                       )
         self.assertEqual(202, result.status_code)
         self.assertTrue('Comment updated successfully' in result.text)
+        self.assertEqual({'_id': ObjectId('63dbfcf7e8b3b669de1065b9'), 'chapter_id': ObjectId('63dc389d0bb56cd596d575b9'),
+                          'name': user['name']}, mock_db_controller.update_one.call_args.args[2])
 
     @mock.patch('app.DB_CONTROLLER')
     def test_putComment_generalFailure(self, mock_db_controller):
@@ -172,7 +278,7 @@ class AppTests(unittest.TestCase):
             mock_db_controller.find_one.return_value = user
             mock_db_controller.find_one.side_effect = [user, mock_chapter_data()]
             update_one_result = mock_db_controller.update_one.return_value
-            update_one_result.modified_count = 0
+            update_one_result.matched_count = 0
             result = self._client.put(f'/api/v1/comment/63dc389d0bb56cd596d575b9/63dbfcf7e8b3b669de1065b9',
                                       headers=headers,
                                       data=json.dumps(data),
@@ -189,7 +295,7 @@ class AppTests(unittest.TestCase):
             mock_db_controller.find_one.return_value = user
             mock_db_controller.find_one.side_effect = [user, mock_chapter_data()]
             update_one_result = mock_db_controller.update_one.return_value
-            update_one_result.modified_count = 0
+            update_one_result.matched_count = 0
             result = self._client.put(f'/api/v1/comment/63dc389d0bb56cd596d575b9/63dd81295f249633483d6e21',
                                       headers=headers,
                                       data=json.dumps(data),
@@ -205,8 +311,8 @@ class AppTests(unittest.TestCase):
             headers, data, user = mock_request_info(mock_comment_data)
             mock_db_controller.find_one.return_value = user
             mock_db_controller.find_one.side_effect = [user, mock_chapter_data()]
-            update_one_result = mock_db_controller.update_one.return_value
-            update_one_result.modified_count = 1
+            delete_one_result = mock_db_controller.delete_one.return_value
+            delete_one_result.deleted_count = 1
             result = self._client.delete(f'/api/v1/comment/63dc389d0bb56cd596d575b9/63dd44a355621619543757c0',
                                          headers=headers,
                                          data=json.dumps(data),
@@ -222,8 +328,8 @@ class AppTests(unittest.TestCase):
             headers, data, user = mock_request_info(mock_comment_data)
             mock_db_controller.find_one.return_value = user
             mock_db_controller.find_one.side_effect = [user, mock_chapter_data()]
-            update_one_result = mock_db_controller.update_one.return_value
-            update_one_result.modified_count = 0
+            delete_one_result = mock_db_controller.delete_one.return_value
+            delete_one_result.deleted_count = 0
             result = self._client.delete(f'/api/v1/comment/63dc389d0bb56cd596d575b9/63dd44a355621619543757c0',
                                          headers=headers,
                                          data=json.dumps(data),
@@ -234,6 +340,402 @@ class AppTests(unittest.TestCase):
             f'deleting comment with comment_id 63dd44a355621619543757c0 and user name {user["name"]} under '
             f'chapter with chapter_id 63dc389d0bb56cd596d575b9 failed' in result.text)
 
+    @mock.patch('app.DB_CONTROLLER')
+    def test_permissionRequired_user_cached_success(self, mock_db_controller):
+        with APP.app_context():
+            _, data, user = mock_request_info(mock_chapter_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.side_effect = lambda db, collection, *args, **kwargs: \
+                user if collection == USERS_COLLECTION else dict(mock_chapter_data(), _id=ObjectId())
+            mock_db_controller.update_one.return_value.matched_count = 1
+            for _ in range(3):
+                result = self._client.put(f'/api/v1/chapter/{str(ObjectId())}', data=json.dumps(data),
+                                          content_type='application/json')
+                self.assertEqual(202, result.status_code)
+        self.assertEqual(1, [call.args[1] for call in mock_db_controller.find_one.call_args_list].count(
+            USERS_COLLECTION))
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_updateUserRole_invalidates_cache_success(self, mock_db_controller):
+        with APP.app_context():
+            _, _, user = mock_request_info(mock_chapter_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.return_value = user
+            mock_db_controller.update_one.return_value.matched_count = 1
+            result = self._client.put(f'/api/v1/user/{user["email"]}/role', data=json.dumps({'role': 'default'}),
+                                      content_type='application/json')
+        self.assertEqual(202, result.status_code)
+        self.assertIsNone(USER_CACHE.get(user['email']))
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_updateUserRole_invalid_role_failure(self, mock_db_controller):
+        with APP.app_context():
+            _, _, user = mock_request_info(mock_chapter_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.return_value = user
+            result = self._client.put(f'/api/v1/user/{user["email"]}/role', data=json.dumps({'role': 'owner'}),
+                                      content_type='application/json')
+        self.assertEqual(400, result.status_code)
+
+    @mock.patch('app.GOOGLE_AUTH')
+    @mock.patch('app.DB_CONTROLLER')
+    def test_login_success(self, mock_db_controller, mock_google_auth):
+        with APP.app_context():
+            _, _, user = mock_request_info(mock_chapter_data)
+        user_info = {key: value for key, value in user.items() if key != 'role'}
+        mock_google_auth.login.return_value = user_info
+        result = self._client.post('/api/v1/google_login', data=json.dumps({'code': 'code'}),
+                                   content_type='application/json')
+        self.assertEqual(200, result.status_code)
+        self.assertEqual(user_info, result.json['user'])
+        self.assertIn('access_token_cookie', result.headers['Set-Cookie'])
+        mock_db_controller.find_one.assert_not_called()
+        (_, _, query, update), kwargs = mock_db_controller.update_one.call_args
+        self.assertEqual({'email': user['email']}, query)
+        self.assertEqual('default', update['$setOnInsert']['role'])
+        self.assertTrue(kwargs['upsert'])
+
+    @mock.patch('app.GOOGLE_AUTH')
+    @mock.patch('app.DB_CONTROLLER')
+    def test_login_google_unavailable_failure(self, mock_db_controller, mock_google_auth):
+        mock_google_auth.login.side_effect = requests.ConnectTimeout()
+        result = self._client.post('/api/v1/google_login', data=json.dumps({'code': 'code'}),
+                                   content_type='application/json')
+        self.assertEqual(502, result.status_code)
+        mock_db_controller.update_one.assert_not_called()
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_getChapter_cached_until_update_success(self, mock_db_controller):
+        chapter_id = str(ObjectId())
+        mock_db_controller.find_one.return_value = mock_chapter_data()
+        for _ in range(3):
+            self.assertEqual(200, self._client.get(f'/api/v1/chapter/{chapter_id}').status_code)
+        self.assertEqual(1, mock_db_controller.find_one.call_count)
+
+        with APP.app_context():
+            _, data, user = mock_request_info(mock_chapter_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.return_value = user
+            mock_db_controller.update_one.return_value.matched_count = 1
+            self._client.put(f'/api/v1/chapter/{chapter_id}', data=json.dumps(data), content_type='application/json')
+
+        mock_db_controller.find_one.return_value = mock_chapter_data()
+        self.assertEqual(200, self._client.get(f'/api/v1/chapter/{chapter_id}').status_code)
+        self.assertEqual(3, mock_db_controller.find_one.call_count)
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_importChapters_partial_success(self, mock_db_controller):
+        chapter = {key: value for key, value in mock_chapter_data().items() if key != '_id'}
+        lines = [json.dumps(chapter), '{not json', json.dumps({'book': 'missing fields'}), '', json.dumps(chapter)]
+        mock_db_controller.insert_many.side_effect = BulkWriteError(
+            {'writeErrors': [{'index': 1, 'code': 11000, 'errmsg': 'duplicate key'}], 'nInserted': 1})
+        with APP.app_context():
+            _, _, user = mock_request_info(mock_chapter_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.return_value = user
+            result = self._client.post('/api/v1/chapters/import', data='\n'.join(lines),
+                                       content_type='application/x-ndjson')
+        self.assertEqual(207, result.status_code)
+        self.assertEqual([1], [inserted['line'] for inserted in result.json['inserted']])
+        self.assertEqual([2, 3, 5], [error['line'] for error in result.json['errors']])
+        self.assertEqual(1, mock_db_controller.insert_many.call_count)
+        self.assertEqual(2, len(mock_db_controller.insert_many.call_args.args[2]))
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_moderateComments_partial_success(self, mock_db_controller):
+        chapter_id, comment_id, other_comment_id = ObjectId(), ObjectId(), ObjectId()
+        comments = [{'chapter_id': str(chapter_id), 'comment_id': str(comment_id)},
+                    {'chapter_id': str(chapter_id), 'comment_id': str(other_comment_id)},
+                    {'chapter_id': 'not an id', 'comment_id': str(comment_id)}]
+        mock_db_controller.find.return_value = [{'_id': comment_id, 'chapter_id': chapter_id}]
+        mock_db_controller.bulk_write.return_value.deleted_count = 1
+        with APP.app_context():
+            _, _, user = mock_request_info(mock_chapter_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.return_value = user
+            result = self._client.delete('/api/v1/comments', data=json.dumps(comments),
+                                         content_type='application/json')
+        self.assertEqual(207, result.status_code)
+        self.assertEqual([0], result.json['deleted'])
+        self.assertEqual([1, 2], [error['index'] for error in result.json['errors']])
+        chapters_update = mock_db_controller.bulk_write.call_args_list[-1].args[2]
+        self.assertEqual({'comment_count': -1, 'version': 1}, chapters_update[0]._doc['$inc'])
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_moderateComments_invalid_body_failure(self, mock_db_controller):
+        with APP.app_context():
+            _, _, user = mock_request_info(mock_chapter_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.return_value = user
+            result = self._client.delete('/api/v1/comments', data=json.dumps({'comment_id': 'x'}),
+                                         content_type='application/json')
+        self.assertEqual(400, result.status_code)
+        mock_db_controller.bulk_write.assert_not_called()
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_postComment_reads_own_writes_from_primary(self, mock_db_controller):
+        chapter_id = str(ObjectId())
+        mock_db_controller.find.return_value = []
+        self._client.get(f'/api/v1/comment/{chapter_id}')
+        self.assertTrue(mock_db_controller.find.call_args.kwargs['secondary_ok'])
+
+        with APP.app_context():
+            _, data, user = mock_request_info(mock_comment_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.return_value = user
+            mock_db_controller.update_one.return_value.matched_count = 1
+            result = self._client.post(f'/api/v1/comment/{chapter_id}', data=json.dumps(data),
+                                       content_type='application/json')
+        self.assertEqual(202, result.status_code)
+        self.assertIn('read_primary=1', result.headers['Set-Cookie'])
+
+        self._client.get(f'/api/v1/comment/{chapter_id}')
+        self.assertFalse(mock_db_controller.find.call_args.kwargs['secondary_ok'])
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_cached_response_is_not_served_to_a_writer(self, mock_db_controller):
+        chapter_id = str(ObjectId())
+        mock_db_controller.find.return_value = []
+        self.assertEqual([], self._client.get(f'/api/v1/comment/{chapter_id}').json['comments'])
+
+        # another client cached a replica read that predates the write, the writer still reads the primary
+        writer = APP.test_client()
+        writer.set_cookie('localhost', 'read_primary', '1')
+        mock_db_controller.find.return_value = [dict(mock_comment_data(), _id=ObjectId(), date_added=datetime.now())]
+        self.assertEqual(1, len(writer.get(f'/api/v1/comment/{chapter_id}').json['comments']))
+        self.assertFalse(mock_db_controller.find.call_args.kwargs['secondary_ok'])
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_getChapter_conditional_not_modified(self, mock_db_controller):
+        chapter = dict(mock_chapter_data(), _id=ObjectId(), version=3, date_updated=datetime(2023, 2, 3, 18, 50, 54))
+        mock_db_controller.find_one.return_value = chapter
+        result = self._client.get(f'/api/v1/chapter/{chapter["_id"]}')
+        self.assertEqual(f'"{chapter["_id"]}-3"', result.headers['ETag'])
+        self.assertEqual('Fri, 03 Feb 2023 18:50:54 GMT', result.headers['Last-Modified'])
+
+        result = self._client.get(f'/api/v1/chapter/{chapter["_id"]}', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(f'"{chapter["_id"]}-3-gzip"', result.headers['ETag'])  # strong, one per encoding
+        result = self._client.get(f'/api/v1/chapter/{chapter["_id"]}',
+                                  headers={'Accept-Encoding': 'gzip', 'If-None-Match': result.headers['ETag']})
+        self.assertEqual((304, f'"{chapter["_id"]}-3-gzip"'), (result.status_code, result.headers['ETag']))
+        self.assertEqual(1, mock_db_controller.find_one.call_count)  # served from the cache
+
+        RESPONSE_CACHE.clear()
+        result = self._client.get(f'/api/v1/chapter/{chapter["_id"]}',
+                                  headers={'If-Modified-Since': 'Fri, 03 Feb 2023 18:50:54 GMT'})
+        self.assertEqual(304, result.status_code)
+        self.assertEqual({'version': 1, 'date_updated': 1}, mock_db_controller.find_one.call_args.kwargs['projection'])
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_updateChapter_if_match_failure(self, mock_db_controller):
+        chapter_id = str(ObjectId())
+        with APP.app_context():
+            _, data, user = mock_request_info(mock_chapter_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            # the chapter exists, but not in the version If-Match names
+            mock_db_controller.find_one.side_effect = lambda db, collection, query, **kwargs: \
+                user if collection == USERS_COLLECTION else None if 'version' in query else {'_id': chapter_id}
+            result = self._client.put(f'/api/v1/chapter/{chapter_id}', data=json.dumps(data),
+                                      content_type='application/json', headers={'If-Match': f'"{chapter_id}-2"'})
+            self.assertEqual(412, result.status_code)
+            self.assertIn({'$in': [2]}, [call.args[2].get('version')
+                                         for call in mock_db_controller.find_one.call_args_list])
+
+            result = self._client.put(f'/api/v1/chapter/{chapter_id}', data=json.dumps(data),
+                                      content_type='application/json', headers={'If-Match': f'"{chapter_id}-3-br"'})
+            self.assertEqual(412, result.status_code)
+            self.assertIn({'$in': [3]}, [call.args[2].get('version')
+                                         for call in mock_db_controller.find_one.call_args_list])
+
+            for if_match in ('"other-2"', f'W/"{chapter_id}-2"'):  # a weak ETag never matches If-Match
+                mock_db_controller.find_one.reset_mock()
+                result = self._client.put(f'/api/v1/chapter/{chapter_id}', data=json.dumps(data),
+                                          content_type='application/json', headers={'If-Match': if_match})
+                self.assertEqual(412, result.status_code)
+                self.assertNotIn(CHAPTERS_COLLECTION_NAME, [call.args[1]
+                                                            for call in mock_db_controller.find_one.call_args_list])
+            mock_db_controller.update_one.assert_not_called()
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_patchChapter_success(self, mock_db_controller):
+        chapter = dict(mock_chapter_data(), _id=ObjectId(), version=4)
+        with APP.app_context():
+            _, _, user = mock_request_info(mock_chapter_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.side_effect = lambda db, collection, *args, **kwargs: \
+                user if collection == USERS_COLLECTION else chapter
+            mock_db_controller.update_one.return_value.matched_count = 1
+            analysis = chapter['analysis'].replace('Lorem', 'Dolor', 1)
+            result = self._client.patch(f'/api/v1/chapter/{chapter["_id"]}',
+                                        data=json.dumps({'analysis': analysis, 'book': chapter['book']}),
+                                        content_type='application/json')
+        self.assertEqual(202, result.status_code)
+        (_, _, query, update), _ = mock_db_controller.update_one.call_args
+        self.assertEqual({'_id': chapter['_id'], 'version': 4}, query)
+        self.assertEqual(['analysis', 'date_updated', 'revision'], sorted(update['$set']))
+        self.assertEqual(4, update['$set']['revision'])
+        (_, collection, revision), _ = mock_db_controller.insert_one.call_args
+        self.assertEqual(CHAPTER_REVISIONS_COLLECTION, collection)
+        self.assertEqual((4, ['analysis'], user['email']),
+                         (revision['version'], revision['fields'], revision['editor']))
+        self.assertEqual([[0, 1, 'Lorem']], revision['delta']['analysis']['ops'])
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_patchChapter_invalid_failure(self, mock_db_controller):
+        with APP.app_context():
+            _, _, user = mock_request_info(mock_chapter_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.return_value = user
+            for body in ({}, {'analysis': 'text', 'unknown': 1}, {'chapter_number': 'one'}):
+                result = self._client.patch(f'/api/v1/chapter/{ObjectId()}', data=json.dumps(body),
+                                            content_type='application/json')
+                self.assertEqual(400, result.status_code)
+        mock_db_controller.update_one.assert_not_called()
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_patchChapter_concurrent_edit_failure(self, mock_db_controller):
+        chapter = dict(mock_chapter_data(), _id=ObjectId(), version=1)
+        with APP.app_context():
+            _, _, user = mock_request_info(mock_chapter_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.side_effect = lambda db, collection, *args, **kwargs: \
+                user if collection == USERS_COLLECTION else chapter
+            mock_db_controller.update_one.return_value.matched_count = 0
+            result = self._client.patch(f'/api/v1/chapter/{chapter["_id"]}', data=json.dumps({'tags': ['new']}),
+                                        content_type='application/json')
+        self.assertEqual(409, result.status_code)
+        self.assertEqual(3, mock_db_controller.update_one.call_count)
+        # the revision of every lost attempt is removed again
+        self.assertEqual(3, mock_db_controller.insert_one.call_count)
+        self.assertEqual([{'_id': mock_db_controller.insert_one.return_value}] * 3,
+                         [call.args[2] for call in mock_db_controller.delete_one.call_args_list])
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_getChapterRevisions_success(self, mock_db_controller):
+        chapter_id = ObjectId()
+        mock_db_controller.find.return_value = [{'_id': ObjectId(), 'version': version, 'fields': ['analysis']}
+                                                for version in range(3)]
+        result = self._client.get(f'/api/v1/chapter/{chapter_id}/revisions?limit=2')
+        self.assertEqual(200, result.status_code)
+        self.assertEqual([0, 1], [revision['version'] for revision in result.json['revisions']])
+        self.assertIsNotNone(result.json['next_cursor'])
+        self.assertEqual({'chapter_id': chapter_id}, mock_db_controller.find.call_args.args[2])
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_getChapterDiff_success(self, mock_db_controller):
+        chapter = dict(mock_chapter_data(), _id=ObjectId(), version=2, tags=['b'], chapter_number=3)
+        mock_db_controller.find_one.return_value = chapter
+        mock_db_controller.find.return_value = [{'version': 1, 'delta': {'tags': {'value': ['a']}}},
+                                                {'version': 0, 'delta': {'chapter_number': {'value': 1}}}]
+        result = self._client.get(f'/api/v1/chapter/{chapter["_id"]}/diff?from=0&to=2')
+        self.assertEqual(200, result.status_code)
+        self.assertEqual({'chapter_number': {'from': 1, 'to': 3}, 'tags': {'from': ['a'], 'to': ['b']}},
+                         result.json['changes'])
+
+        result = self._client.get(f'/api/v1/chapter/{chapter["_id"]}/diff?from=1&to=2')
+        self.assertEqual({'tags': {'from': ['a'], 'to': ['b']}}, result.json['changes'])
+
+        self.assertEqual(400, self._client.get(f'/api/v1/chapter/{chapter["_id"]}/diff?from=0&to=3').status_code)
+        self.assertEqual(400, self._client.get(f'/api/v1/chapter/{chapter["_id"]}/diff?from=a&to=1').status_code)
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_getChapterDiff_missing_revision_failure(self, mock_db_controller):
+        chapter = dict(mock_chapter_data(), _id=ObjectId(), version=3, revision=2, tags=['c'])
+        mock_db_controller.find_one.return_value = chapter
+        mock_db_controller.find.return_value = [{'version': 2, 'previous': 1, 'delta': {'tags': {'value': ['b']}}},
+                                                {'version': 0, 'delta': {'tags': {'value': ['a']}}}]
+        result = self._client.get(f'/api/v1/chapter/{chapter["_id"]}/diff?from=0&to=3')
+        self.assertEqual(500, result.status_code)
+        self.assertIn('revision 1 is missing', result.json['msg'])
+        self.assertEqual(200, self._client.get(f'/api/v1/chapter/{chapter["_id"]}/diff?from=2&to=3').status_code)
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_getStats_success(self, mock_db_controller):
+        rollup = {'_id': 'book:Genesis', 'dimension': 'book', 'key': 'Genesis', 'chapters': 2, 'comments': 5,
+                  'rating': {'moral': {'count': 2, 'sum': 7, 'histogram': {'3': 1, '4': 1}},
+                             'removed': {'count': 0, 'sum': 0, 'histogram': {'3': 0}}}}
+        mock_db_controller.find.return_value = [rollup]
+        mock_db_controller.find_one.return_value = rollup
+        expected = {'dimension': 'book', 'key': 'Genesis', 'chapters': 2, 'comments': 5,
+                    'rating': {'moral': {'count': 2, 'average': 3.5, 'histogram': {'3': 1, '4': 1}}}}
+
+        result = self._client.get('/api/v1/stats/book')
+        self.assertEqual(200, result.status_code)
+        self.assertEqual({'stats': [expected]}, result.json)
+        self.assertEqual({'dimension': 'book', 'chapters': {'$gt': 0}}, mock_db_controller.find.call_args.args[2])
+
+        result = self._client.get('/api/v1/stats/book/Genesis')
+        self.assertEqual(200, result.status_code)
+        self.assertEqual(expected, result.json)
+        self.assertEqual((CHAPTER_STATS_COLLECTION, {'_id': 'book:Genesis'}),
+                         mock_db_controller.find_one.call_args.args[1:3])
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_getStats_failure(self, mock_db_controller):
+        mock_db_controller.find_one.return_value = None
+        self.assertEqual(404, self._client.get('/api/v1/stats/author').status_code)
+        self.assertEqual(404, self._client.get('/api/v1/stats/author/someone').status_code)
+        self.assertEqual(404, self._client.get('/api/v1/stats/tag/unknown').status_code)
+        mock_db_controller.find.assert_not_called()
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_postComment_updates_stats(self, mock_db_controller):
+        chapter_id = ObjectId()
+        with APP.app_context():
+            _, data, user = mock_request_info(mock_comment_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.return_value = user
+            mock_db_controller.update_one.return_value.matched_count = 1
+            mock_db_controller.find.return_value = [{'_id': chapter_id, 'book': 'Genesis', 'holy_book': 1,
+                                                     'tags': ['creation']}]
+            result = self._client.post(f'/api/v1/comment/{chapter_id}', data=json.dumps(data),
+                                       content_type='application/json')
+        self.assertEqual(202, result.status_code)
+        db_name, collection, requests, *_ = mock_db_controller.bulk_write.call_args.args
+        self.assertEqual(CHAPTER_STATS_COLLECTION, collection)
+        self.assertEqual({'book:Genesis', 'holy_book:1', 'tag:creation'},
+                         {request._filter['_id'] for request in requests})
+        self.assertEqual({'$inc': {'comments': 1}, '$set': {'dimension': 'book', 'key': 'Genesis'}},
+                         requests[0]._doc)
+
+    @mock.patch('app.COMMENT_WRITER')
+    @mock.patch('app.DB_CONTROLLER')
+    def test_postComment_write_behind(self, mock_db_controller, mock_comment_writer):
+        chapter_id = ObjectId()
+        with APP.app_context():
+            _, data, user = mock_request_info(mock_comment_data)
+            self._client.set_cookie('localhost', 'access_token_cookie', create_access_token(user['email']))
+            mock_db_controller.find_one.return_value = user
+            result = self._client.post(f'/api/v1/comment/{chapter_id}', data=json.dumps(data),
+                                       content_type='application/json')
+            self.assertEqual(202, result.status_code)
+            comment = mock_comment_writer.insert.call_args.args[0]
+            self.assertEqual((result.json['_id'], chapter_id), (str(comment['_id']), comment['chapter_id']))
+            mock_db_controller.update_one.assert_not_called()
+            mock_db_controller.insert_one.assert_not_called()
+
+            mock_comment_writer.delete.side_effect = QueueFull('full')
+            result = self._client.delete(f'/api/v1/comment/{chapter_id}/{ObjectId()}')
+        self.assertEqual(503, result.status_code)
+        self.assertEqual('1', result.headers['Retry-After'])
+        mock_db_controller.delete_one.assert_not_called()
+
+    @mock.patch('app.DB_CONTROLLER')
+    def test_metrics_success(self, mock_db_controller):
+        mock_db_controller.find_one.return_value = mock_chapter_data()
+        mock_db_controller.pool_statistics.return_value = {'pools': {'localhost:27017': {
+            'open': 2, 'in_use': 1, 'check_outs': 10, 'check_out_failures': 0, 'wait_ms_total': 5.0}}}
+        self._client.get(f'/api/v1/chapter/{ObjectId()}')
+        result = self._client.get('/metrics')
+        self.assertEqual(200, result.status_code)
+        metrics = result.data.decode()
+        pid = os.getpid()
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/api/v1/chapter/<string:chapter_id>",'
+                      f'status="200",pid="{pid}"}}', metrics)
+        self.assertIn(f'cache_requests_total{{cache="response",result="miss",pid="{pid}"}}', metrics)
+        self.assertIn('mongo_pool_connections{client="primary",address="localhost:27017",state="in_use",'
+                      f'pid="{pid}"}} 1', metrics)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,159 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import PyMongoError
+from starlette.testclient import TestClient
+
+import asgi_app
+from config import DB_NAME, USERS_COLLECTION, CHAPTERS_COLLECTION_NAME, CHAPTER_REVISIONS_COLLECTION
+from db_services.async_db_controller import AsyncDbController
+from db_services.motor_service import MotorService
+from tests.test_data.mock_data import *
+
+USER = {
+    'name': 'test user',
+    'given_name': 'test',
+    'family_name': 'user',
+    'role': 'admin',
+    'picture': 'https://www.shutterstock.com/image-vector/man-icon-vector-260nw-1040084344.jpg',
+    'email': 'test@gmail.com',
+}
+
+
+class AsgiAppTests(unittest.TestCase):
+    def setUp(self):
+        self.mongo_client = AsyncMongoMockClient()
+        self.db_controller = AsyncDbController(MotorService(self.mongo_client))
+        self.response_cache = mock.MagicMock()
+        for name, value in (('DB_CONTROLLER', self.db_controller), ('RESPONSE_CACHE', self.response_cache),
+                            ('STATS_DB_CONTROLLER', mock.MagicMock())):
+            patcher = mock.patch(f'asgi_app.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        asgi_app.USER_CACHE.clear()
+        self._client = TestClient(asgi_app.APP)
+
+        chapter = mock_chapter_data()
+        chapter.pop('comments')
+        self.chapter_id = ObjectId(chapter['_id'])
+        database = self.mongo_client[DB_NAME]
+        asyncio.run(database[CHAPTERS_COLLECTION_NAME].insert_one(dict(chapter, _id=self.chapter_id)))
+        asyncio.run(database[USERS_COLLECTION].insert_one(dict(USER)))
+
+    def login(self):
+        self._client.cookies.set(asgi_app.JWT_COOKIE_NAME, asgi_app.create_access_token(USER['email']))
+
+    def test_getChapters_success(self):
+        result = self._client.get('/api/v1/chapters')
+        self.assertEqual(200, result.status_code)
+        self.assertEqual([str(self.chapter_id)], [chapter['id'] for chapter in result.json()['chapters']])
+        self.assertNotIn('verses', result.json()['chapters'][0])
+
+    def test_getChapter_success(self):
+        result = self._client.get(f'/api/v1/chapter/{self.chapter_id}')
+        self.assertEqual(200, result.status_code)
+        self.assertEqual('בראשית', result.json()['book'])
+
+    def test_getChapter_failure(self):
+        result = self._client.get(f'/api/v1/chapter/{ObjectId()}')
+        self.assertEqual(404, result.status_code)
+
+    def test_updateChapter_unauthenticated_failure(self):
+        result = self._client.put(f'/api/v1/chapter/{self.chapter_id}', json=mock_chapter_data())
+        self.assertEqual(401, result.status_code)
+
+    def test_updateChapter_success(self):
+        self.login()
+        result = self._client.put(f'/api/v1/chapter/{self.chapter_id}', json=dict(mock_chapter_data(), book='שמות'))
+        self.assertEqual(202, result.status_code)
+        self.assertEqual('שמות', self._client.get(f'/api/v1/chapter/{self.chapter_id}').json()['book'])
+
+    def test_patchChapter_records_revision_success(self):
+        self.login()
+        result = self._client.patch(f'/api/v1/chapter/{self.chapter_id}', json={'tags': ['patched']})
+        self.assertEqual(202, result.status_code)
+        self.assertEqual(['patched'], self._client.get(f'/api/v1/chapter/{self.chapter_id}').json()['tags'])
+
+        revisions = asyncio.run(self.mongo_client[DB_NAME][CHAPTER_REVISIONS_COLLECTION].find({}).to_list(None))
+        self.assertEqual([(self.chapter_id, 0, {'tags': {'value': mock_chapter_data()['tags']}})],
+                         [(revision['chapter_id'], revision['version'], revision['delta']) for revision in revisions])
+
+    def test_patchChapter_if_match(self):
+        self.login()
+        result = self._client.patch(f'/api/v1/chapter/{self.chapter_id}', json={'tags': ['patched']},
+                                    headers={'If-Match': f'"{self.chapter_id}-0"'})
+        self.assertEqual(202, result.status_code)
+
+        result = self._client.patch(f'/api/v1/chapter/{self.chapter_id}', json={'tags': ['stale']},
+                                    headers={'If-Match': f'"{self.chapter_id}-0"'})
+        self.assertEqual(412, result.status_code)
+        result = self._client.put(f'/api/v1/chapter/{self.chapter_id}', json=mock_chapter_data(),
+                                  headers={'If-Match': f'"{ObjectId()}-1"'})
+        self.assertEqual(412, result.status_code)
+        self.assertEqual(['patched'], self._client.get(f'/api/v1/chapter/{self.chapter_id}').json()['tags'])
+
+    def test_comment_lifecycle_success(self):
+        self.login()
+        result = self._client.post(f'/api/v1/comment/{self.chapter_id}', json={'content': 'first'})
+        self.assertEqual(202, result.status_code)
+        comment_id = result.json()['_id']
+
+        result = self._client.put(f'/api/v1/comment/{self.chapter_id}/{comment_id}', json={'content': 'edited'})
+        self.assertEqual(202, result.status_code)
+
+        comments = self._client.get(f'/api/v1/comment/{self.chapter_id}').json()['comments']
+        self.assertEqual(['edited'], [comment['content'] for comment in comments])
+        self.assertEqual(1, self._client.get(f'/api/v1/chapter/{self.chapter_id}').json()['comment_count'])
+
+        result = self._client.delete(f'/api/v1/comment/{self.chapter_id}/{comment_id}')
+        self.assertEqual(202, result.status_code)
+        self.assertEqual([], self._client.get(f'/api/v1/comment/{self.chapter_id}').json()['comments'])
+
+    def test_writes_bump_the_response_cache(self):
+        self.login()
+        self._client.patch(f'/api/v1/chapter/{self.chapter_id}', json={'tags': ['patched']})
+        self._client.post(f'/api/v1/comment/{self.chapter_id}', json={'content': 'first'})
+
+        bumped = {namespace for call in self.response_cache.bump.call_args_list for namespace in call.args}
+        self.assertEqual({f'chapter:{self.chapter_id}', f'comments:{self.chapter_id}', 'chapters', 'stats'}, bumped)
+
+    def test_postComment_rolls_back_the_comment_count_failure(self):
+        self.login()
+        with mock.patch.object(self.db_controller, 'insert_one', mock.AsyncMock(side_effect=PyMongoError())):
+            result = self._client.post(f'/api/v1/comment/{self.chapter_id}', json={'content': 'first'})
+
+        self.assertEqual(500, result.status_code)
+        self.assertEqual(0, self._client.get(f'/api/v1/chapter/{self.chapter_id}').json().get('comment_count', 0))
+        self.response_cache.bump.assert_not_called()
+
+    def test_postComment_failure(self):
+        self.login()
+        result = self._client.post(f'/api/v1/comment/{ObjectId()}', json={'content': 'first'})
+        self.assertEqual(404, result.status_code)
+
+
+    @mock.patch('asgi_app.GOOGLE_AUTH')
+    def test_login_upserts_user_success(self, mock_google_auth):
+        new_user = dict(USER, email='new@gmail.com', role='default')
+        for user_info in (USER, new_user):
+            mock_google_auth.login.return_value = {key: value for key, value in user_info.items() if key != 'role'}
+            result = self._client.post('/api/v1/google_login', json={'code': 'code'})
+            self.assertEqual(200, result.status_code)
+            self.assertIn(asgi_app.JWT_COOKIE_NAME, result.cookies)
+
+        users = asyncio.run(self.mongo_client[DB_NAME][USERS_COLLECTION].find({}).to_list(None))
+        self.assertEqual({'test@gmail.com': 'admin', 'new@gmail.com': 'default'},
+                         {user['email']: user['role'] for user in users})
+
+    @mock.patch('asgi_app.GOOGLE_AUTH')
+    def test_login_rejected_code_failure(self, mock_google_auth):
+        mock_google_auth.login.side_effect = asgi_app.GoogleAuthError('invalid_grant')
+        result = self._client.post('/api/v1/google_login', json={'code': 'code'})
+        self.assertEqual(401, result.status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from unittest import mock
+
+import mongomock
+
+from app import CACHE
+from benchmarks import load_test, micro_benchmark
+from config import DB_NAME, CHAPTERS_COLLECTION_NAME
+
+
+class BenchmarksTests(unittest.TestCase):
+    def tearDown(self):
+        CACHE.clear()
+
+    @mock.patch('app_utils.DB_NAME', DB_NAME)
+    @mock.patch('app.DB_NAME', DB_NAME)
+    @mock.patch('app.DB_CONTROLLER')
+    def test_load_test_runs_every_operation_without_errors(self, _):
+        report = load_test.run(load_test.parse_args(['--chapters', '3', '--comments', '2', '--concurrency', '2',
+                                                     '--requests', '200']))
+        self.assertEqual(report['total']['count'], 200)
+        self.assertEqual(report['total']['errors'], 0)
+        self.assertEqual(set(report['routes']), set(load_test.OPERATIONS))
+        for route in report['routes'].values():
+            self.assertLessEqual(route['p50_ms'], route['p95_ms'])
+            self.assertLessEqual(route['p95_ms'], route['p99_ms'])
+
+    @mock.patch('app_utils.DB_NAME', DB_NAME)
+    @mock.patch('app.DB_NAME', DB_NAME)
+    @mock.patch('app.DB_CONTROLLER')
+    def test_load_test_runs_on_the_memory_backend(self, _):
+        report = load_test.run(load_test.parse_args(['--backend', 'memory', '--chapters', '3', '--comments', '2',
+                                                     '--requests', '200']))
+        self.assertEqual(report['total']['errors'], 0)
+        self.assertEqual(set(report['routes']), set(load_test.OPERATIONS))
+
+    def test_load_test_base_url_needs_mongo_backend(self):
+        with self.assertRaises(SystemExit):
+            load_test.parse_args(['--base-url', 'http://localhost:5000'])
+
+    def test_load_test_keeps_existing_documents_without_drop(self):
+        client = mongomock.MongoClient()
+        client[load_test.BENCHMARK_DB_NAME][CHAPTERS_COLLECTION_NAME].insert_one({'book': 'Genesis'})
+
+        with self.assertRaises(SystemExit):
+            load_test.mongodb_service(client, load_test.BENCHMARK_DB_NAME)
+        self.assertEqual(1, client[load_test.BENCHMARK_DB_NAME][CHAPTERS_COLLECTION_NAME].count_documents({}))
+
+        load_test.mongodb_service(client, load_test.BENCHMARK_DB_NAME, drop=True)
+        self.assertEqual(0, client[load_test.BENCHMARK_DB_NAME][CHAPTERS_COLLECTION_NAME].count_documents({}))
+
+    def test_load_test_defaults_to_its_own_database(self):
+        self.assertNotEqual(DB_NAME, load_test.parse_args([]).db_name)
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(load_test.percentile(values, 50), 50)
+        self.assertEqual(load_test.percentile(values, 99), 99)
+        self.assertEqual(load_test.percentile([7], 95), 7)
+
+    def test_micro_benchmark_reports_every_case(self):
+        report = micro_benchmark.run(1)
+        self.assertIn('get_collection_cached', report)
+        self.assertTrue(all(case['us_per_call'] > 0 for case in report.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
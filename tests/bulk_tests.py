@@ -0,0 +1,58 @@
+import unittest
+from unittest import mock
+
+import mongomock
+from bson import ObjectId
+
+from config import DB_NAME, CHAPTERS_COLLECTION_NAME, COMMENTS_COLLECTION_NAME
+from db_services.bulk import delete_comments
+from db_services.db_controller import DbController
+from db_services.mongodb_service import MongodbService
+
+
+class BulkTests(unittest.TestCase):
+    def setUp(self):
+        self.client = mongomock.MongoClient()
+        for collection_name in (CHAPTERS_COLLECTION_NAME, COMMENTS_COLLECTION_NAME):
+            self.client[DB_NAME].create_collection(collection_name)
+        self.db_controller = DbController(MongodbService(self.client))
+        self.chapter_id = ObjectId()
+        self.comment_ids = [ObjectId() for _ in range(3)]
+        self.client[DB_NAME][CHAPTERS_COLLECTION_NAME].insert_one({'_id': self.chapter_id, 'comment_count': 3})
+        self.client[DB_NAME][COMMENTS_COLLECTION_NAME].insert_many(
+            [{'_id': comment_id, 'chapter_id': self.chapter_id} for comment_id in self.comment_ids])
+
+    def comment_count(self) -> int:
+        return self.client[DB_NAME][CHAPTERS_COLLECTION_NAME].find_one({'_id': self.chapter_id})['comment_count']
+
+    def test_delete_comments(self):
+        deleted, errors, removed = delete_comments(
+            self.db_controller, DB_NAME, [(index, self.chapter_id, comment_id)
+                                          for index, comment_id in enumerate(self.comment_ids[:2])] +
+                                         [(2, ObjectId(), self.comment_ids[2])])
+
+        self.assertEqual([0, 1], [key for key, _ in deleted])
+        self.assertEqual([2], [key for key, _ in errors])
+        self.assertEqual({self.chapter_id: 2}, removed)
+        self.assertEqual(1, self.comment_count())
+
+    def test_comment_deleted_concurrently_is_not_counted(self):
+        find = self.db_controller.find
+
+        def find_then_delete(*args, **kwargs):
+            documents = list(find(*args, **kwargs))
+            self.client[DB_NAME][COMMENTS_COLLECTION_NAME].delete_one({'_id': self.comment_ids[0]})
+            return documents
+
+        with mock.patch.object(self.db_controller, 'find', side_effect=find_then_delete):
+            deleted, errors, removed = delete_comments(self.db_controller, DB_NAME,
+                                                       [(index, self.chapter_id, comment_id)
+                                                        for index, comment_id in enumerate(self.comment_ids)])
+
+        self.assertEqual(([0, 1, 2], []), ([key for key, _ in deleted], errors))
+        self.assertEqual({self.chapter_id: 2}, removed)
+        self.assertEqual(1, self.comment_count())  # the concurrent delete decrements its own comment
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from db_services.client_factory import LazyMongoClient, PoolStatistics
+
+ADDRESS = ('localhost', 27017)
+
+
+class LazyMongoClientTests(unittest.TestCase):
+    @mock.patch('db_services.client_factory.MongoClient')
+    def test_client_created_on_first_use_success(self, mock_mongo_client):
+        client = LazyMongoClient('mongodb://localhost:27017/', maxPoolSize=10)
+        mock_mongo_client.assert_not_called()
+
+        client['db'], client['db']
+        mock_mongo_client.assert_called_once_with('mongodb://localhost:27017/',
+                                                  event_listeners=[client.pool_statistics], maxPoolSize=10)
+
+    @mock.patch('db_services.client_factory.os.getpid')
+    @mock.patch('db_services.client_factory.MongoClient')
+    def test_client_recreated_after_fork_success(self, mock_mongo_client, mock_getpid):
+        client = LazyMongoClient('mongodb://localhost:27017/')
+        mock_getpid.return_value = 1
+        client.list_database_names()
+        mock_getpid.return_value = 2
+        client.list_database_names()
+        self.assertEqual(2, mock_mongo_client.call_count)
+        self.assertEqual(2, client.statistics()['pid'])
+
+
+class PoolStatisticsTests(unittest.TestCase):
+    def test_check_outs_counted_success(self):
+        statistics = PoolStatistics()
+        event = SimpleNamespace(address=ADDRESS)
+        statistics.pool_created(event)
+        statistics.connection_created(event)
+        statistics.connection_check_out_started(event)
+        statistics.connection_checked_out(event)
+        statistics.connection_check_out_started(event)
+        statistics.connection_check_out_failed(event)
+
+        pool = statistics.snapshot()['localhost:27017']
+        self.assertEqual(1, pool['open'])
+        self.assertEqual(1, pool['in_use'])
+        self.assertEqual(1, pool['check_outs'])
+        self.assertEqual(1, pool['check_out_failures'])
+        self.assertGreaterEqual(pool['wait_ms_max'], 0)
+
+        statistics.connection_checked_in(event)
+        statistics.connection_closed(event)
+        self.assertEqual(0, statistics.snapshot()['localhost:27017']['open'])
+
+
+if __name__ == '__main__':
+    unittest.main()
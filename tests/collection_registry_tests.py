@@ -0,0 +1,94 @@
+import unittest
+from unittest.mock import MagicMock
+
+import mongomock
+
+from db_services.collection_registry import CollectionRegistry
+from db_services.mongodb_service import MongodbService
+
+DB_EXIST_NAME = "db_exist"
+COLLECTION_NAME_EXIST = "collection_exist"
+COLLECTION_DOES_NOT_EXIST = "collection_does_not_exist"
+
+
+class CollectionRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.list_database_names.return_value = [DB_EXIST_NAME]
+        self.client[DB_EXIST_NAME].list_collection_names.return_value = [COLLECTION_NAME_EXIST]
+
+    def test_get_collection_lists_names_once(self):
+        db_service = MongodbService(self.client, CollectionRegistry(self.client))
+        for _ in range(5):
+            db_service.find_one(DB_EXIST_NAME, COLLECTION_NAME_EXIST, {})
+            db_service.insert_one(DB_EXIST_NAME, COLLECTION_NAME_EXIST, {})
+        self.assertEqual(self.client.list_database_names.call_count, 1)
+        self.assertEqual(self.client[DB_EXIST_NAME].list_collection_names.call_count, 1)
+
+    def test_get_collection_miss_refreshes(self):
+        registry = CollectionRegistry(self.client, miss_refresh_interval=0)
+        registry.validate()
+        self.client[DB_EXIST_NAME].list_collection_names.return_value = [COLLECTION_NAME_EXIST,
+                                                                         COLLECTION_DOES_NOT_EXIST]
+        registry.get_collection(DB_EXIST_NAME, COLLECTION_DOES_NOT_EXIST)
+        self.assertEqual(self.client.list_database_names.call_count, 2)
+
+    def test_get_collection_miss_refresh_is_throttled(self):
+        registry = CollectionRegistry(self.client, miss_refresh_interval=60)
+        registry.validate()
+        for _ in range(3):
+            with self.assertRaises(KeyError):
+                registry.get_collection(DB_EXIST_NAME, COLLECTION_DOES_NOT_EXIST)
+        self.assertEqual(self.client.list_database_names.call_count, 1)
+
+    def test_reset_after_fork_clears_handles(self):
+        registry = CollectionRegistry(self.client)
+        registry.get_collection(DB_EXIST_NAME, COLLECTION_NAME_EXIST)
+
+        registry.reset_after_fork()
+        registry.get_collection(DB_EXIST_NAME, COLLECTION_NAME_EXIST)
+        self.assertEqual(2, self.client.list_database_names.call_count)
+
+    def test_validate_strict_missing_required_failure(self):
+        registry = CollectionRegistry(self.client, required={DB_EXIST_NAME: [COLLECTION_DOES_NOT_EXIST]})
+        with self.assertRaisesRegex(KeyError,
+                                    f"collection: {COLLECTION_DOES_NOT_EXIST} does not exist under database: "
+                                    f"{DB_EXIST_NAME}"):
+            registry.validate()
+
+    def test_validate_lenient_missing_required_success(self):
+        registry = CollectionRegistry(self.client, strict=False, required={DB_EXIST_NAME: [COLLECTION_DOES_NOT_EXIST]})
+        with self.assertLogs('db_services.collection_registry', level='WARNING'):
+            registry.validate()
+        self.assertIsNotNone(registry.get_collection(DB_EXIST_NAME, COLLECTION_DOES_NOT_EXIST))
+
+    def test_validate_strict_failure_is_not_remembered(self):
+        registry = CollectionRegistry(self.client, required={DB_EXIST_NAME: [COLLECTION_DOES_NOT_EXIST]})
+        for _ in range(2):
+            with self.assertRaises(KeyError):
+                registry.get_collection(DB_EXIST_NAME, COLLECTION_NAME_EXIST)
+
+        self.client[DB_EXIST_NAME].list_collection_names.return_value = [COLLECTION_NAME_EXIST,
+                                                                         COLLECTION_DOES_NOT_EXIST]
+        self.assertIsNotNone(registry.get_collection(DB_EXIST_NAME, COLLECTION_NAME_EXIST))
+
+    def test_validate_creates_missing_owned_collections(self):
+        client = mongomock.MongoClient()
+        client[DB_EXIST_NAME].create_collection(COLLECTION_NAME_EXIST)
+        registry = CollectionRegistry(client, required={DB_EXIST_NAME: [COLLECTION_NAME_EXIST]},
+                                      owned={DB_EXIST_NAME: [COLLECTION_DOES_NOT_EXIST]})
+        registry.validate()
+
+        self.assertIn(COLLECTION_DOES_NOT_EXIST, client[DB_EXIST_NAME].list_collection_names())
+        self.assertIsNotNone(registry.get_collection(DB_EXIST_NAME, COLLECTION_DOES_NOT_EXIST))
+
+    def test_clear_forgets_handles(self):
+        registry = CollectionRegistry(self.client)
+        registry.get_collection(DB_EXIST_NAME, COLLECTION_NAME_EXIST)
+        registry.clear()
+        registry.get_collection(DB_EXIST_NAME, COLLECTION_NAME_EXIST)
+        self.assertEqual(self.client.list_database_names.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
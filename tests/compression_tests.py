@@ -0,0 +1,88 @@
+import gzip
+import json
+import unittest
+import zlib
+from unittest import mock
+
+import brotli
+from flask import Flask, jsonify, request
+
+from http_services.compression import Compression
+
+PAYLOAD = {'verses': ['Lorem Ipsum is simply dummy text of the printing and typesetting industry.'] * 50}
+
+
+def create_app(compression: Compression):
+    app = Flask(__name__)
+    compression.init_app(app)
+
+    @app.route('/large')
+    def get_large():
+        response = jsonify(PAYLOAD)
+        response.set_etag('large-1')
+        return response.make_conditional(request)
+
+    @app.route('/small')
+    def get_small():
+        return jsonify({'msg': 'small'})
+
+    @app.route('/stream')
+    def get_stream():
+        return app.response_class((json.dumps(PAYLOAD)[i:i + 100] for i in range(0, len(json.dumps(PAYLOAD)), 100)),
+                                  mimetype='application/json')
+
+    return app
+
+
+class CompressionTests(unittest.TestCase):
+    def setUp(self):
+        self.compression = Compression(min_size=500)
+        self.client = create_app(self.compression).test_client()
+
+    def test_gzip_negotiated(self):
+        result = self.client.get('/large', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual('gzip', result.headers['Content-Encoding'])
+        self.assertEqual(PAYLOAD, json.loads(gzip.decompress(result.data)))
+        self.assertIn('Accept-Encoding', result.headers['Vary'])
+        self.assertEqual('"large-1-gzip"', result.headers['ETag'])
+
+    def test_brotli_preferred(self):
+        result = self.client.get('/large', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual('br', result.headers['Content-Encoding'])
+        self.assertEqual(PAYLOAD, json.loads(brotli.decompress(result.data)))
+
+    def test_identity_without_accept_encoding_or_under_min_size(self):
+        self.assertNotIn('Content-Encoding', self.client.get('/large').headers)
+        result = self.client.get('/small', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', result.headers)
+        self.assertEqual({'msg': 'small'}, result.json)
+
+    def test_strong_etag_per_encoding_whatever_the_status(self):
+        for accept_encoding, etag in (('br', '"large-1-br"'), ('gzip', '"large-1-gzip"'), ('identity', '"large-1"')):
+            result = self.client.get('/large', headers={'Accept-Encoding': accept_encoding})
+            self.assertEqual((200, etag), (result.status_code, result.headers['ETag']))
+
+            result = self.client.get('/large', headers={'Accept-Encoding': accept_encoding, 'If-None-Match': etag})
+            self.assertEqual((304, etag), (result.status_code, result.headers['ETag']))
+            self.assertIn('Accept-Encoding', result.headers['Vary'])
+
+    def test_etag_of_another_encoding_does_not_match(self):
+        result = self.client.get('/large', headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"large-1-br"'})
+        self.assertEqual((200, '"large-1-gzip"'), (result.status_code, result.headers['ETag']))
+        self.assertEqual(PAYLOAD, json.loads(gzip.decompress(result.data)))
+
+    def test_compressed_once_per_etag(self):
+        with mock.patch.object(self.compression, '_compress', wraps=self.compression._compress) as compress:
+            first = self.client.get('/large', headers={'Accept-Encoding': 'gzip'}).data
+            self.assertEqual(first, self.client.get('/large', headers={'Accept-Encoding': 'gzip'}).data)
+        compress.assert_called_once()
+
+    def test_streamed_response_compressed(self):
+        result = self.client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual('gzip', result.headers['Content-Encoding'])
+        self.assertNotIn('Content-Length', result.headers)
+        self.assertEqual(PAYLOAD, json.loads(zlib.decompress(result.data, 16 + zlib.MAX_WBITS)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from unittest.mock import MagicMock
+
+from db_services.db_controller import DbController
+
+DB_NAME = "db_exist"
+COLLECTION_NAME = "collection_exist"
+
+
+class DbControllerTests(unittest.TestCase):
+    def setUp(self):
+        self.db_service = MagicMock()
+        self.read_db_service = MagicMock()
+        self.db_controller = DbController(self.db_service, self.read_db_service)
+
+    def test_reads_go_to_primary_by_default(self):
+        self.db_controller.find_one(DB_NAME, COLLECTION_NAME, {})
+        self.db_controller.find(DB_NAME, COLLECTION_NAME, {})
+        self.db_service.find_one.assert_called_once()
+        self.db_service.find.assert_called_once()
+        self.read_db_service.find_one.assert_not_called()
+        self.read_db_service.find.assert_not_called()
+
+    def test_secondary_ok_reads_go_to_read_service(self):
+        self.db_controller.find_one(DB_NAME, COLLECTION_NAME, {}, secondary_ok=True)
+        self.db_controller.find(DB_NAME, COLLECTION_NAME, {}, secondary_ok=True)
+        self.read_db_service.find_one.assert_called_once_with(DB_NAME, COLLECTION_NAME, {}, None)
+        self.read_db_service.find.assert_called_once_with(DB_NAME, COLLECTION_NAME, {}, None, None, 0, 0)
+        self.db_service.find_one.assert_not_called()
+
+    def test_writes_go_to_primary(self):
+        self.db_controller.update_one(DB_NAME, COLLECTION_NAME, {}, {})
+        self.db_service.update_one.assert_called_once()
+        self.read_db_service.update_one.assert_not_called()
+
+    def test_without_read_service_reads_go_to_primary(self):
+        db_controller = DbController(self.db_service)
+        db_controller.find_one(DB_NAME, COLLECTION_NAME, {}, secondary_ok=True)
+        self.assertFalse(db_controller.routes_reads)
+        self.db_service.find_one.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import brotli
+from bson import ObjectId
+
+from chapter_services import export
+from config import DB_NAME, CHAPTERS_COLLECTION_NAME
+from db_services.db_controller import DbController
+from db_services.memory_service import MemoryDbService
+
+
+def chapter(number: int) -> dict:
+    return {'_id': ObjectId(), 'author': 'author', 'holy_book': 1, 'book': 'Genesis', 'chapter_number': number,
+            'chapter_letters': 'a', 'verses': ['verse'], 'analysis': 'analysis', 'rating': {}, 'tags': [],
+            'comment_count': 0, 'version': 0, 'date_added': datetime(2020, 1, 1), 'date_updated': datetime(2020, 1, 1)}
+
+
+class ExportTests(unittest.TestCase):
+    def setUp(self):
+        self.service = MemoryDbService()
+        self.chapters = [chapter(number) for number in range(1, 6)]
+        self.service.insert_many(DB_NAME, CHAPTERS_COLLECTION_NAME, [dict(written) for written in self.chapters])
+        self.db_controller = DbController(self.service)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def export(self, **options) -> dict:
+        return export.export(self.db_controller, DB_NAME, self.directory.name, 2, **options)
+
+    def read(self, path: str) -> bytes:
+        with open(os.path.join(self.directory.name, path), 'rb') as exported_file:
+            return exported_file.read()
+
+    def test_export_writes_compressed_copies_and_a_manifest(self):
+        self.assertEqual({'chapters': 5, 'chapters_written': 5, 'chapters_removed': 0, 'pages_written': 3},
+                         self.export())
+
+        path = export.chapter_path(self.chapters[0]['_id'])
+        data = self.read(path)
+        self.assertEqual(str(self.chapters[0]['_id']), json.loads(data)['id'])
+        self.assertEqual(data, gzip.decompress(self.read(f'{path}.gz')))
+        self.assertEqual(data, brotli.decompress(self.read(f'{path}.br')))
+
+        manifest = export.load_manifest(self.directory.name)
+        self.assertEqual(hashlib.sha256(data).hexdigest(), manifest['files'][path]['sha256'])
+        last_page = json.loads(self.read(export.page_path(3)))
+        self.assertEqual((None, 'Genesis'), (last_page['next_page'], last_page['chapters'][0]['book']))
+        self.assertNotIn('verses', last_page['chapters'][0])
+        self.assertEqual(2, json.loads(self.read(export.page_path(1)))['next_page'])
+
+    def test_export_renders_only_what_changed(self):
+        self.export()
+        self.assertEqual({'chapters': 5, 'chapters_written': 0, 'chapters_removed': 0, 'pages_written': 0},
+                         self.export())
+
+        self.service.update_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': self.chapters[2]['_id']},
+                                {'$set': {'analysis': 'edited', 'date_updated': datetime(2021, 1, 1)}})
+        self.assertEqual({'chapters': 5, 'chapters_written': 1, 'chapters_removed': 0, 'pages_written': 1},
+                         self.export())
+        self.assertEqual('edited', json.loads(self.read(export.page_path(2)))['chapters'][0]['analysis'])
+
+        self.service.delete_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': self.chapters[4]['_id']})
+        self.assertEqual({'chapters': 4, 'chapters_written': 0, 'chapters_removed': 1, 'pages_written': 1},
+                         self.export())
+        for path in (export.chapter_path(self.chapters[4]['_id']), export.page_path(3)):
+            for suffix in ('', '.gz', '.br'):
+                self.assertFalse(os.path.exists(os.path.join(self.directory.name, path + suffix)))
+        self.assertIsNone(json.loads(self.read(export.page_path(2)))['next_page'])
+
+        self.assertEqual(4, self.export(full=True)['chapters_written'])
+
+
+if __name__ == '__main__':
+    unittest.main()
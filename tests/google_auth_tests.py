@@ -0,0 +1,93 @@
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from auth_services.google_auth import GoogleAuth, GoogleAuthError
+from tests.test_data.fake_google import FakeGoogle, CLIENT_ID, ISSUER, VALID_CODE, USER_INFO
+
+
+class GoogleAuthTests(unittest.TestCase):
+    def setUp(self):
+        self.google = FakeGoogle().start()
+        self.auth = self.google_auth()
+
+    def tearDown(self):
+        self.google.stop()
+
+    def google_auth(self, **options) -> GoogleAuth:
+        return GoogleAuth(CLIENT_ID, 'secret', f'{self.google.url}/token', f'{self.google.url}/userinfo',
+                          f'{self.google.url}/certs', [ISSUER], **options)
+
+    def test_login_verifies_id_token_locally(self):
+        self.assertEqual(self.auth.login(VALID_CODE), USER_INFO)
+        self.assertNotIn('/userinfo', self.google.requests)
+
+    def test_login_caches_signing_keys(self):
+        self.auth.login(VALID_CODE)
+        self.auth.login(VALID_CODE)
+        self.assertEqual(self.google.requests['/certs'], 1)
+        self.assertEqual(self.google.requests['/token'], 2)
+
+    def test_login_refreshes_keys_on_expiry(self):
+        self.google.jwks_max_age = 0
+        self.auth.login(VALID_CODE)
+        self.auth.login(VALID_CODE)
+        self.assertEqual(self.google.requests['/certs'], 2)
+
+    @mock.patch('auth_services.google_auth.JWKS_MIN_REFRESH_INTERVAL', 0)
+    def test_login_refreshes_keys_for_unknown_key_id(self):
+        self.auth.login(VALID_CODE)
+        self.google.kid = 'key-2'
+        self.assertEqual(self.auth.login(VALID_CODE), USER_INFO)
+        self.assertEqual(self.google.requests['/certs'], 2)
+        self.assertNotIn('/userinfo', self.google.requests)
+
+    def test_login_limits_refreshes_for_unknown_key_ids(self):
+        self.auth.login(VALID_CODE)
+        self.google.kid = 'key-2'
+        self.assertEqual(self.auth.login(VALID_CODE), USER_INFO)
+        self.assertEqual(self.google.requests['/certs'], 1)
+        self.assertEqual(self.google.requests['/userinfo'], 1)
+
+    def test_login_falls_back_to_userinfo_without_id_token(self):
+        self.google.include_id_token = False
+        self.assertEqual(self.auth.login(VALID_CODE), USER_INFO)
+        self.assertEqual(self.google.requests['/userinfo'], 1)
+
+    def test_login_falls_back_to_userinfo_on_invalid_id_token(self):
+        for claims in ({'aud': 'another-client'}, {'iss': 'https://evil.example.com'},
+                       {'exp': int(time.time()) - 60}, {'name': None}):
+            with self.subTest(claims=claims):
+                self.google.id_token_claims = claims
+                self.assertEqual(self.auth.login(VALID_CODE), USER_INFO)
+        self.assertEqual(self.google.requests['/userinfo'], 4)
+
+    def test_login_without_local_verification(self):
+        self.assertEqual(self.google_auth(verify_id_token=False).login(VALID_CODE), USER_INFO)
+        self.assertNotIn('/certs', self.google.requests)
+
+    def test_login_rejected_code(self):
+        with self.assertRaisesRegex(GoogleAuthError, 'invalid_grant'):
+            self.auth.login('wrong-code')
+
+    def test_login_retries_failing_gets(self):
+        self.google.failures = {'/certs': 1}
+        self.assertEqual(self.auth.login(VALID_CODE), USER_INFO)
+        self.assertEqual(self.google.requests['/certs'], 2)
+
+    def test_login_does_not_retry_failing_token_request(self):
+        self.google.failures = {'/token': 1}
+        with self.assertRaises(GoogleAuthError):
+            self.auth.login(VALID_CODE)
+        self.assertEqual(self.google.requests['/token'], 1)
+
+    def test_login_times_out(self):
+        self.google.delay = 0.5
+        with self.assertRaises(requests.Timeout):
+            self.google_auth(timeout=(0.1, 0.1), retries=0).login(VALID_CODE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import MagicMock
+
+from config import USERS_COLLECTION, CHAPTERS_COLLECTION_NAME, COMMENTS_COLLECTION_NAME
+from db_services.indexes import INDEXES, CHAPTERS_TEXT_INDEX, ensure_indexes, index_report
+
+DB_NAME = "db_exist"
+
+
+def index_information(*indexes):
+    information = {'_id_': {'key': [('_id', 1)]}}
+    for index in indexes:
+        information['_'.join(f'{key}_{direction}' for key, direction in index.keys)] = {'key': list(index.keys)}
+    return information
+
+
+class IndexesTests(unittest.TestCase):
+    def setUp(self):
+        self.db_controller = MagicMock()
+        self.db_controller.create_index.side_effect = lambda db, collection, keys, **options: \
+            '_'.join(f'{key}_{direction}' for key, direction in keys)
+        self.db_controller.explain.return_value = {'queryPlanner': {'winningPlan': {
+            'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}}}}
+        self.db_controller.aggregate.return_value = []
+
+    def test_ensure_indexes_success(self):
+        result = ensure_indexes(self.db_controller, DB_NAME)
+        self.assertIn(f'{USERS_COLLECTION}.email_1', result)
+        self.assertEqual(sum(len(indexes) for indexes in INDEXES.values()), self.db_controller.create_index.call_count)
+        self.db_controller.create_index.assert_any_call(DB_NAME, USERS_COLLECTION, [('email', 1)], unique=True)
+
+    def test_ensure_indexes_selected_collections(self):
+        ensure_indexes(self.db_controller, DB_NAME, [COMMENTS_COLLECTION_NAME])
+        self.db_controller.create_index.assert_called_once_with(DB_NAME, COMMENTS_COLLECTION_NAME,
+                                                                [('chapter_id', 1), ('date_added', 1)])
+
+    def test_index_report_missing_indexes(self):
+        self.db_controller.list_indexes.side_effect = lambda db, collection: \
+            index_information(*INDEXES[collection][:1])
+        report = index_report(self.db_controller, DB_NAME)
+        self.assertEqual([], report[USERS_COLLECTION]['missing'])
+        self.assertEqual([index.keys for index in INDEXES[CHAPTERS_COLLECTION_NAME][1:]],
+                         report[CHAPTERS_COLLECTION_NAME]['missing'])
+
+    def test_index_report_text_index_matched_by_name(self):
+        self.db_controller.list_indexes.side_effect = lambda db, collection: {
+            **index_information(*[index for index in INDEXES[collection] if 'name' not in index.options]),
+            CHAPTERS_TEXT_INDEX: {'key': [('_fts', 'text'), ('_ftsx', 1)]}}
+        report = index_report(self.db_controller, DB_NAME)
+        self.assertEqual([], report[CHAPTERS_COLLECTION_NAME]['missing'])
+
+    def test_index_report_unused_indexes_and_collection_scans(self):
+        self.db_controller.list_indexes.side_effect = lambda db, collection: index_information(*INDEXES[collection])
+        self.db_controller.aggregate.return_value = [{'name': '_id_', 'accesses': {'ops': 0}},
+                                                     {'name': 'tags_1', 'accesses': {'ops': 0}},
+                                                     {'name': 'date_added_1', 'accesses': {'ops': 10}}]
+        self.db_controller.explain.return_value = {'queryPlanner': {'winningPlan': {'stage': 'COLLSCAN'}}}
+        report = index_report(self.db_controller, DB_NAME)
+        self.assertEqual(['tags_1'], report[CHAPTERS_COLLECTION_NAME]['unused'])
+        self.assertEqual([{'email': ''}], report[USERS_COLLECTION]['collection_scans'])
+
+
+if __name__ == '__main__':
+    unittest.main()
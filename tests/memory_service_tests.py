@@ -0,0 +1,160 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, TEXT, UpdateOne, DeleteOne, InsertOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+from db_services.db_controller import DbController
+from db_services.indexes import ensure_indexes, index_report
+from db_services.memory_service import MemoryDbService, snapshot_database
+
+DB = 'db'
+CHAPTERS = 'chapters'
+
+
+class MemoryDbServiceTests(unittest.TestCase):
+    def setUp(self):
+        self.service = MemoryDbService()
+        self.chapters = [
+            {'_id': ObjectId(), 'book': 'Genesis', 'chapter_number': 1, 'tags': ['creation', 'light'],
+             'rating': {'moral': 3}, 'analysis': 'in the beginning god created the heaven and the earth',
+             'comments': [{'_id': 1, 'text': 'first'}, {'_id': 2, 'text': 'second'}]},
+            {'_id': ObjectId(), 'book': 'Genesis', 'chapter_number': 2, 'tags': ['creation'],
+             'rating': {'moral': 5}, 'analysis': 'the heaven and the earth were finished'},
+            {'_id': ObjectId(), 'book': 'Exodus', 'chapter_number': 1, 'tags': [], 'analysis': 'names'},
+        ]
+        self.service.insert_many(DB, CHAPTERS, [dict(chapter) for chapter in self.chapters])
+
+    def ids(self, query: dict, **options) -> list:
+        return [chapter['_id'] for chapter in self.service.find(DB, CHAPTERS, query, **options)]
+
+    def test_find_operators(self):
+        first, second, third = (chapter['_id'] for chapter in self.chapters)
+        self.assertEqual([first, second], self.ids({'book': 'Genesis'}))
+        self.assertEqual([first, second], self.ids({'tags': 'creation'}))
+        self.assertEqual([first], self.ids({'tags': {'$all': ['creation', 'light']}}))
+        self.assertEqual([second], self.ids({'rating.moral': {'$gte': 4}}))
+        self.assertEqual([third], self.ids({'rating.moral': None}))
+        self.assertEqual([first], self.ids({'comments._id': 2}))
+        self.assertEqual([first, third], self.ids({'_id': {'$in': [first, third, ObjectId()]}}))
+        self.assertEqual([second, third], self.ids({'$or': [{'chapter_number': 2}, {'book': {'$ne': 'Genesis'}}]}))
+        self.assertEqual([third], self.ids({'tags': {'$size': 0}, 'rating': {'$exists': False}}))
+        self.assertEqual([first], self.ids({'comments': {'$elemMatch': {'text': {'$regex': '^f'}}}}))
+
+    def test_find_sort_skip_limit_and_projection(self):
+        found = self.service.find(DB, CHAPTERS, {}, projection={'book': 1, 'rating.moral': 1, '_id': 0},
+                                  sort=[('book', ASCENDING), ('chapter_number', -1)], skip=1, limit=1)
+        self.assertEqual([{'book': 'Genesis', 'rating': {'moral': 5}}], found)
+        self.assertNotIn('comments', self.service.find_one(DB, CHAPTERS, {'chapter_number': 1},
+                                                           projection={'comments': 0}))
+
+    def test_returned_documents_are_copies(self):
+        self.service.find_one(DB, CHAPTERS, {'book': 'Exodus'})['tags'].append('changed')
+        self.assertEqual([], self.service.find_one(DB, CHAPTERS, {'book': 'Exodus'})['tags'])
+
+    def test_text_search(self):
+        self.service.create_index(DB, CHAPTERS, [('book', TEXT), ('analysis', TEXT)], name='text',
+                                  weights={'book': 10})
+        found = self.service.find(DB, CHAPTERS, {'$text': {'$search': 'genesis earth'}},
+                                  projection={'score': {'$meta': 'textScore'}},
+                                  sort=[('score', {'$meta': 'textScore'})])
+        self.assertEqual([self.chapters[0]['_id'], self.chapters[1]['_id']], [chapter['_id'] for chapter in found])
+        self.assertEqual([11, 11], [chapter['score'] for chapter in found])
+        self.assertEqual([self.chapters[1]['_id']], self.ids({'$text': {'$search': 'heaven -beginning'}}))
+
+    def test_update_operators_and_array_filters(self):
+        chapter_id = self.chapters[0]['_id']
+        result = self.service.update_one(DB, CHAPTERS, {'_id': chapter_id},
+                                         {'$set': {'comments.$[comment].text': 'edited', 'rating.scientific': 2},
+                                          '$inc': {'comment_count': 1}, '$push': {'tags': 'new'},
+                                          '$unset': {'analysis': ''}},
+                                         array_filters=[{'comment._id': 2}])
+        self.assertEqual((1, 1), (result.matched_count, result.modified_count))
+        self.service.update_one(DB, CHAPTERS, {'_id': chapter_id}, {'$pull': {'comments': {'_id': 1}}})
+
+        chapter = self.service.find_one(DB, CHAPTERS, {'_id': chapter_id})
+        self.assertEqual([{'_id': 2, 'text': 'edited'}], chapter['comments'])
+        self.assertEqual({'moral': 3, 'scientific': 2}, chapter['rating'])
+        self.assertEqual((1, ['creation', 'light', 'new']), (chapter['comment_count'], chapter['tags']))
+        self.assertNotIn('analysis', chapter)
+
+        result = self.service.update_one(DB, CHAPTERS, {'_id': chapter_id}, {'$set': {'book': 'Genesis'}})
+        self.assertEqual((1, 0), (result.matched_count, result.modified_count))
+        with self.assertRaises(OperationFailure):
+            self.service.update_one(DB, CHAPTERS, {'_id': chapter_id}, {'$inc': {'book': 1}})
+
+    def test_upsert(self):
+        result = self.service.update_one(DB, 'users', {'email': 'a@b.c'},
+                                         {'$setOnInsert': {'name': 'a'}, '$set': {'seen': True}}, upsert=True)
+        self.assertEqual(0, result.matched_count)
+        self.service.update_one(DB, 'users', {'email': 'a@b.c'}, {'$setOnInsert': {'name': 'b'}}, upsert=True)
+        self.assertEqual({'_id': result.upserted_id, 'email': 'a@b.c', 'name': 'a', 'seen': True},
+                         self.service.find_one(DB, 'users', {}))
+
+    def test_unique_index_and_bulk_errors(self):
+        self.service.create_index(DB, 'users', [('email', ASCENDING)], unique=True)
+        self.service.insert_one(DB, 'users', {'email': 'a'})
+        with self.assertRaises(DuplicateKeyError):
+            self.service.insert_one(DB, 'users', {'email': 'a'})
+
+        with self.assertRaises(BulkWriteError) as context:
+            self.service.insert_many(DB, 'users', [{'email': 'b'}, {'email': 'a'}, {'email': 'c'}])
+        self.assertEqual([1], [error['index'] for error in context.exception.details['writeErrors']])
+        self.assertEqual(3, len(self.service.find(DB, 'users', {})))
+
+        result = self.service.bulk_write(DB, CHAPTERS, [
+            InsertOne({'book': 'Leviticus'}), UpdateOne({'book': 'Exodus'}, {'$set': {'chapter_number': 3}}),
+            DeleteOne({'chapter_number': 2})])
+        self.assertEqual((1, 1, 1), (result.inserted_count, result.modified_count, result.deleted_count))
+
+    def test_group_sums(self):
+        found = self.service.aggregate(DB, CHAPTERS, [{'$match': {'chapter_number': {'$gte': 1}}},
+                                                      {'$group': {'_id': '$book', 'count': {'$sum': 1},
+                                                                  'moral': {'$sum': '$rating.moral'}}}])
+        self.assertEqual([{'_id': 'Genesis', 'count': 2, 'moral': 8}, {'_id': 'Exodus', 'count': 1, 'moral': 0}],
+                         found)
+
+    def test_indexes_serve_equality_queries(self):
+        db_controller = DbController(self.service)
+        ensure_indexes(db_controller, DB, [CHAPTERS])
+        self.assertEqual('IXSCAN', self.service.explain(DB, CHAPTERS, {'book': 'Genesis'})
+                         ['queryPlanner']['winningPlan']['inputStage']['stage'])
+        self.assertEqual(2, len(self.service.find(DB, CHAPTERS, {'tags': 'creation'})))
+        self.service.update_one(DB, CHAPTERS, {'book': 'Exodus'}, {'$push': {'tags': 'creation'}})
+        self.assertEqual(3, len(self.service.find(DB, CHAPTERS, {'tags': {'$in': ['creation']}})))
+
+        report = index_report(db_controller, DB)[CHAPTERS]
+        self.assertEqual([], report['missing'])
+        self.assertEqual([], report['collection_scans'])
+
+    def test_snapshot_and_read_only_load(self):
+        self.service.create_index(DB, CHAPTERS, [('book', ASCENDING)])
+        self.service.insert_one(DB, 'comments', {'date_added': datetime(2020, 1, 1)})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'snapshot.bson.gz')
+            self.service.snapshot(path)
+            loaded = MemoryDbService.load(path, read_only=True)
+
+        self.assertEqual(self.service.find(DB, CHAPTERS, {}), loaded.find(DB, CHAPTERS, {}))
+        self.assertEqual(datetime(2020, 1, 1), loaded.find_one(DB, 'comments', {})['date_added'])
+        self.assertIn('book_1', loaded.list_indexes(DB, CHAPTERS))
+        with self.assertRaises(OperationFailure):
+            loaded.insert_one(DB, CHAPTERS, {'book': 'Numbers'})
+
+    def test_snapshot_database_keeps_declared_indexes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'snapshot.bson.gz')
+            counts = snapshot_database(DbController(self.service), DB, path)
+            loaded = MemoryDbService.load(path)
+
+        self.assertEqual(3, counts[CHAPTERS])
+        self.assertEqual(3, len(loaded.find(DB, CHAPTERS, {})))
+        self.assertIn('chapters_text', loaded.list_indexes(DB, CHAPTERS))
+        self.assertEqual(2, len(loaded.find(DB, CHAPTERS, {'$text': {'$search': 'heaven'}})))
+
+
+if __name__ == '__main__':
+    unittest.main()
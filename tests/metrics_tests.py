@@ -0,0 +1,88 @@
+import os
+import unittest
+from unittest.mock import MagicMock
+
+from db_services.timed_db_controller import TimedDbController
+from metrics_services import DB_OPERATION_DURATION
+from metrics_services.registry import Registry
+
+DB_NAME = "db_exist"
+
+
+class RegistryTests(unittest.TestCase):
+    def test_render_counter_and_histogram(self):
+        registry = Registry()
+        counter = registry.counter('logins_total', 'Logins', ('result',))
+        histogram = registry.histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1))
+        counter.inc('ok')
+        counter.inc('ok')
+        histogram.observe(0.05, '/a')
+        histogram.observe(0.5, '/a')
+        histogram.observe(5, '/a')
+
+        lines = registry.render().splitlines()
+        self.assertIn('# TYPE logins_total counter', lines)
+        self.assertIn('logins_total{result="ok"} 2', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_sum{route="/a"} 5.55', lines)
+        self.assertIn('latency_seconds_count{route="/a"} 3', lines)
+
+    def test_process_label(self):
+        registry = Registry(process_label='pid')
+        registry.counter('logins_total', 'Logins', ('result',)).inc('ok')
+        registry.histogram('latency_seconds', 'Latency', buckets=(1,)).observe(0.5)
+        registry.add_collector(lambda: [('pool_connections', 'gauge', 'Connections', (), [((), 3)])])
+
+        lines = registry.render().splitlines()
+        pid = os.getpid()
+        self.assertIn(f'logins_total{{result="ok",pid="{pid}"}} 1', lines)
+        self.assertIn(f'latency_seconds_bucket{{le="1",pid="{pid}"}} 1', lines)
+        self.assertIn(f'latency_seconds_count{{pid="{pid}"}} 1', lines)
+        self.assertIn(f'pool_connections{{pid="{pid}"}} 3', lines)
+
+    def test_reset(self):
+        registry = Registry()
+        counter = registry.counter('logins_total', 'Logins', ('result',))
+        counter.inc('ok')
+        registry.reset()
+        self.assertEqual([], counter.samples())
+
+    def test_render_collector_escapes_labels(self):
+        registry = Registry()
+        registry.add_collector(lambda: [('pool_connections', 'gauge', 'Connections', ('address',),
+                                         [(('host"1',), 3)])])
+        self.assertIn('pool_connections{address="host\\"1"} 3', registry.render().splitlines())
+
+
+class TimedDbControllerTests(unittest.TestCase):
+    def setUp(self):
+        self.db_controller = MagicMock()
+        self.timed_db_controller = TimedDbController(self.db_controller)
+
+    def count(self, collection_name: str, operation: str) -> int:
+        samples = {(name, labels): value for name, labels, value in DB_OPERATION_DURATION.samples()}
+        return samples.get(('db_operation_duration_seconds_count', (collection_name, operation)), 0)
+
+    def test_operation_timed_per_collection(self):
+        before = self.count('timed_users', 'find_one')
+        self.timed_db_controller.find_one(DB_NAME, 'timed_users', {})
+        self.assertEqual(before + 1, self.count('timed_users', 'find_one'))
+        self.db_controller.find_one.assert_called_once_with(DB_NAME, 'timed_users', {})
+
+    def test_find_timed_when_cursor_exhausted(self):
+        self.db_controller.find.return_value = [{'_id': 1}, {'_id': 2}]
+        before = self.count('timed_chapters', 'find')
+        cursor = self.timed_db_controller.find(DB_NAME, 'timed_chapters', {})
+        self.assertEqual(before, self.count('timed_chapters', 'find'))
+        self.assertEqual([{'_id': 1}, {'_id': 2}], list(cursor))
+        self.assertEqual(before + 1, self.count('timed_chapters', 'find'))
+
+    def test_other_attributes_pass_through(self):
+        self.db_controller.routes_reads = False
+        self.assertFalse(self.timed_db_controller.routes_reads)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from unittest.mock import MagicMock
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from config import CHAPTERS_COLLECTION_NAME, COMMENTS_COLLECTION_NAME
+from db_services.migrations import migrate_embedded_comments
+
+DB_NAME = "db_exist"
+
+
+class MigrationsTests(unittest.TestCase):
+    def setUp(self):
+        self.db_controller = MagicMock()
+        self.chapter_id = ObjectId()
+        self.comments = [{'_id': ObjectId(), 'name': 'test user'}, {'_id': ObjectId(), 'name': 'test user'}]
+        self.db_controller.find.return_value = [{'_id': self.chapter_id, 'comments': self.comments}]
+        self.db_controller.insert_many.return_value = [comment['_id'] for comment in self.comments]
+
+    def test_migrate_embedded_comments_success(self):
+        result = migrate_embedded_comments(self.db_controller, DB_NAME)
+
+        self.assertEqual(result, 2)
+        self.db_controller.create_index.assert_called_once_with(DB_NAME, COMMENTS_COLLECTION_NAME,
+                                                                [('chapter_id', 1), ('date_added', 1)])
+        inserted = self.db_controller.insert_many.call_args.args[2]
+        self.assertTrue(all(comment['chapter_id'] == self.chapter_id for comment in inserted))
+        self.db_controller.update_one.assert_called_once_with(
+            DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': self.chapter_id},
+            {'$inc': {'comment_count': 2}, '$unset': {'comments': ''}})
+
+    def test_migrate_embedded_comments_already_moved_skipped(self):
+        self.db_controller.insert_many.side_effect = BulkWriteError(
+            {'writeErrors': [{'index': 0, 'code': 11000, 'errmsg': 'duplicate'}], 'nInserted': 1})
+
+        result = migrate_embedded_comments(self.db_controller, DB_NAME)
+
+        self.assertEqual(result, 1)
+        self.assertEqual(self.db_controller.update_one.call_args.args[3]['$inc'], {'comment_count': 2})
+
+    def test_migrate_embedded_comments_other_write_error_raised(self):
+        self.db_controller.insert_many.side_effect = BulkWriteError(
+            {'writeErrors': [{'index': 0, 'code': 121, 'errmsg': 'validation failed'}], 'nInserted': 1})
+
+        with self.assertRaises(BulkWriteError):
+            migrate_embedded_comments(self.db_controller, DB_NAME)
+        self.db_controller.update_one.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -104,6 +104,11 @@ class MongoDbServiceTests(unittest.TestCase):
         result = self.db_service.update_one(DB_EXIST_NAME, COLLECTION_NAME_EXIST, {}, {})
         self.assertEqual(result.matched_count, 0)
 
+    def test_update_one_upsert_success(self):
+        self.db_service.update_one(DB_EXIST_NAME, COLLECTION_NAME_EXIST, {'key': 1}, {'$setOnInsert': {}}, upsert=True)
+        self.collection_mock.update_one.assert_called_once_with({'key': 1}, {'$setOnInsert': {}}, array_filters=[],
+                                                                upsert=True)
+
     def test_delete_one_success(self):
         delete_one_result = self.collection_mock.delete_one.return_value
         delete_one_result.deleted_count = 1
@@ -116,11 +121,27 @@ class MongoDbServiceTests(unittest.TestCase):
         result = self.db_service.delete_one(DB_EXIST_NAME, COLLECTION_NAME_EXIST, {})
         self.assertEqual(result.deleted_count, 0)
 
+    def test_insert_many_success(self):
+        records = [{"key1": "some_id_1"}, {"key1": "some_id_2"}]
+        inserted_ids = [ObjectId(), ObjectId()]
+        self.collection_mock.insert_many.return_value.inserted_ids = inserted_ids
+        result = self.db_service.insert_many(DB_EXIST_NAME, COLLECTION_NAME_EXIST, records)
+        self.assertEqual(result, inserted_ids)
+        self.collection_mock.insert_many.assert_called_once_with(records, ordered=False)
+
+    def test_bulk_write_success(self):
+        requests = [MagicMock(), MagicMock()]
+        bulk_write_result = self.collection_mock.bulk_write.return_value
+        bulk_write_result.deleted_count = 2
+        result = self.db_service.bulk_write(DB_EXIST_NAME, COLLECTION_NAME_EXIST, requests)
+        self.assertEqual(result.deleted_count, 2)
+        self.collection_mock.bulk_write.assert_called_once_with(requests, ordered=False)
+
     def mock_behaviour(self):
         """db&collection_exist hold their relative names"""
         self.client.list_database_names.return_value = [DB_EXIST_NAME]
         db_mock = self.client[DB_EXIST_NAME]
-        db_mock.list_collection_names.return_value = COLLECTION_NAME_EXIST
+        db_mock.list_collection_names.return_value = [COLLECTION_NAME_EXIST]
         collection_mock = db_mock[COLLECTION_NAME_EXIST]
         return db_mock, collection_mock
 
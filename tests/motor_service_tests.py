@@ -0,0 +1,67 @@
+import unittest
+
+from bson.objectid import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from db_services.async_db_controller import AsyncDbController
+from db_services.motor_service import MotorService
+
+DB_EXIST_NAME = "db_exist"
+COLLECTION_NAME_EXIST = "collection_exist"
+COLLECTION_DOES_NOT_EXIST = "collection_does_not_exist"
+
+
+class MotorServiceTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.client = AsyncMongoMockClient()
+        self.db_controller = AsyncDbController(MotorService(self.client))
+        await self.client[DB_EXIST_NAME][COLLECTION_NAME_EXIST].insert_many(
+            [{'_id': ObjectId(), 'key': index, 'items': []} for index in range(5)])
+
+    async def test_find_one_success(self):
+        result = await self.db_controller.find_one(DB_EXIST_NAME, COLLECTION_NAME_EXIST, {'key': 3},
+                                                   projection={'key': 1})
+        self.assertEqual(3, result['key'])
+        self.assertNotIn('items', result)
+
+    async def test_find_sort_limit_success(self):
+        result = await self.db_controller.find(DB_EXIST_NAME, COLLECTION_NAME_EXIST, {'key': {'$gt': 0}},
+                                               sort=[('key', -1)], limit=2)
+        self.assertEqual([4, 3], [record['key'] for record in result])
+
+    async def test_insert_one_success(self):
+        result = await self.db_controller.insert_one(DB_EXIST_NAME, COLLECTION_NAME_EXIST, {'key': 10})
+        self.assertIsInstance(result, ObjectId)
+
+    async def test_update_one_success(self):
+        result = await self.db_controller.update_one(DB_EXIST_NAME, COLLECTION_NAME_EXIST, {'key': 1},
+                                                     {'$push': {'items': 'item'}})
+        self.assertEqual(1, result.matched_count)
+        record = await self.db_controller.find_one(DB_EXIST_NAME, COLLECTION_NAME_EXIST, {'key': 1})
+        self.assertEqual(['item'], record['items'])
+
+    async def test_update_one_failure(self):
+        result = await self.db_controller.update_one(DB_EXIST_NAME, COLLECTION_NAME_EXIST, {'key': 100},
+                                                     {'$set': {'key': 0}})
+        self.assertEqual(0, result.matched_count)
+
+    async def test_delete_one_success(self):
+        result = await self.db_controller.delete_one(DB_EXIST_NAME, COLLECTION_NAME_EXIST, {'key': 1})
+        self.assertEqual(1, result.deleted_count)
+
+    async def test_validate_success(self):
+        await self.db_controller.validate({DB_EXIST_NAME: [COLLECTION_NAME_EXIST]})
+
+    async def test_validate_strict_failure(self):
+        with self.assertRaisesRegex(KeyError,
+                                    f"collection: {COLLECTION_DOES_NOT_EXIST} does not exist under database: "
+                                    f"{DB_EXIST_NAME}"):
+            await self.db_controller.validate({DB_EXIST_NAME: [COLLECTION_DOES_NOT_EXIST]})
+
+    async def test_validate_lenient_success(self):
+        with self.assertLogs('db_services.motor_service', level='WARNING'):
+            await self.db_controller.validate({DB_EXIST_NAME: [COLLECTION_DOES_NOT_EXIST]}, strict=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
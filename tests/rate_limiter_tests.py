@@ -0,0 +1,129 @@
+import threading
+import unittest
+from unittest import mock
+
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token
+from flask_jwt_extended import view_decorators
+from redis.exceptions import ConnectionError
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from auth_services.jwt_identity import jwt_identity
+from http_services.rate_limiter import LocalBuckets, RateLimiter, RedisBuckets, parse_limit
+
+
+def create_app(rate_limiter: RateLimiter, release: threading.Event = None):
+    app = Flask(__name__)
+    app.config.update(JWT_SECRET_KEY='secret', JWT_TOKEN_LOCATION=['cookies'], JWT_COOKIE_CSRF_PROTECT=False)
+    JWTManager(app)
+    rate_limiter.init_app(app)
+
+    @app.route('/login', methods=['POST'])
+    @rate_limiter.limit('login', '2/60', by_user=False)
+    def login():
+        return jsonify({'msg': 'ok'})
+
+    @app.route('/comment', methods=['POST'])
+    @rate_limiter.limit('comments', '1/60')
+    def post_comment():
+        return jsonify({'msg': 'ok', 'identity': jwt_identity()})
+
+    @app.route('/slow')
+    def slow():
+        release.wait(5)
+        return jsonify({'msg': 'ok'})
+
+    return app
+
+
+class RateLimiterTests(unittest.TestCase):
+    def test_parse_limit(self):
+        self.assertEqual((0.5, 30), parse_limit('30/60'))
+        self.assertEqual((5, 5), parse_limit('5'))
+        self.assertIsNone(parse_limit(''))
+        self.assertIsNone(parse_limit('0/60'))
+
+    def test_local_buckets_refill_over_time(self):
+        buckets = LocalBuckets()
+        with mock.patch('http_services.rate_limiter.time.monotonic', return_value=100.0) as monotonic:
+            self.assertEqual([0, 0], [buckets.take('key', 1, 2) for _ in range(2)])
+            self.assertEqual(1, buckets.take('key', 1, 2))
+            self.assertEqual(0, buckets.take('other', 1, 2))
+            monotonic.return_value = 100.5
+            self.assertEqual(0.5, buckets.take('key', 1, 2))
+            monotonic.return_value = 101.0
+            self.assertEqual(0, buckets.take('key', 1, 2))
+
+    def test_local_buckets_drop_the_least_recently_used_keys(self):
+        buckets = LocalBuckets(max_keys=1)
+        buckets.take('first', 1, 1)
+        buckets.take('second', 1, 1)
+        self.assertEqual(0, buckets.take('first', 1, 1))
+
+    def test_redis_buckets_fall_back_to_local_buckets(self):
+        client = mock.MagicMock()
+        client.register_script.return_value.side_effect = ['0', '2.5', ConnectionError()]
+        buckets = RedisBuckets(client)
+
+        self.assertEqual([0, 2.5, 0], [buckets.take('key', 1, 1) for _ in range(3)])
+        self.assertAlmostEqual(1, buckets.take('key', 1, 1), places=2)
+        self.assertEqual(3, client.register_script.return_value.call_count)
+        self.assertEqual(['rate_limit:key'], client.register_script.return_value.call_args.kwargs['keys'])
+
+    def test_limit_per_address_and_per_user(self):
+        app = create_app(RateLimiter())
+        client = app.test_client()
+        self.assertEqual([200, 200], [client.post('/login').status_code for _ in range(2)])
+        response = client.post('/login')
+        self.assertEqual((429, '30'), (response.status_code, response.headers['Retry-After']))
+
+        for email in ('a@b.c', 'd@e.f'):
+            with app.app_context():
+                client.set_cookie('localhost', 'access_token_cookie', create_access_token(email))
+            self.assertEqual([200, 429], [client.post('/comment').status_code for _ in range(2)])
+
+    def test_token_is_decoded_once(self):
+        app = create_app(RateLimiter())
+        client = app.test_client()
+        with app.app_context():
+            client.set_cookie('localhost', 'access_token_cookie', create_access_token('a@b.c'))
+        with mock.patch.object(view_decorators, 'decode_token', wraps=view_decorators.decode_token) as decode_token:
+            self.assertEqual('a@b.c', client.post('/comment').json['identity'])
+        decode_token.assert_called_once()
+
+        client.delete_cookie('localhost', 'access_token_cookie')
+        self.assertEqual(401, client.post('/comment').status_code)  # an optional lookup does not admit the view
+
+    def test_client_address_behind_trusted_proxies(self):
+        app = create_app(RateLimiter())
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+        client = app.test_client()
+        for address in ('10.0.0.1', '10.0.0.2'):
+            headers = {'X-Forwarded-For': f'1.2.3.4, {address}'}  # the first address is not the proxy's, not trusted
+            self.assertEqual([200, 200, 429], [client.post('/login', headers=headers).status_code for _ in range(3)])
+
+    def test_disabled_limiter_admits_everything(self):
+        rate_limiter = RateLimiter(enabled=False)
+        client = create_app(rate_limiter).test_client()
+        self.assertEqual([200] * 3, [client.post('/login').status_code for _ in range(3)])
+
+    def test_concurrency_cap_sheds_load(self):
+        release = threading.Event()
+        rate_limiter = RateLimiter(max_concurrent=1)
+        app = create_app(rate_limiter, release)
+        thread = threading.Thread(target=app.test_client().get, args=('/slow',))
+        thread.start()
+        try:
+            while not rate_limiter.in_flight():
+                pass
+            response = app.test_client().post('/login')
+            self.assertEqual((503, '1'), (response.status_code, response.headers['Retry-After']))
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(0, rate_limiter.in_flight())
+        self.assertEqual(200, app.test_client().post('/login').status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
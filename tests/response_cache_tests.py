@@ -0,0 +1,115 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from flask import Flask, jsonify, request
+from flask_caching import Cache
+
+from cache_services.response_cache import ResponseCache
+
+
+def create_app(response_cache: ResponseCache, view_calls: list, backend: Cache = None):
+    app = Flask(__name__)
+    if backend is not None:
+        backend.init_app(app, config={'CACHE_TYPE': 'SimpleCache'})
+
+    @app.route('/items/<string:item_id>')
+    @response_cache.cached('item:{item_id}', 'items')
+    def get_item(item_id):
+        view_calls.append(item_id)
+        if request.args.get('timeout'):
+            response_cache.limit_timeout(int(request.args['timeout']))
+        if item_id == 'missing':
+            return jsonify({'msg': 'not found'}), 404
+        return jsonify({'_id': item_id, 'version': len(view_calls)}), 200
+
+    return app
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.view_calls = []
+
+    def assert_cache_behaviour(self, response_cache: ResponseCache, backend: Cache = None):
+        app = create_app(response_cache, self.view_calls, backend)
+        client = app.test_client()
+        first = client.get('/items/1').json
+        self.assertEqual(first, client.get('/items/1').json)
+        self.assertEqual(['1'], self.view_calls)
+
+        with app.app_context():
+            response_cache.bump('item:2')
+        self.assertEqual(first, client.get('/items/1').json)
+        with app.app_context():
+            response_cache.bump('items')
+        self.assertNotEqual(first, client.get('/items/1').json)
+        self.assertEqual(['1', '1'], self.view_calls)
+
+    def test_local_cached_until_bump(self):
+        self.assert_cache_behaviour(ResponseCache())
+
+    def test_shared_cached_until_bump(self):
+        backend = Cache()
+        self.assert_cache_behaviour(ResponseCache(backend), backend)
+
+    def test_evicted_version_does_not_serve_older_entries(self):
+        backend = Cache()
+        response_cache = ResponseCache(backend)
+        app = create_app(response_cache, self.view_calls, backend)
+        client = app.test_client()
+        first = client.get('/items/1').json
+        with app.app_context():
+            response_cache.bump('items')
+        second = client.get('/items/1').json
+        self.assertNotEqual(first, second)
+
+        with app.app_context():
+            backend.delete(ResponseCache.VERSION_PREFIX + 'items')  # evicted, or expired
+        self.assertNotIn(client.get('/items/1').json, (first, second))
+        self.assertEqual(['1', '1', '1'], self.view_calls)
+
+    def test_query_string_is_part_of_key(self):
+        client = create_app(ResponseCache(), self.view_calls).test_client()
+        client.get('/items/1?a=1&b=2')
+        client.get('/items/1?b=2&a=1')
+        client.get('/items/1?a=2')
+        self.assertEqual(['1', '1'], self.view_calls)
+
+    def test_errors_are_not_cached(self):
+        client = create_app(ResponseCache(), self.view_calls).test_client()
+        self.assertEqual(404, client.get('/items/missing').status_code)
+        self.assertEqual(404, client.get('/items/missing').status_code)
+        self.assertEqual(['missing', 'missing'], self.view_calls)
+
+    def test_limited_timeout(self):
+        response_cache = ResponseCache(timeout=60)
+        client = create_app(response_cache, self.view_calls).test_client()
+        client.get('/items/1?timeout=0')
+        client.get('/items/1?timeout=0')
+        self.assertEqual(['1', '1'], self.view_calls)
+
+        client.get('/items/2?timeout=30')
+        client.get('/items/2?timeout=30')
+        self.assertEqual(['1', '1', '2'], self.view_calls)
+        expires_at = [expires_at for expires_at, _ in response_cache._local_responses.values()]
+        self.assertLess(expires_at[0], time.monotonic() + 31)
+
+    def test_bypassed_requests_neither_read_nor_fill_the_cache(self):
+        client = create_app(ResponseCache(bypass=lambda: request.args.get('fresh') == '1'),
+                            self.view_calls).test_client()
+        client.get('/items/1')
+        self.assertEqual(2, client.get('/items/1?fresh=1').json['version'])
+        self.assertEqual(3, client.get('/items/1?fresh=1').json['version'])
+        self.assertEqual(1, client.get('/items/1').json['version'])
+
+    def test_backend_failure_bypasses_cache(self):
+        backend = MagicMock()
+        backend.get_many.side_effect = ConnectionError()
+        client = create_app(ResponseCache(backend), self.view_calls).test_client()
+        self.assertEqual(200, client.get('/items/1').status_code)
+        self.assertEqual(200, client.get('/items/1').status_code)
+        self.assertEqual(['1', '1'], self.view_calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
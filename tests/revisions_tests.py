@@ -0,0 +1,83 @@
+import unittest
+
+from bson import ObjectId
+
+from chapter_services.revisions import reverse_delta, apply_delta, restore, diff, revision_document, MissingRevision
+from tests.test_data.mock_data import mock_chapter_data
+
+
+class RevisionsTests(unittest.TestCase):
+    def setUp(self):
+        self.chapter = {key: value for key, value in mock_chapter_data().items() if key != 'comments'}
+        self.chapter.update(_id=ObjectId(self.chapter['_id']), version=0)
+
+    def edit(self, document: dict, changes: dict) -> tuple:
+        delta = reverse_delta(document, changes)
+        return {**document, **changes, 'version': document['version'] + 1}, revision_document(document, delta, 'a@b')
+
+    def test_reverse_delta_of_one_word_stores_operations(self):
+        analysis = ' '.join(['word'] * 200)
+        chapter = dict(self.chapter, analysis=analysis)
+        delta = reverse_delta(chapter, {'analysis': analysis.replace('word', 'other', 1), 'author': chapter['author']})
+        self.assertEqual(['analysis'], list(delta))
+        self.assertEqual([[0, 1, 'word']], delta['analysis']['ops'])
+
+    def test_reverse_delta_keeps_old_value_of_rewritten_and_short_fields(self):
+        delta = reverse_delta(self.chapter, {'analysis': 'completely different', 'tags': ['new']})
+        self.assertEqual({'value': self.chapter['analysis']}, delta['analysis'])
+        self.assertEqual({'value': self.chapter['tags']}, delta['tags'])
+
+    def test_reverse_delta_without_changes_is_empty(self):
+        self.assertEqual({}, reverse_delta(self.chapter, {'book': self.chapter['book'], 'comment_count': 5}))
+
+    def test_apply_delta_restores_text_and_lists(self):
+        verses = [f'verse {index}' for index in range(50)]
+        old = dict(self.chapter, verses=verses, analysis='the quick brown fox jumps over the lazy dog ' * 5)
+        new = dict(old, verses=verses[:10] + ['inserted'] + verses[11:] + ['appended'],
+                   analysis=old['analysis'].replace('lazy', 'sleepy').replace('quick', 'slow', 1))
+        delta = reverse_delta(old, new)
+        self.assertIn('ops', delta['verses'])
+        self.assertIn('ops', delta['analysis'])
+        self.assertEqual(old, apply_delta(new, delta))
+
+    def test_restore_and_diff_between_versions(self):
+        versions = [self.chapter]
+        revisions = []
+        for text in ('first edit of the analysis', 'second edit of the analysis', 'third edit of the text'):
+            chapter, revision = self.edit(versions[-1], {'analysis': versions[-1]['analysis'] + ' ' + text})
+            versions.append(chapter)
+            revisions.append(revision)
+        revisions.reverse()
+
+        for version, chapter in enumerate(versions):
+            self.assertEqual(chapter['analysis'], restore(versions[-1], revisions, version)['analysis'])
+        changes = diff(restore(versions[-1], revisions, 1), restore(versions[-1], revisions, 3))
+        self.assertEqual([{'op': 'insert', 'from': '', 'to': ' second edit of the analysis third edit of the text'}],
+                         changes['analysis'])
+        self.assertEqual({}, diff(versions[2], versions[2]))
+
+    def test_restore_follows_the_chain(self):
+        chapter = dict(self.chapter, tags=['a'])
+        revisions = []
+        for version, tags in ((0, ['b']), (2, ['c'])):  # version 1 was a write without a revision
+            chapter = dict(chapter, version=version)
+            delta = reverse_delta(chapter, {'tags': tags})
+            revisions.insert(0, revision_document(chapter, delta, 'a@b'))
+            chapter = dict(chapter, tags=tags, revision=version)
+        chapter['version'] = 3
+        orphan = {'version': 1, 'delta': {'tags': {'value': ['lost']}}}  # the revision of an edit that lost
+
+        self.assertEqual(['a'], restore(chapter, revisions + [orphan], 0)['tags'])
+        self.assertEqual(['b'], restore(chapter, revisions + [orphan], 1)['tags'])
+        with self.assertRaises(MissingRevision):
+            restore(chapter, revisions[1:], 2)
+        with self.assertRaises(MissingRevision):
+            restore(chapter, revisions[:1], 0)
+
+    def test_diff_of_short_fields(self):
+        self.assertEqual({'chapter_number': {'from': 1, 'to': 2}},
+                         diff(self.chapter, dict(self.chapter, chapter_number=2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
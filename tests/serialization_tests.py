@@ -0,0 +1,49 @@
+import json
+import unittest
+from datetime import datetime
+
+from bson import ObjectId
+
+from models.chapter import Chapter, HollyBook
+from models.serialization import dumps, model_projection, to_response_document
+from tests.test_data.mock_data import mock_chapter_data
+
+
+def mongo_chapter_document():
+    chapter = mock_chapter_data()
+    chapter.pop('comments')
+    return {key: value for key, value in chapter.items() if key in model_projection(Chapter)} | {
+        '_id': ObjectId(chapter['_id']),
+        'comment_count': 2,
+        'version': 3,
+        'date_added': datetime(2023, 2, 2, 20, 12, 6, 73000),
+        'date_updated': datetime(2023, 2, 3, 18, 50, 54),
+    }
+
+
+class SerializationTests(unittest.TestCase):
+    def test_dumps_matches_pydantic_to_json(self):
+        document = mongo_chapter_document()
+        expected = Chapter(**document).to_json()
+        self.assertEqual(expected, json.loads(dumps(to_response_document(document))))
+
+    def test_dumps_bson_types_success(self):
+        object_id = ObjectId()
+        result = json.loads(dumps({'_id': object_id, 'holy_book': HollyBook.QURAN,
+                                   'date_added': datetime(2023, 2, 2, 20, 12, 6), 'book': 'בראשית'}))
+        self.assertEqual({'_id': str(object_id), 'holy_book': 3, 'date_added': '2023-02-02T20:12:06',
+                          'book': 'בראשית'}, result)
+
+    def test_dumps_unknown_type_failure(self):
+        with self.assertRaises(TypeError):
+            dumps({'value': object()})
+
+    def test_to_response_document_does_not_mutate(self):
+        document = {'_id': ObjectId(), 'book': 'בראשית'}
+        result = to_response_document(document)
+        self.assertEqual(['id', 'book'], list(result))
+        self.assertIn('_id', document)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from unittest.mock import MagicMock
+
+import mongomock
+from bson import ObjectId
+
+from chapter_services import stats
+from config import DB_NAME, CHAPTERS_COLLECTION_NAME, CHAPTER_STATS_COLLECTION
+from db_services.db_controller import DbController
+from db_services.mongodb_service import MongodbService
+
+
+def chapter(book='Genesis', tags=('creation',), comment_count=0, **rating) -> dict:
+    return {'_id': ObjectId(), 'book': book, 'holy_book': 1, 'tags': list(tags), 'comment_count': comment_count,
+            'rating': rating}
+
+
+class StatsTests(unittest.TestCase):
+    def setUp(self):
+        self.client = mongomock.MongoClient()
+        for collection_name in (CHAPTERS_COLLECTION_NAME, CHAPTER_STATS_COLLECTION):
+            self.client[DB_NAME].create_collection(collection_name)
+        self.db_controller = DbController(MongodbService(self.client))
+
+    def rollup(self, dimension: str, key) -> dict:
+        rollup = self.client[DB_NAME][CHAPTER_STATS_COLLECTION].find_one({'_id': stats.stats_id(dimension, key)})
+        return stats.summary(rollup) if rollup else None
+
+    def test_contribution(self):
+        self.assertEqual({'chapters': 1, 'comments': 2, 'rating.moral.count': 1, 'rating.moral.sum': 3.5,
+                          'rating.moral.histogram.3': 1},
+                         stats.contribution(chapter(comment_count=2, moral=3.5, label='x', flag=True,
+                                                    nan=float('nan'), infinite=float('inf'))))
+
+    def test_chapters_written_rolls_up_every_dimension(self):
+        stats.chapters_written(self.db_controller, DB_NAME, [(None, chapter(moral=3)), (None, chapter(moral=4)),
+                                                              (None, chapter(book='Exodus', tags=()))])
+
+        self.assertEqual({'dimension': 'book', 'key': 'Genesis', 'chapters': 2, 'comments': 0,
+                          'rating': {'moral': {'count': 2, 'average': 3.5, 'histogram': {'3': 1, '4': 1}}}},
+                         self.rollup('book', 'Genesis'))
+        self.assertEqual(3, self.rollup('holy_book', 1)['chapters'])
+        self.assertEqual(2, self.rollup('tag', 'creation')['chapters'])
+        self.assertEqual({}, self.rollup('book', 'Exodus')['rating'])
+
+    def test_chapters_written_moves_an_edited_chapter(self):
+        old = chapter(comment_count=1, moral=3)
+        stats.chapters_written(self.db_controller, DB_NAME, [(None, old)])
+        stats.chapters_written(self.db_controller, DB_NAME,
+                               [(old, dict(old, book='Exodus', tags=['creation', 'light'], rating={'moral': 5}))])
+
+        self.assertEqual({'dimension': 'book', 'key': 'Genesis', 'chapters': 0, 'comments': 0, 'rating': {}},
+                         self.rollup('book', 'Genesis'))
+        self.assertEqual({'count': 1, 'average': 5, 'histogram': {'5': 1}},
+                         self.rollup('book', 'Exodus')['rating']['moral'])
+        self.assertEqual(1, self.rollup('tag', 'creation')['comments'])
+        self.assertEqual(1, self.rollup('tag', 'light')['chapters'])
+
+    def test_comments_written(self):
+        written = chapter()
+        self.client[DB_NAME][CHAPTERS_COLLECTION_NAME].insert_one(written)
+        stats.chapters_written(self.db_controller, DB_NAME, [(None, written)])
+        stats.comments_written(self.db_controller, DB_NAME, {written['_id']: 3, ObjectId(): 1})
+        stats.comments_written(self.db_controller, DB_NAME, {written['_id']: -1})
+
+        self.assertEqual(2, self.rollup('book', 'Genesis')['comments'])
+        self.assertEqual(2, self.rollup('tag', 'creation')['comments'])
+
+    def test_unchanged_write_does_not_touch_the_collection(self):
+        db_controller = MagicMock()
+        unchanged = chapter(moral=2)
+        stats.chapters_written(db_controller, DB_NAME, [(unchanged, dict(unchanged, author='someone else'))])
+        db_controller.bulk_write.assert_not_called()
+
+    def test_rebuild_merges_every_dimension_and_removes_stale_rollups(self):
+        db_controller = MagicMock()
+        db_controller.find.return_value = [{'_id': 'tag:removed'}]
+
+        self.assertEqual(1, stats.rebuild(db_controller, DB_NAME))
+
+        pipelines = [call.args[2] for call in db_controller.aggregate.call_args_list]
+        self.assertEqual(len(stats.DIMENSIONS), len(pipelines))
+        rebuild_id = pipelines[0][-2]['$project']['rebuild_id']['$literal']
+        for pipeline in pipelines:
+            self.assertEqual(CHAPTER_STATS_COLLECTION, pipeline[-1]['$merge']['into'])
+        self.assertEqual({'rebuild_id': {'$exists': True, '$ne': rebuild_id}}, db_controller.find.call_args.args[2])
+        self.assertEqual('tag:removed', db_controller.bulk_write.call_args.args[2][0]._filter['_id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+import json
+import unittest
+
+from bson import ObjectId
+
+from http_services.streaming import stream_json_array
+
+
+class StreamingTests(unittest.TestCase):
+    def test_stream_json_array_success(self):
+        documents = [{'_id': ObjectId(), 'book': 'בראשית', 'chapter_number': number} for number in range(100)]
+        chunks = list(stream_json_array(iter(documents), 'chapters', chunk_size=256))
+        self.assertGreater(len(chunks), 1)
+        result = json.loads(b''.join(chunks))
+        self.assertEqual([str(document['_id']) for document in documents],
+                         [chapter['id'] for chapter in result['chapters']])
+
+    def test_stream_json_array_empty(self):
+        self.assertEqual({'chapters': []}, json.loads(b''.join(stream_json_array(iter([]), 'chapters'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
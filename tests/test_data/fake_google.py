@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+CLIENT_ID = 'fake-client-id.apps.googleusercontent.com'
+ISSUER = 'https://accounts.google.com'
+VALID_CODE = 'valid-code'
+ACCESS_TOKEN = 'fake-access-token'
+USER_INFO = {
+    'sub': '1234567890',
+    'name': 'test user',
+    'given_name': 'test',
+    'family_name': 'user',
+    'picture': 'https://example.com/picture.png',
+    'email': 'test@gmail.com',
+    'email_verified': True,
+    'locale': 'en',
+}
+
+
+class FakeGoogle:
+    """
+    Local stand-in for Google's token, userinfo and JWKS endpoints. ID tokens are signed with a key
+    generated per instance; `id_token_claims`, `kid`, `failures` and `delay` change how it answers
+    and `requests` counts the calls per path.
+    """
+
+    def __init__(self):
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.kid = 'key-1'
+        self.id_token_claims = {}
+        self.include_id_token = True
+        self.failures = {}  # path -> number of 503 answers before answering normally
+        self.delay = 0.0
+        self.jwks_max_age = 3600
+        self.requests = {}
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05},
+                                        daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def start(self) -> 'FakeGoogle':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def id_token(self, **claims) -> str:
+        now = int(time.time())
+        payload = {'iss': ISSUER, 'aud': CLIENT_ID, 'iat': now, 'exp': now + 3600, **USER_INFO, **claims}
+        return jwt.encode(payload, self.private_key, algorithm='RS256', headers={'kid': self.kid})
+
+    def jwks(self) -> dict:
+        key = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self.private_key.public_key()))
+        return {'keys': [{**key, 'kid': self.kid, 'alg': 'RS256', 'use': 'sig'}]}
+
+    def _answer(self, path: str, body: str) -> tuple:
+        if path == '/token':
+            if parse_qs(body).get('code') != [VALID_CODE]:
+                return 400, {'error': 'invalid_grant'}, {}
+            tokens = {'access_token': ACCESS_TOKEN, 'token_type': 'Bearer', 'expires_in': 3599}
+            if self.include_id_token:
+                tokens['id_token'] = self.id_token(**self.id_token_claims)
+            return 200, tokens, {}
+        if path == '/userinfo':
+            return 200, USER_INFO, {}
+        if path == '/certs':
+            return 200, self.jwks(), {'Cache-Control': f'public, max-age={self.jwks_max_age}'}
+        return 404, {'error': 'not_found'}, {}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self._respond('')
+
+            def do_POST(self):
+                self._respond(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode())
+
+            def _respond(self, body: str):
+                fake.requests[self.path] = fake.requests.get(self.path, 0) + 1
+                time.sleep(fake.delay)
+                if fake.failures.get(self.path):
+                    fake.failures[self.path] -= 1
+                    status, data, headers = 503, {'error': 'unavailable'}, {}
+                else:
+                    status, data, headers = fake._answer(self.path, body)
+
+                content = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
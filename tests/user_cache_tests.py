@@ -0,0 +1,78 @@
+import unittest
+from unittest import mock
+from unittest.mock import MagicMock
+
+from cache_services.user_cache import UserCache
+from models.user import User, Role
+
+USER = {
+    'name': 'test user',
+    'given_name': 'test',
+    'family_name': 'user',
+    'role': 'admin',
+    'picture': 'https://www.shutterstock.com/image-vector/man-icon-vector-260nw-1040084344.jpg',
+    'email': 'test@gmail.com',
+}
+
+
+class UserCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.user = User(**USER)
+
+    def test_get_after_set_success(self):
+        cache = UserCache(ttl=60)
+        cache.set(self.user.email, self.user)
+        self.assertIs(cache.get(self.user.email), self.user)
+
+    def test_get_expired_failure(self):
+        cache = UserCache(ttl=60)
+        with mock.patch('cache_services.user_cache.time.monotonic', return_value=0):
+            cache.set(self.user.email, self.user)
+        with mock.patch('cache_services.user_cache.time.monotonic', return_value=61):
+            self.assertIsNone(cache.get(self.user.email))
+
+    def test_set_evicts_least_recently_used(self):
+        cache = UserCache(ttl=60, max_size=2)
+        cache.set('first', self.user)
+        cache.set('second', self.user)
+        cache.get('first')
+        cache.set('third', self.user)
+        self.assertIsNone(cache.get('second'))
+        self.assertIsNotNone(cache.get('first'))
+        self.assertIsNotNone(cache.get('third'))
+
+    def test_invalidate_success(self):
+        cache = UserCache(ttl=60)
+        cache.set(self.user.email, self.user)
+        cache.invalidate(self.user.email)
+        self.assertIsNone(cache.get(self.user.email))
+
+    def test_zero_ttl_disables_cache(self):
+        cache = UserCache(ttl=0)
+        cache.set(self.user.email, self.user)
+        self.assertIsNone(cache.get(self.user.email))
+
+    def test_backend_round_trip_success(self):
+        backend = MagicMock()
+        cache = UserCache(ttl=60, backend=backend)
+        cache.set(self.user.email, self.user)
+        backend.set.assert_called_once_with('user:test@gmail.com', self.user.to_bson(), timeout=60)
+        backend.get.return_value = self.user.to_bson()
+        self.assertEqual(cache.get(self.user.email).role, Role.ADMIN)
+        cache.invalidate(self.user.email)
+        backend.delete.assert_called_once_with('user:test@gmail.com')
+
+    def test_backend_timeout_is_never_zero(self):
+        backend = MagicMock()
+        UserCache(ttl=0.5, backend=backend).set(self.user.email, self.user)
+        self.assertEqual(1, backend.set.call_args.kwargs['timeout'])  # 0 would keep the entry forever
+
+    def test_backend_failure_is_a_miss(self):
+        backend = MagicMock()
+        backend.get.side_effect = ConnectionError()
+        cache = UserCache(ttl=60, backend=backend)
+        self.assertIsNone(cache.get(self.user.email))
+
+
+if __name__ == '__main__':
+    unittest.main()
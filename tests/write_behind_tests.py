@@ -0,0 +1,164 @@
+import glob
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+
+from comment_services.journal import Journal
+from comment_services.write_behind import CommentWriteBehind, QueueFull
+from config import DB_NAME, CHAPTERS_COLLECTION_NAME, COMMENTS_COLLECTION_NAME
+from db_services.db_controller import DbController
+from db_services.memory_service import MemoryDbService
+
+
+def comment(chapter_id, name='user', text='text') -> dict:
+    return {'_id': ObjectId(), 'chapter_id': chapter_id, 'name': name, 'text': text}
+
+
+class CommentWriteBehindTests(unittest.TestCase):
+    def setUp(self):
+        self.service = MemoryDbService()
+        self.chapter_id = ObjectId()
+        self.service.insert_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': self.chapter_id, 'comment_count': 1})
+        self.existing = comment(self.chapter_id)
+        self.service.insert_one(DB_NAME, COMMENTS_COLLECTION_NAME, dict(self.existing))
+        self.on_written = MagicMock()
+        self.write_behind = CommentWriteBehind(DbController(self.service), DB_NAME, on_written=self.on_written)
+
+    def comments(self) -> dict:
+        return {found['_id']: found for found in self.service.find(DB_NAME, COMMENTS_COLLECTION_NAME, {})}
+
+    def comment_count(self) -> int:
+        return self.service.find_one(DB_NAME, CHAPTERS_COLLECTION_NAME, {'_id': self.chapter_id})['comment_count']
+
+    def test_write_coalesces_the_mutations_of_a_comment(self):
+        added, removed = comment(self.chapter_id), comment(self.chapter_id)
+        records = [
+            {'op': 'insert', 'chapter_id': self.chapter_id, 'comment_id': added['_id'], 'name': 'user',
+             'document': added},
+            {'op': 'update', 'chapter_id': self.chapter_id, 'comment_id': added['_id'], 'name': 'user',
+             'fields': {'text': 'edited'}},
+            {'op': 'insert', 'chapter_id': self.chapter_id, 'comment_id': removed['_id'], 'name': 'user',
+             'document': removed},
+            {'op': 'delete', 'chapter_id': self.chapter_id, 'comment_id': removed['_id'], 'name': 'user'},
+            {'op': 'update', 'chapter_id': self.chapter_id, 'comment_id': self.existing['_id'], 'name': 'user',
+             'fields': {'text': 'also edited'}},
+        ]
+
+        self.assertEqual({self.chapter_id: 1}, self.write_behind.write(records))
+
+        comments = self.comments()
+        self.assertEqual({added['_id'], self.existing['_id']}, set(comments))
+        self.assertEqual('edited', comments[added['_id']]['text'])
+        self.assertEqual('also edited', comments[self.existing['_id']]['text'])
+        self.assertEqual(2, self.comment_count())
+        self.on_written.assert_called_once_with({self.chapter_id}, {self.chapter_id: 1})
+
+    def test_write_counts_only_what_matched(self):
+        missing_chapter = comment(ObjectId())
+        records = [
+            {'op': 'insert', 'chapter_id': missing_chapter['chapter_id'], 'comment_id': missing_chapter['_id'],
+             'name': 'user', 'document': missing_chapter},
+            {'op': 'delete', 'chapter_id': self.chapter_id, 'comment_id': self.existing['_id'], 'name': 'other'},
+            {'op': 'insert', 'chapter_id': self.chapter_id, 'comment_id': self.existing['_id'], 'name': 'user',
+             'document': self.existing},
+        ]
+
+        self.assertEqual({}, self.write_behind.write(records))
+        self.assertEqual([self.existing['_id']], list(self.comments()))
+        self.assertEqual(1, self.comment_count())
+
+    def test_retried_batch_keeps_the_comment_count(self):
+        db_controller = DbController(self.service)
+        bulk_write = db_controller.bulk_write
+        failures = [AutoReconnect('the chapters write failed')]
+
+        def failing_bulk_write(db_name, collection_name, *args, **kwargs):
+            if collection_name == CHAPTERS_COLLECTION_NAME and failures:
+                raise failures.pop()
+            return bulk_write(db_name, collection_name, *args, **kwargs)
+
+        db_controller.bulk_write = failing_bulk_write
+        write_behind = CommentWriteBehind(db_controller, DB_NAME, retry_interval=0.01)
+        added = comment(self.chapter_id)
+        write_behind._write_batch([({'op': 'insert', 'chapter_id': self.chapter_id, 'comment_id': added['_id'],
+                                     'name': 'user', 'document': added}, None)])
+
+        self.assertIn(added['_id'], self.comments())
+        self.assertEqual(2, self.comment_count())
+
+    def test_worker_survives_any_error(self):
+        db_controller = DbController(self.service)
+        bulk_write = db_controller.bulk_write
+        failures = [KeyError('comments')]
+
+        def failing_bulk_write(*args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return bulk_write(*args, **kwargs)
+
+        db_controller.bulk_write = failing_bulk_write
+        on_written = MagicMock(side_effect=ValueError('the callback failed'))
+        write_behind = CommentWriteBehind(db_controller, DB_NAME, on_written=on_written, retry_interval=0.01,
+                                          workers=1)
+        for _ in range(2):
+            write_behind.insert(comment(self.chapter_id))
+        deadline = time.monotonic() + 5
+        while self.comment_count() < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        write_behind.close()
+
+        self.assertEqual(0, write_behind.depth())
+        self.assertEqual(3, len(self.comments()))
+        self.assertEqual(3, self.comment_count())
+        on_written.assert_called()
+
+    def test_queued_mutations_are_written_by_the_workers(self):
+        for _ in range(3):
+            self.write_behind.insert(comment(self.chapter_id))
+        self.write_behind.delete(self.chapter_id, self.existing['_id'], 'user')
+        self.write_behind.close()
+
+        self.assertEqual(0, self.write_behind.depth())
+        self.assertEqual(3, len(self.comments()))
+        self.assertEqual(3, self.comment_count())
+
+    def test_full_queue_rejects_mutations(self):
+        db_controller = MagicMock()
+        write_behind = CommentWriteBehind(db_controller, DB_NAME, max_size=1, workers=1)
+        write_behind._pid = os.getpid()  # the workers are not started, so nothing is taken from the queue
+        write_behind.insert(comment(self.chapter_id))
+        with self.assertRaises(QueueFull):
+            write_behind.insert(comment(self.chapter_id))
+        self.assertEqual(1, write_behind.depth())
+
+    def test_journal_of_a_stopped_process_is_replayed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            journal = Journal(directory)
+            added = comment(self.chapter_id)
+            journal.append({'op': 'insert', 'chapter_id': self.chapter_id, 'comment_id': added['_id'],
+                            'name': 'user', 'document': added})
+            journal.close()
+            self.assertEqual(1, len(glob.glob(os.path.join(directory, '*.jsonl'))))
+
+            write_behind = CommentWriteBehind(DbController(self.service), DB_NAME, journal=Journal(directory))
+            write_behind.start()
+            self.assertIn(added['_id'], self.comments())
+            self.assertEqual(2, self.comment_count())
+            self.assertEqual([], glob.glob(os.path.join(directory, '*.jsonl')))
+
+            write_behind.insert(comment(self.chapter_id))
+            deadline = time.monotonic() + 5
+            while self.comment_count() < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            write_behind.close()
+            self.assertEqual(3, self.comment_count())
+            self.assertEqual([], glob.glob(os.path.join(directory, '*.jsonl')))
+
+
+if __name__ == '__main__':
+    unittest.main()
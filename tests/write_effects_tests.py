@@ -0,0 +1,61 @@
+import unittest
+from unittest.mock import MagicMock
+
+import mongomock
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+
+from chapter_services import stats, write_effects
+from config import DB_NAME, CHAPTERS_COLLECTION_NAME, CHAPTER_STATS_COLLECTION
+from db_services.db_controller import DbController
+from db_services.mongodb_service import MongodbService
+
+
+class WriteEffectsTests(unittest.TestCase):
+    def setUp(self):
+        self.client = mongomock.MongoClient()
+        for collection_name in (CHAPTERS_COLLECTION_NAME, CHAPTER_STATS_COLLECTION):
+            self.client[DB_NAME].create_collection(collection_name)
+        self.db_controller = DbController(MongodbService(self.client))
+        self.response_cache = MagicMock()
+        self.chapter = {'_id': ObjectId(), 'book': 'Genesis', 'comment_count': 0}
+        self.client[DB_NAME][CHAPTERS_COLLECTION_NAME].insert_one(dict(self.chapter))
+
+    def bumped(self) -> set:
+        return {namespace for call in self.response_cache.bump.call_args_list for namespace in call.args}
+
+    def rollup(self) -> dict:
+        return self.client[DB_NAME][CHAPTER_STATS_COLLECTION].find_one({'_id': stats.stats_id('book', 'Genesis')})
+
+    def test_chapters_written(self):
+        write_effects.chapters_written(self.db_controller, DB_NAME, self.response_cache, [(None, self.chapter)])
+
+        self.assertEqual({f'chapter:{self.chapter["_id"]}', 'chapters', 'stats'}, self.bumped())
+        self.assertEqual(1, self.rollup()['chapters'])
+
+    def test_comments_written(self):
+        other_chapter_id = ObjectId()
+        write_effects.comments_written(self.db_controller, DB_NAME, self.response_cache,
+                                       {self.chapter['_id'], other_chapter_id}, {self.chapter['_id']: 2})
+
+        self.assertEqual({f'comments:{self.chapter["_id"]}', f'comments:{other_chapter_id}',
+                          f'chapter:{self.chapter["_id"]}', 'chapters', 'stats'}, self.bumped())
+        self.assertEqual(2, self.rollup()['comments'])
+
+    def test_edited_comment_leaves_the_counts(self):
+        write_effects.comments_written(self.db_controller, DB_NAME, self.response_cache, {self.chapter['_id']})
+
+        self.assertEqual({f'comments:{self.chapter["_id"]}'}, self.bumped())
+        self.assertIsNone(self.rollup())
+
+    def test_failed_stats_still_bump_the_cache(self):
+        db_controller = MagicMock()
+        db_controller.bulk_write.side_effect = AutoReconnect()
+        with self.assertLogs(write_effects.LOGGER):
+            write_effects.chapters_written(db_controller, DB_NAME, self.response_cache, [(None, self.chapter)])
+
+        self.assertEqual({f'chapter:{self.chapter["_id"]}', 'chapters', 'stats'}, self.bumped())
+
+
+if __name__ == '__main__':
+    unittest.main()